@@ -0,0 +1,535 @@
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Cubo de agregados (ano x sistema x métrica)
+# ------------------------------------------------------------
+# Os únicos filtros do dashboard são ano e sistema. Guardamos, por célula
+# (ano, sistema) e por métrica, estatísticas *mescláveis*: contagem, soma,
+# soma dos quadrados, mínimo, máximo e um histograma de bordas fixas (o
+# "sketch" de quantis). Qualquer seleção de anos é respondida somando
+# células — custo O(anos x métricas), independente do número de linhas.
+#
+# Médias ponderadas e consolidação hierárquica: na mesma passada, as somas
+# simples e ponderadas (Σ w·x e Σ w) também são guardadas por grupo dentro
+# da célula — (ano, sistema, região, cooperativa), quando essas colunas
+# existem. Com peso = área, Σ área·x de uma métrica por hectare é o total
+# do grupo (custo em R$, emissões em t CO₂e...) e a média ponderada é a
+# razão de totais; com peso = produção (sacas), o mesmo vale para as
+# métricas por saca (custo/saca, GHG/saca = Σ custo / Σ sacas). Médias por
+# área/produção, totais e intensidades por cooperativa ou região saem de
+# somas de células, sem voltar às linhas.
+#
+# Bordas dos histogramas na ingestão: as linhas novas usam as bordas do cubo
+# atual para que os histogramas possam ser somados. Se elas saem da faixa
+# (ex.: um ano novo com preços maiores), as bordas são alargadas no mesmo
+# grid — a largura do bin dobra e o início recua um número inteiro de
+# bins —, então cada bin antigo cabe inteiro num bin novo e o histograma
+# existente é reagrupado sem perda, sem revisitar as linhas antigas.
+N_BINS = 2048
+
+# Níveis da hierarquia abaixo de (ano, sistema), do mais amplo ao mais fino
+NIVEIS = ["regiao", "cooperativa"]
+SEM_GRUPO = "não informado"
+
+
+def pesos_linhas(df):
+    """Pesos disponíveis por linha: área (ha) e produção (sacas)."""
+    pesos = {}
+    if "area_ha" in df.columns:
+        area = np.nan_to_num(df["area_ha"].to_numpy(dtype=float))
+        pesos["area"] = area
+        if "produtividade_sacas_ha" in df.columns:
+            pesos["producao"] = area * np.nan_to_num(
+                df["produtividade_sacas_ha"].to_numpy(dtype=float))
+    return pesos
+
+
+def codigos_grupo(df, niveis=None):
+    """(níveis, rótulos dos grupos, grupo de cada linha).
+
+    Cada grupo é uma tupla com um valor por nível (ex.: (região,
+    cooperativa)); sem níveis há um único grupo `()`. `niveis=None` usa os
+    de NIVEIS presentes em `df`; níveis pedidos que faltam em `df` (ex.:
+    lotes ingeridos sem essas colunas) valem SEM_GRUPO.
+    """
+    if niveis is None:
+        niveis = [n for n in NIVEIS if n in df.columns]
+    if not niveis:
+        return [], [()], np.zeros(len(df), dtype=np.int64)
+    chave = np.zeros(len(df), dtype=np.int64)
+    categorias = []
+    for nivel in niveis:
+        if nivel in df.columns:
+            cat = pd.Categorical(df[nivel])
+        else:
+            cat = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8),
+                                            [SEM_GRUPO])
+        if (cat.codes < 0).any():
+            cat = cat.add_categories([SEM_GRUPO]).fillna(SEM_GRUPO)
+        categorias.append(list(cat.categories))
+        chave = chave * len(cat.categories) + cat.codes
+    usados, grupo = np.unique(chave, return_inverse=True)
+    rotulos = []
+    for k in usados:
+        rotulo = []
+        for cats in reversed(categorias):
+            k, i = divmod(int(k), len(cats))
+            rotulo.append(cats[i])
+        rotulos.append(tuple(reversed(rotulo)))
+    return niveis, rotulos, grupo.astype(np.int64)
+
+
+def faixa_colunas(df, cols):
+    """(mínimos, máximos) dos valores finitos de cada coluna (NaN se não há)."""
+    minimo = np.full(len(cols), np.nan)
+    maximo = np.full(len(cols), np.nan)
+    for j, col in enumerate(cols):
+        if col not in df.columns:
+            continue
+        x = df[col].to_numpy(dtype=float)
+        x = x[np.isfinite(x)]
+        if len(x):
+            minimo[j], maximo[j] = x.min(), x.max()
+    return minimo, maximo
+
+
+def alargar_bordas(bordas, n_bins, minimo, maximo):
+    """Bordas que cobrem também [minimo, maximo], no mesmo grid das atuais.
+
+    Colunas já cobertas ficam iguais. Nas demais, o início recua um número
+    inteiro de bins e a largura do bin dobra até caber tudo: os histogramas
+    antigos passam para as bordas novas com `CuboAgregados.rebinar`.
+    """
+    bordas = np.array(bordas, dtype=float)
+    for c, (lo, hi) in enumerate(bordas):
+        x_min, x_max = minimo[c], maximo[c]
+        if not (np.isfinite(x_min) and np.isfinite(x_max)):
+            continue
+        if not (np.isfinite(lo) and np.isfinite(hi)):  # coluna sem dados
+            bordas[c] = x_min, (x_max if x_max > x_min else x_min + 1.0)
+            continue
+        if x_min >= lo and x_max <= hi:
+            continue
+        largura = (hi - lo) / n_bins
+        recuo = int(np.ceil(max(lo - x_min, 0.0) / largura))
+        inicio = lo - recuo * largura
+        fator = 1
+        while inicio + n_bins * fator * largura < max(hi, x_max):
+            fator *= 2
+        bordas[c] = inicio, inicio + n_bins * fator * largura
+    return bordas
+
+
+class SomasPonderadas:
+    """Somas por (ano, sistema, grupo, métrica), simples e ponderadas.
+
+    Os eixos de ano, sistema e métrica são os do cubo que as contém.
+    `linhas` e `peso_total` contam todas as linhas do grupo; `n`, `soma`,
+    `soma_pond` e `peso` só as linhas com a métrica preenchida.
+    """
+
+    def __init__(self, niveis, grupos, linhas, peso_total, n, soma,
+                 soma_pond, peso):
+        self.niveis = list(niveis)  # ex.: ["regiao", "cooperativa"]
+        self.grupos = list(grupos)  # rótulos: tuplas, um valor por nível
+        self.linhas = linhas            # (anos, sistemas, grupos)
+        self.peso_total = peso_total    # peso -> (anos, sistemas, grupos)
+        self.n = n                      # (anos, sistemas, grupos, cols)
+        self.soma = soma                # (anos, sistemas, grupos, cols)
+        self.soma_pond = soma_pond      # peso -> Σ w·x (anos, sistemas, grupos, cols)
+        self.peso = peso                # peso -> Σ w (anos, sistemas, grupos, cols)
+
+    def mesclar(self, outro, anos, sistemas, anos_a, sis_a, anos_b, sis_b):
+        """Soma as duas (já nos eixos `anos` x `sistemas` do cubo mesclado)."""
+        if self.niveis != outro.niveis:
+            raise ValueError("Níveis de grupo diferentes ao mesclar.")
+        grupos = sorted(set(self.grupos) | set(outro.grupos))
+
+        def expandir(arr, anos_o, sis_o, grupos_o):
+            forma = (len(anos), len(sistemas), len(grupos)) + arr.shape[3:]
+            out = np.zeros(forma)
+            ia = np.searchsorted(anos, anos_o)
+            is_ = [sistemas.index(x) for x in sis_o]
+            ig = [grupos.index(g) for g in grupos_o]
+            out[np.ix_(ia, is_, ig)] = arr
+            return out
+
+        def somar(a, b):
+            return expandir(a, anos_a, sis_a, self.grupos) + \
+                expandir(b, anos_b, sis_b, outro.grupos)
+
+        pesos = set(self.peso) & set(outro.peso)
+        return SomasPonderadas(
+            self.niveis, grupos, somar(self.linhas, outro.linhas),
+            {p: somar(self.peso_total[p], outro.peso_total[p]) for p in pesos},
+            somar(self.n, outro.n), somar(self.soma, outro.soma),
+            {p: somar(self.soma_pond[p], outro.soma_pond[p]) for p in pesos},
+            {p: somar(self.peso[p], outro.peso[p]) for p in pesos})
+
+
+class CuboAgregados:
+    """Agregados pré-calculados por (ano, sistema, métrica)."""
+
+    def __init__(self, anos, sistemas, cols, count, soma, soma2, minimo,
+                 maximo, hist, bordas, ponderadas=None):
+        self.anos = np.asarray(anos)
+        self.sistemas = list(sistemas)
+        self.cols = list(cols)
+        self.count = count      # (anos, sistemas, cols)
+        self.soma = soma        # (anos, sistemas, cols)
+        self.soma2 = soma2      # (anos, sistemas, cols)
+        self.minimo = minimo    # (anos, sistemas, cols)
+        self.maximo = maximo    # (anos, sistemas, cols)
+        self.hist = hist        # (anos, sistemas, cols, N_BINS)
+        self.bordas = bordas    # (cols, 2): faixa global de cada métrica
+        self.ponderadas = ponderadas  # SomasPonderadas (grupos e pesos)
+
+    @classmethod
+    def de_dataframe(cls, df, cols, n_bins=N_BINS, bordas=None, niveis=None):
+        """Constrói o cubo com `bincount` por célula (uma passada por coluna).
+
+        `bordas` (cols x 2) fixa a faixa dos histogramas — necessário para
+        mesclar o cubo de linhas novas com um cubo existente (alargue-as
+        antes com `alargar_bordas`: valores fora da faixa cairiam no
+        primeiro/último bin); `niveis` faz o mesmo com os
+        níveis de grupo (ver `codigos_grupo`). As somas por grupo e por
+        peso saem dos mesmos `bincount`, sobre o
+        código combinado (célula, grupo); contagem e soma por célula são a
+        soma dos grupos.
+        """
+        cols = [c for c in cols if c in df.columns]
+        anos, ano_idx = np.unique(df["ano"].to_numpy(), return_inverse=True)
+        sis = pd.Categorical(df["sistema"])
+        sistemas = list(sis.categories)
+        n_a, n_s, n_c = len(anos), len(sistemas), len(cols)
+        n_cel = n_a * n_s
+        celula = ano_idx * n_s + sis.codes
+        niveis, grupos, grupo = codigos_grupo(df, niveis)
+        n_g = len(grupos)
+        n_cg = n_cel * n_g
+        cel_grupo = celula * n_g + grupo
+        pesos = pesos_linhas(df)
+
+        linhas = np.bincount(cel_grupo, minlength=n_cg).astype(float)
+        peso_total = {p: np.bincount(cel_grupo, weights=w, minlength=n_cg)
+                      for p, w in pesos.items()}
+        n = np.zeros((n_cg, n_c))
+        soma_g = np.zeros((n_cg, n_c))
+        soma_pond = {p: np.zeros((n_cg, n_c)) for p in pesos}
+        peso = {p: np.zeros((n_cg, n_c)) for p in pesos}
+        soma2 = np.zeros((n_cel, n_c))
+        minimo = np.full((n_cel, n_c), np.nan)
+        maximo = np.full((n_cel, n_c), np.nan)
+        hist = np.zeros((n_cel, n_c, n_bins))
+        fixas = bordas is not None
+        bordas = np.array(bordas, dtype=float) if fixas \
+            else np.full((n_c, 2), np.nan)
+
+        for j, col in enumerate(cols):
+            x = df[col].to_numpy(dtype=float)
+            ok = ~np.isnan(x)
+            completa = ok.all()
+            if completa:
+                cel, cg = celula, cel_grupo
+            else:
+                x, cel, cg = x[ok], celula[ok], cel_grupo[ok]
+            if not len(x):
+                continue
+            n[:, j] = linhas if completa else np.bincount(cg, minlength=n_cg)
+            soma_g[:, j] = np.bincount(cg, weights=x, minlength=n_cg)
+            soma2[:, j] = np.bincount(cel, weights=x * x, minlength=n_cel)
+            for p, w in pesos.items():
+                w = w if completa else w[ok]
+                soma_pond[p][:, j] = np.bincount(cg, weights=w * x, minlength=n_cg)
+                peso[p][:, j] = peso_total[p] if completa \
+                    else np.bincount(cg, weights=w, minlength=n_cg)
+
+            if fixas:
+                lo, hi = bordas[j]
+            else:
+                lo, hi = x.min(), x.max()
+                if hi <= lo:
+                    hi = lo + 1.0
+                bordas[j] = lo, hi
+            b = np.clip(((x - lo) / (hi - lo) * n_bins).astype(np.int64),
+                        0, n_bins - 1)
+            hist[:, j, :] = np.bincount(
+                cel * n_bins + b, minlength=n_cel * n_bins).reshape(n_cel, n_bins)
+
+        # min/max por célula em um único groupby (ignora NaN)
+        if len(df):
+            g = df[cols].groupby(celula).agg(["min", "max"])
+            minimo[g.index] = g.xs("min", axis=1, level=1).to_numpy()
+            maximo[g.index] = g.xs("max", axis=1, level=1).to_numpy()
+
+        forma = (n_a, n_s, n_c)
+        forma_g = (n_a, n_s, n_g)
+        ponderadas = SomasPonderadas(
+            niveis, grupos, linhas.reshape(forma_g),
+            {p: v.reshape(forma_g) for p, v in peso_total.items()},
+            n.reshape(forma_g + (n_c,)), soma_g.reshape(forma_g + (n_c,)),
+            {p: v.reshape(forma_g + (n_c,)) for p, v in soma_pond.items()},
+            {p: v.reshape(forma_g + (n_c,)) for p, v in peso.items()})
+        return cls(anos, sistemas, cols,
+                   ponderadas.n.sum(axis=2), ponderadas.soma.sum(axis=2),
+                   soma2.reshape(forma), minimo.reshape(forma),
+                   maximo.reshape(forma), hist.reshape(forma + (n_bins,)),
+                   bordas, ponderadas)
+
+    def mesclar(self, outro):
+        """Novo cubo com as células dos dois (mesmas colunas e bordas).
+
+        Usado na ingestão incremental: o cubo das linhas novas é somado ao
+        existente sem revisitar as linhas antigas. Anos e sistemas novos
+        ganham células próprias.
+        """
+        if not len(self.anos):
+            return outro
+        if not len(outro.anos):
+            return self
+        anos = np.union1d(self.anos, outro.anos)
+        sistemas = sorted(set(self.sistemas) | set(outro.sistemas))
+
+        def expandir(cubo, nome, vazio):
+            arr = getattr(cubo, nome)
+            forma = (len(anos), len(sistemas)) + arr.shape[2:]
+            out = np.full(forma, vazio)
+            ia = np.searchsorted(anos, cubo.anos)
+            is_ = [sistemas.index(s) for s in cubo.sistemas]
+            out[np.ix_(ia, is_)] = arr
+            return out
+
+        somas = {nome: expandir(self, nome, 0.0) + expandir(outro, nome, 0.0)
+                 for nome in ("count", "soma", "soma2", "hist")}
+        minimo = np.fmin(expandir(self, "minimo", np.nan),
+                         expandir(outro, "minimo", np.nan))
+        maximo = np.fmax(expandir(self, "maximo", np.nan),
+                         expandir(outro, "maximo", np.nan))
+        ponderadas = None
+        if self.ponderadas is not None and outro.ponderadas is not None:
+            ponderadas = self.ponderadas.mesclar(
+                outro.ponderadas, anos, sistemas, self.anos, self.sistemas,
+                outro.anos, outro.sistemas)
+        return CuboAgregados(anos, sistemas, self.cols, somas["count"],
+                             somas["soma"], somas["soma2"], minimo, maximo,
+                             somas["hist"], self.bordas, ponderadas)
+
+    def rebinar(self, bordas):
+        """Cubo com os histogramas reagrupados nas `bordas` de `alargar_bordas`.
+
+        Cada bin antigo i vai inteiro para o bin (i + recuo) // fator.
+        """
+        bordas = np.asarray(bordas, dtype=float)
+        if np.array_equal(bordas, self.bordas, equal_nan=True):
+            return self
+        n_bins = self.hist.shape[-1]
+        hist = self.hist.copy()
+        for c in range(len(self.cols)):
+            lo, hi = self.bordas[c]
+            lo2, hi2 = bordas[c]
+            if (lo, hi) == (lo2, hi2) or not (np.isfinite(lo) and np.isfinite(hi)):
+                continue  # igual, ou sem dados (histograma vazio)
+            largura = (hi - lo) / n_bins
+            fator = int(round((hi2 - lo2) / (hi - lo)))
+            recuo = int(round((lo - lo2) / largura))
+            destino = (np.arange(n_bins) + recuo) // fator
+            inicios = np.flatnonzero(np.r_[True, destino[1:] != destino[:-1]])
+            novo = np.zeros_like(hist[..., c, :])
+            novo[..., destino[inicios]] = np.add.reduceat(
+                hist[..., c, :], inicios, axis=-1)
+            hist[..., c, :] = novo
+        return CuboAgregados(self.anos, self.sistemas, self.cols, self.count,
+                             self.soma, self.soma2, self.minimo, self.maximo,
+                             hist, bordas, self.ponderadas)
+
+    def ponderado(self, peso):
+        """Cubo com médias, somas e séries ponderadas por `peso`.
+
+        `peso` é "area", "producao" ou None (o próprio cubo, média por
+        linha). No cubo ponderado `count` é Σ w e `soma` é Σ w·x; medianas,
+        quantis, caixas, mínimo e máximo continuam por linha (os
+        histogramas não são ponderados) e o desvio-padrão fica indefinido.
+        """
+        if peso is None:
+            return self
+        p = self.ponderadas
+        if p is None or peso not in p.peso:
+            raise ValueError(f"Peso indisponível nos dados: {peso!r}")
+        return CuboAgregados(self.anos, self.sistemas, self.cols,
+                             p.peso[peso].sum(axis=2),
+                             p.soma_pond[peso].sum(axis=2),
+                             np.full_like(self.soma2, np.nan), self.minimo,
+                             self.maximo, self.hist, self.bordas, p)
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+    def _sel_anos(self, anos):
+        if not anos:
+            return np.ones(len(self.anos), dtype=bool)
+        return np.isin(self.anos, np.asarray(list(anos)))
+
+    def _quantis_hist(self, hist, qs):
+        """Quantis (interpolação linear dentro do bin) de histogramas (..., bins)."""
+        n_bins = hist.shape[-1]
+        acum = np.cumsum(hist, axis=-1)
+        total = acum[..., -1:]
+        lo, hi = self.bordas[:, 0], self.bordas[:, 1]
+        largura = (hi - lo) / n_bins
+        saida = []
+        for q in qs:
+            alvo = q * total
+            i = np.minimum((acum < alvo).sum(axis=-1), n_bins - 1)
+            antes = np.take_along_axis(
+                np.concatenate([np.zeros_like(acum[..., :1]), acum], axis=-1),
+                i[..., None], axis=-1)[..., 0]
+            no_bin = np.take_along_axis(hist, i[..., None], axis=-1)[..., 0]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                frac = np.where(no_bin > 0, (alvo[..., 0] - antes) / no_bin, 0.5)
+                v = lo + (i + np.clip(frac, 0, 1)) * largura
+            saida.append(np.where(total[..., 0] > 0, v, np.nan))
+        return saida
+
+    def estatisticas(self, anos=None, aggs=("mean", "median")):
+        """Estatísticas por sistema para os anos selecionados.
+
+        Mesmo formato de `aggregate_by_sistema` no app: dicionário
+        agg -> DataFrame (sistema x coluna). Aceita "mean", "median",
+        "count", "sum", "std", "min" e "max".
+        """
+        m = self._sel_anos(anos)
+        count = self.count[m].sum(axis=0)
+        soma = self.soma[m].sum(axis=0)
+        saida = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for agg in aggs:
+                if agg == "mean":
+                    v = soma / count
+                elif agg == "median":
+                    v = self._quantis_hist(self.hist[m].sum(axis=0), [0.5])[0]
+                elif agg == "count":
+                    v = count
+                elif agg == "sum":
+                    v = soma
+                elif agg == "std":
+                    soma2 = self.soma2[m].sum(axis=0)
+                    var = (soma2 - soma * soma / count) / (count - 1)
+                    v = np.sqrt(np.maximum(var, 0))
+                elif agg == "min":
+                    v = np.nanmin(self.minimo[m], axis=0, initial=np.inf)
+                elif agg == "max":
+                    v = np.nanmax(self.maximo[m], axis=0, initial=-np.inf)
+                else:
+                    raise ValueError(f"Agregação desconhecida: {agg!r}")
+                v = np.where(count > 0, v, np.nan)
+                saida[agg] = pd.DataFrame(v, index=pd.Index(
+                    self.sistemas, name="sistema"), columns=self.cols)
+        return saida
+
+    def quantis(self, col, qs, anos=None):
+        """Quantis aproximados de `col` por sistema: DataFrame (sistema x q)."""
+        m = self._sel_anos(anos)
+        j = self.cols.index(col)
+        hist = self.hist[m].sum(axis=0)  # (sistemas, cols, bins)
+        vals = self._quantis_hist(hist, qs)
+        return pd.DataFrame({q: v[:, j] for q, v in zip(qs, vals)},
+                            index=pd.Index(self.sistemas, name="sistema"))
+
+    def caixa(self, col, anos=None):
+        """Estatísticas de boxplot (Tukey) de `col` por sistema.
+
+        Quartis vêm do histograma; os bigodes são o menor/maior valor
+        dentro de 1,5 x IQR, localizados pelo primeiro/último bin não
+        vazio dentro das cercas (e limitados pelo mínimo/máximo reais).
+        """
+        m = self._sel_anos(anos)
+        j = self.cols.index(col)
+        hist = self.hist[m].sum(axis=0)[:, j, :]  # (sistemas, bins)
+        q1, med, q3 = (v[:, j] for v in self._quantis_hist(
+            self.hist[m].sum(axis=0), [0.25, 0.5, 0.75]))
+        with np.errstate(all="ignore"):
+            minimo = np.nanmin(self.minimo[m, :, j], axis=0, initial=np.inf)
+            maximo = np.nanmax(self.maximo[m, :, j], axis=0, initial=-np.inf)
+        iqr = q3 - q1
+        cerca_inf, cerca_sup = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+        lo, hi = self.bordas[j]
+        n_bins = hist.shape[-1]
+        esq = lo + np.arange(n_bins) * (hi - lo) / n_bins
+        dir_ = esq + (hi - lo) / n_bins
+        bigode_inf = np.full(len(self.sistemas), np.nan)
+        bigode_sup = np.full(len(self.sistemas), np.nan)
+        for s in range(len(self.sistemas)):
+            ok = hist[s] > 0
+            dentro = ok & (dir_ >= cerca_inf[s]) & (esq <= cerca_sup[s])
+            if not dentro.any():
+                continue
+            idx = np.flatnonzero(dentro)
+            bigode_inf[s] = max(esq[idx[0]], cerca_inf[s], minimo[s])
+            bigode_sup[s] = min(dir_[idx[-1]], cerca_sup[s], maximo[s])
+
+        return pd.DataFrame({
+            "q1": q1, "median": med, "q3": q3,
+            "lowerfence": np.minimum(bigode_inf, q1),
+            "upperfence": np.maximum(bigode_sup, q3),
+        }, index=pd.Index(self.sistemas, name="sistema"))
+
+    def consolidar(self, anos=None, nivel=None, peso=None, total=False):
+        """Consolidação por sistema e, opcionalmente, por grupo de `nivel`.
+
+        Uma linha por (sistema[, grupos até `nivel`]) com `linhas`
+        (fazendas-ano), os pesos totais `area` (ha) e `producao` (sacas) e
+        a média de cada métrica — simples ou ponderada por `peso`. Com
+        `total=True` vêm as somas (Σ x ou Σ w·x) no lugar das médias: com
+        peso = "area", o total do grupo das métricas por hectare.
+        """
+        p = self.ponderadas
+        if p is None:
+            raise ValueError("Cubo sem somas por grupo.")
+        if peso is not None and peso not in p.peso:
+            raise ValueError(f"Peso indisponível nos dados: {peso!r}")
+        m = self._sel_anos(anos)
+        k = 0 if nivel is None else p.niveis.index(nivel) + 1
+        # grupos finos -> grupos do nível (prefixo do rótulo)
+        rotulos = list(dict.fromkeys(g[:k] for g in p.grupos))
+        posicao = {r: i for i, r in enumerate(rotulos)}
+        mapa = np.zeros((len(p.grupos), len(rotulos)))
+        mapa[np.arange(len(p.grupos)), [posicao[g[:k]] for g in p.grupos]] = 1.0
+
+        def reduzir(arr):  # (anos, sistemas, grupos, ...) -> (sistemas, rótulos, ...)
+            return np.einsum("sg...,gk->sk...", arr[m].sum(axis=0), mapa)
+
+        if peso is None:
+            n, soma = reduzir(p.n), reduzir(p.soma)
+        else:
+            n, soma = reduzir(p.peso[peso]), reduzir(p.soma_pond[peso])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            media = np.where(n > 0, soma if total else soma / n, np.nan)
+
+        n_s, n_k = len(self.sistemas), len(rotulos)
+        indice = pd.MultiIndex.from_tuples(
+            [(s,) + tuple(r) for s in self.sistemas for r in rotulos],
+            names=["sistema"] + p.niveis[:k])
+        saida = pd.DataFrame({"linhas": reduzir(p.linhas).ravel()}, index=indice)
+        for nome in ("area", "producao"):
+            saida[nome] = reduzir(p.peso_total[nome]).ravel() \
+                if nome in p.peso_total else np.nan
+        saida = pd.concat([saida, pd.DataFrame(
+            media.reshape(n_s * n_k, -1), index=indice, columns=self.cols)],
+            axis=1)
+        return saida[saida["linhas"] > 0].reset_index()
+
+    def serie(self, col, anos=None):
+        """Média de `col` por (ano, sistema), no formato longo do gráfico."""
+        m = self._sel_anos(anos)
+        j = self.cols.index(col)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            media = self.soma[m, :, j] / self.count[m, :, j]
+        anos_sel = self.anos[m]
+        out = pd.DataFrame({
+            "ano": np.repeat(anos_sel, len(self.sistemas)),
+            "sistema": np.tile(self.sistemas, len(anos_sel)),
+            col: media.ravel(),
+        })
+        return out[self.count[m, :, j].ravel() > 0].reset_index(drop=True)
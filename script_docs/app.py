@@ -1,38 +1,36 @@
 import pandas as pd
 import numpy as np
+import os
+import uuid
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import urlencode
 
 import dash
-from dash import dcc, html, dash_table
+import flask
+from dash import dcc, html, dash_table, ctx, Patch
+from dash.dash_table.Format import Format, Group, Scheme
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
 import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 
-# ------------------------------------------------------------
-# Carregar dados
-# ------------------------------------------------------------
-DATA_PATH = Path(__file__).parent / "dados_cafe.csv"
-if not DATA_PATH.exists():
-    raise FileNotFoundError(
-        f"Não encontrei '{DATA_PATH.name}' na pasta do app. Gere o CSV antes.")
-
-df = pd.read_csv(DATA_PATH)
-
-# Garantir colunas derivadas
-if "fertilizante_kgN_ha" in df.columns and "N_kg_ha" not in df.columns:
-    df["N_kg_ha"] = df["fertilizante_kgN_ha"]
-if "lucro_Rsha" in df.columns and "rentabilidade_RSha" not in df.columns:
-    df["rentabilidade_RSha"] = df["lucro_Rsha"]
-if "custo_por_saca_R$" not in df.columns:
-    df["custo_por_saca_R$"] = df["custo_total_RSha"] / \
-        df["produtividade_sacas_ha"]
-if "margem_liquida_%" not in df.columns:
-    if "margem_liquida" in df.columns:
-        df["margem_liquida_%"] = 100 * df["margem_liquida"].astype(float)
-    else:
-        df["margem_liquida_%"] = 100 * \
-            (df["receita_total_RSha"] - df["custo_total_RSha"]) / \
-            df["receita_total_RSha"]
+from agregacao import NIVEIS, CuboAgregados
+from armazenamento import COLUNAS_ANO, carregar_dados, compactar
+from bootstrap import intervalos_diferenca
+from cache_resultados import CacheResultados, versao_arquivos
+from cenarios import (COLUNAS_CENARIO, cenarios_padrao, medias_cenarios,
+                      resumir)
+from compartilhado import abrir as abrir_compartilhado, anexar_ou_carregar, \
+    compartilhar, publicado
+from correlacao import METODOS, MatrizCorrelacao
+from ingestao import Dataset, Ingestor, MonitorIngestao, empilhar
+from metricas import METRICAS, etapa, fim_requisicao, inicio_requisicao, \
+    instrumentar, linhas
+from exportacao import FORMATOS, exportar, nome_arquivo
+from tabela_fazendas import ordem_linhas, pagina, separar_filtro
+from tarefas import FilaTarefas
 
 # ------------------------------------------------------------
 # Métricas e KPIs
@@ -59,6 +57,37 @@ METRICS = {
     "Infiltração (mm/h)":                    ("infiltracao_mm_h",       "up",   "num"),
 }
 
+# ------------------------------------------------------------
+# Carregar dados
+# ------------------------------------------------------------
+# Preferimos a pasta colunar (um .npy por coluna, aberta via mmap e já com
+# as colunas derivadas) gerada por `simulacao_cafe.py --formato npy`; o CSV
+# fica como fallback. Em ambos os casos só lemos as colunas usadas.
+#
+# Novas safras/fazendas podem chegar sem reiniciar o app: linhas
+# acrescentadas ao CSV ou arquivos `*.csv` em NOVOS_PATH são lidos a cada
+# INGEST_INTERVAL segundos (ou via POST /ingest) e entram em uma nova
+# versão do Dataset, trocada atomicamente (ver `ingestao.py`).
+# `CAFE_DADOS_DIR` aponta para outra pasta de dados (ex.: benchmarks).
+DADOS_DIR = Path(os.environ.get("CAFE_DADOS_DIR", Path(__file__).parent))
+DATA_PATH = DADOS_DIR / "dados_cafe.csv"
+COLUNAR_PATH = DADOS_DIR / "dados_cafe_colunas"
+NOVOS_PATH = DADOS_DIR / "dados_novos"
+INGEST_INTERVAL = float(os.environ.get("CAFE_INGEST_INTERVAL", "30"))
+# Dataset publicado uma vez em memória compartilhada e anexado pelos
+# demais workers (ver `compartilhado.py`)
+MEMORIA_COMPARTILHADA = os.environ.get("CAFE_MEMORIA_COMPARTILHADA", "0") == "1"
+# Bootstrap dos intervalos de confiança (réplicas). Roda no próprio worker,
+# numa thread da fila de tarefas: um pool de processos criado a partir de
+# uma thread do servidor teria de usar "spawn", que reimporta este módulo
+# (e recarrega os dados) em cada processo filho.
+BOOTSTRAP_REPS = int(os.environ.get("CAFE_BOOTSTRAP_REPS", "2000"))
+
+# Colunas usadas pelos gráficos além das métricas (região e cooperativa,
+# opcionais, só no consolidado)
+COLUNAS_BASE = ["farm_id", "ano", "sistema", "area_ha"] + NIVEIS
+COLUNAS_APP = COLUNAS_BASE + [col for col, _, _ in METRICS.values()]
+
 KPI_TOP = [
     "Produtividade (sacas/ha)",
     "Custo por saca (R$/sc)",
@@ -70,10 +99,36 @@ KPI_TOP = [
     "Diesel (L/ha)",
 ]
 
-anos_options = [{"label": str(a), "value": int(a)}
-                for a in sorted(df["ano"].unique())]
 metric_options = [{"label": k, "value": k} for k in METRICS.keys()]
 
+# Tabela de fazendas: identificação + todas as métricas
+TABLE_PAGE_SIZE = 15
+TABLE_COLUMNS = [
+    {"name": "Fazenda", "id": "farm_id", "type": "numeric"},
+    {"name": "Ano", "id": "ano", "type": "numeric"},
+    {"name": "Sistema", "id": "sistema", "type": "text"},
+] + [{"name": label, "id": col, "type": "numeric"}
+     for label, (col, _, _) in METRICS.items()]
+TABLE_IDS = [c["id"] for c in TABLE_COLUMNS]
+
+# Cenários "e se": todos são avaliados de uma vez por seleção de anos
+CENARIOS = cenarios_padrao()
+CENARIO_BASE = CENARIOS.index[0]
+cenario_options = [{"label": c, "value": c} for c in CENARIOS.index]
+metodo_options = [{"label": label, "value": m} for m, label in METODOS.items()]
+
+# Ponderação das médias de cards, benchmark, série e consolidado: por
+# fazenda-ano (simples), por área ou por produção (ver `agregacao.py`)
+PONDERACOES = {
+    "fazenda": ("Por fazenda", None),
+    "area": ("Por área", "area"),
+    "producao": ("Por produção", "producao"),
+}
+ponderacao_options = [{"label": label, "value": k}
+                      for k, (label, _) in PONDERACOES.items()]
+NIVEL_LABELS = {"sistema": "Sistema", "regiao": "Região",
+                "cooperativa": "Cooperativa"}
+
 # Dicionário para labels bonitos nos gráficos
 LABELS = {col: label for label, (col, _, _) in METRICS.items()}
 
@@ -94,41 +149,108 @@ def fmt_value(v, kind="num"):
     return "{:,.2f}".format(v).replace(",", "X").replace(".", ",").replace("X", ".")
 
 
-def agg_series(s, agg): return s.median() if agg == "median" else s.mean()
+# Colunas das métricas e sinal do "benefício" (+1 se maior é melhor)
+METRIC_COLS = [col for col, _, _ in METRICS.values()]
+BENEFIT_SIGN = np.array([-1.0 if d == "down" else 1.0
+                         for _, d, _ in METRICS.values()])
+SIGN_OF = dict(zip(METRICS, BENEFIT_SIGN))
 
 
-def compute_benchmark(data, agg="mean"):
-    rows = []
-    for label, (col, _, _) in METRICS.items():
-        if col not in data.columns:
-            continue
-        g = data.groupby("sistema")[col].apply(lambda x: agg_series(x, agg))
-        conv, reg = g.get("convencional", np.nan), g.get(
-            "regenerativo", np.nan)
-        diff_pct = (reg - conv) / conv * \
-            100 if pd.notna(conv) and conv != 0 else np.nan
-        rows.append((label, conv, reg, diff_pct))
-    return pd.DataFrame(rows, columns=["Indicador", "Convencional", "Regenerativo", "Diferença (%)"])
-
-
-def compute_kpis_cards(data, agg="mean"):
-    bench = compute_benchmark(data, agg).set_index("Indicador")
-    cards = {}
-    for k in KPI_TOP:
-        if k in bench.index:
-            conv, reg, diff = bench.loc[k, "Convencional"], bench.loc[k,
-                                                                      "Regenerativo"], bench.loc[k, "Diferença (%)"]
-            _, _, kind = METRICS[k]
-            cards[k] = (fmt_value(conv, kind), fmt_value(
-                reg, kind), fmt_value(diff, "perc"))
-    return cards
-
-
-def beneficial_signed_diff(row):
-    label = row["Indicador"]
-    val = row["Diferença (%)"]
-    _, direction, _ = METRICS.get(label, (None, "up", "num"))
-    return -val if direction == "down" else val
+def load_dataset():
+    """Lê os arquivos de dados e monta o Dataset (cópia privada)."""
+    if DATA_PATH.exists() or COLUNAR_PATH.exists():
+        df = carregar_dados(DATA_PATH, COLUNAR_PATH, COLUNAS_APP + COLUNAS_ANO,
+                            opcionais=NIVEIS)
+    else:
+        print(f"Aviso: '{DATA_PATH.name}' nem '{COLUNAR_PATH.name}' encontrados; "
+              "o painel começa vazio e aguarda a ingestão de dados.")
+        df = pd.DataFrame({c: pd.Series(dtype=object if c in ["sistema"] + NIVEIS
+                                         else float)
+                           for c in COLUNAS_APP})
+    # sistema categórico, inteiros pequenos, float32; constantes por ano à parte
+    df, tabela_anos = compactar(df)
+    # Cubo (ano x sistema x métrica) para responder a qualquer seleção de
+    # anos sem tocar nas linhas: médias, medianas, benchmark, cards e série.
+    return Dataset(df, CuboAgregados.de_dataframe(df, METRIC_COLS),
+                   versao_arquivos(DATA_PATH, COLUNAR_PATH), tabela_anos)
+
+
+# Linhas, cubo e versão formam o Dataset corrente; só é lido via `DATASET`.
+# Com memória compartilhada, só o primeiro worker lê os arquivos: os outros
+# anexam a versão que ele publicou (segundos, sem parse nem cópia).
+if MEMORIA_COMPARTILHADA:
+    DATASET = anexar_ou_carregar(versao_arquivos(DATA_PATH, COLUNAR_PATH),
+                                 load_dataset)
+else:
+    DATASET = load_dataset()
+
+INGESTOR = Ingestor(DATA_PATH, NOVOS_PATH, COLUNAS_APP + COLUNAS_ANO,
+                    METRIC_COLS,
+                    acompanhar_csv=not (COLUNAR_PATH / "manifesto.json").exists())
+
+
+def refresh_dataset():
+    """Incorpora linhas novas (se houver) e troca o Dataset corrente."""
+    global DATASET
+    if MEMORIA_COMPARTILHADA:
+        # versão já publicada por outro worker: só anexa
+        novo = INGESTOR.atualizar(DATASET, existente=lambda v: (
+            abrir_compartilhado(v) if publicado(v) else None))
+        if novo is not DATASET:
+            novo = compartilhar(novo)
+    else:
+        novo = INGESTOR.atualizar(DATASET)
+    if novo is not DATASET:
+        DATASET = novo  # troca atômica da referência
+        print(f"[ingestão] versão {novo.versao}: {len(novo.df):,} linhas, "
+              f"anos {novo.anos}", flush=True)
+    return DATASET
+
+
+refresh_dataset()  # arquivos já presentes em NOVOS_PATH
+anos_options = [{"label": str(a), "value": a} for a in DATASET.anos]
+nivel_options = [{"label": NIVEL_LABELS.get(n, n), "value": n}
+                 for n in ["sistema"] + DATASET.cube.ponderadas.niveis]
+
+
+def aggregate_by_sistema(data, aggs=("mean", "median")):
+    """Estatísticas de todas as métricas por sistema, em um único groupby.
+
+    Devolve um dicionário agg -> DataFrame (sistema x coluna).
+    """
+    cols = [c for c in METRIC_COLS if c in data.columns]
+    g = data.groupby("sistema", observed=True)[cols].agg(list(aggs))
+    return {agg: g.xs(agg, axis=1, level=1) for agg in aggs}
+
+
+def compute_benchmark(data, agg="mean", aggregated=None):
+    """Tabela Convencional x Regenerativo para todas as métricas.
+
+    `aggregated` (saída de `aggregate_by_sistema` ou de
+    `CuboAgregados.estatisticas`) dispensa `data` e reaproveita agregados
+    prontos. A diferença (%) e o benefício ajustado pela direção da
+    métrica são calculados como vetores.
+    """
+    if aggregated is None:
+        aggregated = aggregate_by_sistema(data, (agg,))
+    tab = aggregated[agg].reindex(["convencional", "regenerativo"])
+
+    present = np.array([col in tab.columns for col in METRIC_COLS])
+    labels = [label for label, ok in zip(METRICS, present) if ok]
+    cols = [col for col, ok in zip(METRIC_COLS, present) if ok]
+    conv = tab[cols].loc["convencional"].to_numpy(dtype=float)
+    reg = tab[cols].loc["regenerativo"].to_numpy(dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff_pct = np.where(conv != 0, (reg - conv) / conv * 100, np.nan)
+
+    return pd.DataFrame({
+        "Indicador": labels,
+        "Convencional": conv,
+        "Regenerativo": reg,
+        "Diferença (%)": diff_pct,
+        "Benefício Ajustado (%)": diff_pct * BENEFIT_SIGN[present],
+    })
 
 
 # ------------------------------------------------------------
@@ -169,6 +291,47 @@ app.layout = dbc.Container(fluid=True, className="tight", children=[
 
 
 
+    # Seleção de anos normalizada (chave da visão filtrada no servidor)
+    dcc.Store(id="anos-key"),
+    # Versão dos dados exibida; o intervalo verifica se houve ingestão
+    dcc.Store(id="versao-dados", data=DATASET.versao),
+    # Tarefas em segundo plano da seleção atual — bootstrap e matriz de
+    # correlações ({"id", "anos", "versao", "sessao", "pronto"})
+    dcc.Store(id="tarefa-ci"),
+    dcc.Store(id="tarefa-corr"),
+    dcc.Interval(id="intervalo-tarefas", interval=700, disabled=True),
+    dcc.Interval(id="intervalo-dados",
+                 interval=max(INGEST_INTERVAL, 5) * 1000,
+                 disabled=INGEST_INTERVAL <= 0),
+
+    # Cenário "e se" (preço, custos, fatores de emissão)
+    dbc.Row(
+        dbc.Col(html.Div([
+            html.Span("Cenário", className="header-label me-2"),
+            dcc.Dropdown(
+                id="filtro-cenario",
+                options=cenario_options,
+                value=CENARIO_BASE,
+                clearable=False,
+                className="dd-compact",
+                style={"width": "280px", "marginRight": "16px"}
+            ),
+            html.Span("Médias", className="header-label me-2"),
+            dcc.RadioItems(
+                id="filtro-ponderacao",
+                options=ponderacao_options,
+                value="fazenda",
+                inline=True,
+                inputStyle={"margin-right": "6px", "margin-left": "12px"},
+                style={"marginRight": "16px"}
+            ),
+            # Progresso do bootstrap (intervalos de confiança)
+            dbc.Progress(id="progresso-ci", value=0, label="", striped=True,
+                         style={"width": "160px", "height": "14px"}),
+        ], style={"display": "flex", "alignItems": "center"}), width=12),
+        className="mb-2"
+    ),
+
     # KPI Cards
     dbc.Row(id="row-kpis", className="gx-1 gy-1 section-separator"),
 
@@ -290,6 +453,129 @@ app.layout = dbc.Container(fluid=True, className="tight", children=[
             md=6
         )
     ], className="gx-1 gy-1 section-separator"),
+
+    # ===== LINHA 3: Matriz de correlação (todas as métricas, por sistema) =====
+    dbc.Row([
+        dbc.Col(
+            dbc.Card([
+                dbc.CardHeader(
+                    html.Div([
+                        html.Span("Correlações | clique para ver o par na dispersão",
+                                  className="header-label"),
+                        dcc.RadioItems(
+                            id="filtro-correlacao",
+                            options=metodo_options,
+                            value="pearson",
+                            inline=True,
+                            inputStyle={"margin-right": "6px",
+                                        "margin-left": "12px"}
+                        ),
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "space-between",
+                        "alignItems": "center",
+                        "width": "100%"
+                    })
+                ),
+                dbc.CardBody(
+                    dcc.Graph(
+                        id="graf-correlacao",
+                        style={"height": "520px"},
+                        config={"displayModeBar": False}
+                    )
+                ),
+            ]),
+            md=12
+        )
+    ], className="gx-1 gy-1 section-separator"),
+
+    # ===== LINHA 4: Consolidado por sistema, região ou cooperativa =====
+    dbc.Row([
+        dbc.Col(
+            dbc.Card([
+                dbc.CardHeader(
+                    html.Div([
+                        html.Span("Consolidado", className="header-label"),
+                        html.Div([
+                            dcc.Dropdown(
+                                id="filtro-nivel",
+                                options=nivel_options,
+                                value=nivel_options[-1]["value"],
+                                clearable=False,
+                                className="dd-compact",
+                                style={"width": "180px", "marginRight": "16px"}
+                            ),
+                            html.Span("Exportar:", className="me-2"),
+                            html.A("CSV", id="export-consolidado-csv",
+                                   href="/export/consolidado", className="me-2"),
+                            html.A("Parquet", id="export-consolidado-parquet",
+                                   href="/export/consolidado?formato=parquet"),
+                        ], style={"display": "flex", "alignItems": "center"}),
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "space-between",
+                        "alignItems": "center",
+                        "width": "100%"
+                    })
+                ),
+                dbc.CardBody(
+                    dash_table.DataTable(
+                        id="tabela-consolidado",
+                        page_size=TABLE_PAGE_SIZE,
+                        sort_action="native",
+                        style_table={"overflowX": "auto"},
+                        style_header={"whiteSpace": "normal", "height": "auto"},
+                    )
+                ),
+            ]),
+            md=12
+        )
+    ], className="gx-1 gy-1 section-separator"),
+
+    # ===== LINHA 5: Fazendas (paginação, ordenação e filtro no servidor) =====
+    dbc.Row([
+        dbc.Col(
+            dbc.Card([
+                dbc.CardHeader(
+                    html.Div([
+                        html.Span("Fazendas", className="header-label"),
+                        # Exporta o estado atual (anos, filtro e ordenação)
+                        html.Div([
+                            html.Span("Exportar:", className="me-2"),
+                            html.A("CSV", id="export-csv", href="/export/fazendas",
+                                   className="me-2"),
+                            html.A("Parquet", id="export-parquet",
+                                   href="/export/fazendas?formato=parquet"),
+                        ]),
+                    ], style={
+                        "display": "flex",
+                        "justifyContent": "space-between",
+                        "alignItems": "center",
+                        "width": "100%"
+                    })
+                ),
+                dbc.CardBody(
+                    dash_table.DataTable(
+                        id="tabela-fazendas",
+                        columns=TABLE_COLUMNS,
+                        page_current=0,
+                        page_size=TABLE_PAGE_SIZE,
+                        page_action="custom",
+                        sort_action="custom",
+                        sort_mode="multi",
+                        sort_by=[],
+                        filter_action="custom",
+                        filter_query="",
+                        style_table={"overflowX": "auto"},
+                        style_header={"whiteSpace": "normal", "height": "auto"},
+                        style_filter={"backgroundColor": "#1c1f27",
+                                      "color": "#e0e0e0"},
+                    )
+                ),
+            ]),
+            md=12
+        )
+    ], className="gx-1 gy-1 section-separator"),
     html.Hr(),
 
     # Footer
@@ -310,27 +596,250 @@ app.layout = dbc.Container(fluid=True, className="tight", children=[
 # ------------------------------------------------------------
 # Callbacks
 # ------------------------------------------------------------
+# Cada figura depende só das entradas que usa. A seleção de anos é
+# normalizada uma vez em `anos-key` ({"anos": lista ordenada, "versao"})
+# e a visão filtrada correspondente fica em cache no próprio Dataset.
+#
+# Figuras e benchmark são funções puras de (Dataset, anos, métricas) e
+# passam pelo RESULT_CACHE: LRU por tamanho, compartilhado entre os workers
+# da máquina (diskcache). O Dataset entra na chave pela sua versão, então
+# dados novos (arquivos alterados ou ingestão) invalidam os resultados.
+COLOR_SEQ = ["#5DADE2", "#58D68D"]
+
+RESULT_CACHE = CacheResultados(DATASET.versao)
+# Cálculos pesados (bootstrap) em segundo plano, com progresso e cancelamento
+TAREFAS = FilaTarefas()
+
+
+def preco_base(ds):
+    """Preço da saca com que cada ano foi simulado (tabela de constantes)."""
+    if ds.tabela_anos is None or "preco_saca_Reais" not in ds.tabela_anos:
+        return None
+    return {int(a): float(v)
+            for a, v in ds.tabela_anos["preco_saca_Reais"].items()}
+
+
+def peso_de(ds, ponderacao):
+    """Peso do cubo para a ponderação escolhida (None = por fazenda)."""
+    peso = PONDERACOES.get(ponderacao, (None, None))[1]
+    return peso if peso in ds.cube.ponderadas.peso else None
+
+
+def cubo_de(ds, ponderacao):
+    """Cubo do Dataset com as médias na ponderação escolhida."""
+    return ds.cube.ponderado(peso_de(ds, ponderacao))
+
+
+@RESULT_CACHE.memoize
+def scenario_means(ds, anos_key, ponderacao="fazenda"):
+    return medias_cenarios(cubo_de(ds, ponderacao), CENARIOS, anos_key,
+                           preco_base(ds))
+
+
+@RESULT_CACHE.memoize
+def benchmark_for(ds, anos_key, cenario=CENARIO_BASE, ponderacao="fazenda"):
+    """Benchmark (média) dos anos selecionados, a partir do cubo.
+
+    Fora do cenário base, as colunas afetadas pelo cenário (receita,
+    custos, margem, emissões) são trocadas pelas médias recalculadas.
+    Com ponderação por área ou produção, todas as médias são ponderadas.
+    """
+    aggregated = cubo_de(ds, ponderacao).estatisticas(anos_key, ("mean",))
+    if cenario != CENARIO_BASE and cenario in CENARIOS.index:
+        media = aggregated["mean"].copy()
+        for col, tab in scenario_means(ds, anos_key, ponderacao).items():
+            if col in media.columns:
+                media[col] = tab.loc[cenario].reindex(media.index)
+        aggregated = {"mean": media}
+    return compute_benchmark(None, aggregated=aggregated)
+
+
+def style_figure(fig):
+    """Uniformização visual comum a todos os gráficos."""
+    fig.update_layout(
+        margin=dict(l=8, r=8, t=30, b=8),
+        height=380,
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="#EDEDED"),
+        # xaxis_title=None,
+        # yaxis_title=None,
+    )
+    # Linhas de grade brancas com 5% de opacidade
+    fig.update_xaxes(showgrid=True, gridcolor="rgba(255,255,255,0.05)")
+    fig.update_yaxes(showgrid=True, gridcolor="rgba(255,255,255,0.05)")
+    return fig
 
 
 @app.callback(
-    Output("row-kpis", "children"),
-    Output("graf-benchmark", "figure"),
-    Output("graf-box", "figure"),
-    Output("graf-serie", "figure"),
-    Output("graf-scatter", "figure"),
+    Output("versao-dados", "data"),
+    Output("filtro-anos", "options"),
+    Output("filtro-anos", "value"),
+    Input("intervalo-dados", "n_intervals"),
+    State("versao-dados", "data"),
+    State("filtro-anos", "options"),
+    State("filtro-anos", "value"),
+)
+@instrumentar
+def sync_dataset(_, versao, options, anos_sel):
+    # Nova versão dos dados neste worker: atualiza as opções de ano e
+    # marca como selecionados os anos que acabaram de aparecer.
+    ds = DATASET
+    if versao == ds.versao:
+        return dash.no_update, dash.no_update, dash.no_update
+    antigos = {o["value"] for o in (options or [])}
+    novos = [a for a in ds.anos if a not in antigos]
+    opcoes = [{"label": str(a), "value": a} for a in ds.anos]
+    return ds.versao, opcoes, sorted(set(anos_sel or []) | set(novos))
+
+
+@app.callback(
+    Output("anos-key", "data"),
     Input("filtro-anos", "value"),
-    Input("filtro-metrica", "value"),
-    Input("scatter-x", "value"),
-    Input("scatter-y", "value"),
+    Input("versao-dados", "data"),
+)
+@instrumentar
+def select_years(anos_sel, _):
+    # Seleção de anos (fallback: todos)
+    ds = DATASET
+    anos = sorted(int(a) for a in anos_sel) if anos_sel else ds.anos
+    return {"anos": anos, "versao": ds.versao}
+
+
+@app.callback(
+    Output("row-kpis", "children"),
+    Input("anos-key", "data"),
+    Input("filtro-cenario", "value"),
+    Input("tarefa-ci", "data"),
+    Input("filtro-ponderacao", "value"),
 )
-def update_all(anos_sel, metrica, mx, my):
-    # Seleção de anos (fallback)
-    if not anos_sel:
-        anos_sel = sorted(df["ano"].unique().tolist())
-    dff = df[df["ano"].isin(anos_sel)].copy()
-
-    # ---- KPI cards (média sempre) ----
-    bench_cards = compute_benchmark(dff).set_index("Indicador")
+@instrumentar
+def update_kpis(sel, cenario, tarefa, ponderacao):
+    return build_kpi_cards(DATASET, tuple(sel["anos"]), cenario,
+                           ready_job(tarefa, sel), ponderacao)
+
+
+def benchmark_ci(ds, anos_key, progresso=None):
+    """IC 95% (bootstrap) da Diferença (%) de cada indicador.
+
+    Reamostra fazendas (com todos os seus anos selecionados) dentro de
+    cada sistema. Roda como tarefa em
+    segundo plano (ver `update_jobs`); o resultado fica na fila de
+    tarefas, uma vez por seleção de anos e versão dos dados.
+    """
+    grupos = ds.por_sistema(anos_key)
+    sistemas = ("convencional", "regenerativo")
+    X = {s: empilhar(grupos.get(s, []), METRIC_COLS) for s in sistemas}
+    ids = {s: np.concatenate([p["farm_id"].to_numpy() for p in grupos[s]])
+           if grupos.get(s) else np.empty(0) for s in sistemas}
+    ci = intervalos_diferenca(X["convencional"], X["regenerativo"], METRIC_COLS,
+                              BOOTSTRAP_REPS, progresso=progresso,
+                              ids_conv=ids["convencional"],
+                              ids_reg=ids["regenerativo"])
+    ci.index = pd.Index(list(METRICS), name="Indicador")
+    return ci
+
+
+def ci_for(ci_job, cenario, ponderacao="fazenda"):
+    """IC por indicador (NaN enquanto a tarefa não terminou).
+
+    Colunas alteradas pelo cenário ficam sem IC; o bootstrap é das médias
+    por fazenda, então médias ponderadas também ficam sem IC.
+    """
+    ci = TAREFAS.resultado(ci_job) if ci_job else None
+    if ci is None or PONDERACOES.get(ponderacao, (None, None))[1] is not None:
+        return pd.DataFrame(np.nan, index=pd.Index(list(METRICS), name="Indicador"),
+                            columns=["diferenca", "ic_inf", "ic_sup", "ep"])
+    if cenario != CENARIO_BASE:
+        ci = ci.copy()
+        afetados = [LABELS[c] for c in COLUNAS_CENARIO if c in LABELS]
+        ci.loc[ci.index.isin(afetados), ["ic_inf", "ic_sup"]] = np.nan
+    return ci
+
+
+def ready_job(tarefa, sel):
+    """Id da tarefa (IC ou correlações) se ela terminou e é da seleção atual."""
+    if tarefa and tarefa.get("pronto") and tarefa.get("anos") == sel["anos"] \
+            and tarefa.get("versao") == sel.get("versao"):
+        return tarefa["id"]
+    return None
+
+
+def submit_job(tarefa, sel, sessao, chave, func):
+    """Submete `func(ds, anos_key)` e desiste da tarefa anterior desta sessão."""
+    ds = DATASET
+    with etapa("submeter"):
+        tid = TAREFAS.submeter(chave, func, ds, tuple(sel["anos"]),
+                               sessao=sessao)
+    if tarefa and tarefa.get("id") != tid and not tarefa.get("pronto"):
+        TAREFAS.cancelar(tarefa["id"], sessao)
+    return {"id": tid, "anos": sel["anos"], "versao": sel.get("versao"),
+            "sessao": sessao, "pronto": False}
+
+
+def poll_job(tarefa):
+    """(estado, valor do Store): o Store só muda na transição para "pronto"."""
+    st = TAREFAS.estado(tarefa["id"]) or {"estado": "erro", "progresso": 0}
+    if st["estado"] == "pronto" and not tarefa["pronto"]:
+        return st, {**tarefa, "pronto": True}
+    return st, dash.no_update
+
+
+@app.callback(
+    Output("tarefa-ci", "data"),
+    Output("tarefa-corr", "data"),
+    Output("intervalo-tarefas", "disabled"),
+    Output("progresso-ci", "value"),
+    Output("progresso-ci", "label"),
+    Input("anos-key", "data"),
+    Input("intervalo-tarefas", "n_intervals"),
+    State("tarefa-ci", "data"),
+    State("tarefa-corr", "data"),
+)
+@instrumentar
+def update_jobs(sel, _, tarefa, tarefa_corr):
+    """Dispara (ou acompanha) o bootstrap e as correlações dos anos atuais.
+
+    Mudar a seleção desiste das tarefas anteriores (canceladas se ninguém
+    mais as acompanha); seleções iguais em outras sessões reaproveitam as
+    mesmas tarefas ou os resultados prontos. A sessão (aba) é identificada
+    por um id guardado junto das tarefas no próprio Store.
+    """
+    ds = DATASET
+    anos_key = tuple(sel["anos"])
+    if ctx.triggered_id != "intervalo-tarefas" or not tarefa or not tarefa_corr:
+        sessao = (tarefa or tarefa_corr or {}).get("sessao") or uuid.uuid4().hex
+        tarefa = submit_job(
+            tarefa, sel, sessao,
+            ("benchmark_ci", ds.versao, anos_key, BOOTSTRAP_REPS), benchmark_ci)
+        tarefa_corr = submit_job(
+            tarefa_corr, sel, sessao,
+            ("correlacoes", ds.versao, anos_key), correlation_job)
+        saida_ci, saida_corr = tarefa, tarefa_corr
+    else:
+        saida_ci = saida_corr = dash.no_update
+
+    st, novo = poll_job(tarefa)
+    saida_ci = novo if novo is not dash.no_update else saida_ci
+    st_corr, novo = poll_job(tarefa_corr)
+    saida_corr = novo if novo is not dash.no_update else saida_corr
+    parado = "executando" not in (st["estado"], st_corr["estado"])
+    if st["estado"] == "executando":
+        pct = round(100 * st["progresso"])
+        return saida_ci, saida_corr, parado, pct, f"IC {pct}%"
+    if st["estado"] != "pronto":
+        return saida_ci, saida_corr, parado, 0, "IC indisponível"
+    return saida_ci, saida_corr, parado, 100, "IC 95%"
+
+
+@RESULT_CACHE.memoize
+def build_kpi_cards(ds, anos_key, cenario=CENARIO_BASE, ci_job=None,
+                    ponderacao="fazenda"):
+    with etapa("benchmark"):
+        bench_cards = benchmark_for(
+            ds, anos_key, cenario, ponderacao).set_index("Indicador")
+    with etapa("ic"):
+        ci = ci_for(ci_job, cenario, ponderacao)
     kpi_cards = []
     for label in KPI_TOP:
         if label in bench_cards.index:
@@ -339,8 +848,11 @@ def update_all(anos_sel, metrica, mx, my):
             reg = fmt_value(
                 bench_cards.loc[label, "Regenerativo"], METRICS[label][2])
             diff = fmt_value(bench_cards.loc[label, "Diferença (%)"], "perc")
+            lo, hi = ci.loc[label, "ic_inf"], ci.loc[label, "ic_sup"]
+            faixa = "" if pd.isna(lo) else \
+                f"IC 95%: {fmt_value(lo, 'perc')} a {fmt_value(hi, 'perc')}"
         else:
-            conv, reg, diff = "–", "–", "–"
+            conv, reg, diff, faixa = "–", "–", "–", ""
 
         kpi_cards.append(
             dbc.Col(
@@ -353,34 +865,63 @@ def update_all(anos_sel, metrica, mx, my):
                                  html.Span(reg,  className="kpi-value")], className="kpi-line"),
                         html.Hr(),
                         html.Div("Reg vs Conv", className="kpi-legend"),
-                        html.Div(diff, className="kpi-diff")
+                        html.Div(diff, className="kpi-diff"),
+                        html.Div(faixa, className="kpi-legend")
                     ])
                 ], className="kpi-card mini"),
                 md=3
             )
         )
+    return kpi_cards
+
+
+@app.callback(
+    Output("graf-benchmark", "figure"),
+    Input("anos-key", "data"),
+    Input("filtro-cenario", "value"),
+    Input("tarefa-ci", "data"),
+    Input("filtro-ponderacao", "value"),
+)
+@instrumentar
+def update_benchmark(sel, cenario, tarefa, ponderacao):
+    return build_benchmark_figure(DATASET, tuple(sel["anos"]), cenario,
+                                  ready_job(tarefa, sel), ponderacao)
+
 
-    # ---- Benchmark ----
-    bench = compute_benchmark(dff)
-    bench["Benefício Ajustado (%)"] = bench.apply(
-        beneficial_signed_diff, axis=1)
+@RESULT_CACHE.memoize
+def build_benchmark_figure(ds, anos_key, cenario=CENARIO_BASE, ci_job=None,
+                           ponderacao="fazenda"):
+    with etapa("benchmark"):
+        bench = benchmark_for(ds, anos_key, cenario, ponderacao)
     bench_sorted = bench.sort_values(
         "Benefício Ajustado (%)", ascending=False)
     colors = ["#13CE66" if v >=
               0 else "#FF6B6B" for v in bench_sorted["Benefício Ajustado (%)"]]
 
-    fig_bench = px.bar(
-        bench_sorted,
-        x="Benefício Ajustado (%)", y="Indicador", orientation="h",
-        text=bench_sorted["Diferença (%)"].map(lambda v: fmt_value(v, "perc"))
-    )
+    # IC da diferença levado ao eixo do benefício (sinal pode inverter a faixa)
+    with etapa("ic"):
+        ci = ci_for(ci_job, cenario, ponderacao).reindex(
+            bench_sorted["Indicador"])
+    sinal = np.array([SIGN_OF[label] for label in bench_sorted["Indicador"]])
+    a, b = ci["ic_inf"].to_numpy() * sinal, ci["ic_sup"].to_numpy() * sinal
+    valor = bench_sorted["Benefício Ajustado (%)"].to_numpy()
+
+    with etapa("figura"):
+        fig_bench = px.bar(
+            bench_sorted,
+            x="Benefício Ajustado (%)", y="Indicador", orientation="h",
+            text=bench_sorted["Diferença (%)"].map(lambda v: fmt_value(v, "perc")),
+            error_x=np.fmax(a, b) - valor, error_x_minus=valor - np.fmin(a, b)
+        )
 
     fig_bench.update_traces(marker_color=colors,
                             textposition="outside",     # texto à direita
                             insidetextanchor="start",   # ancora as barras à esquerda
                             # fonte menor e 80% opaca
                             textfont=dict(
-                                size=11, color="rgba(255,255,255,0.8)")
+                                size=11, color="rgba(255,255,255,0.8)"),
+                            error_x=dict(color="rgba(255,255,255,0.6)",
+                                         thickness=1, width=3)
                             )
 
     fig_bench.update_layout(
@@ -400,42 +941,418 @@ def update_all(anos_sel, metrica, mx, my):
         gridcolor="rgba(255,255,255,0.1)",  # cor mais suave
         zeroline=False
     )
+    return style_figure(fig_bench)
+
+
+@app.callback(
+    Output("graf-box", "figure"),
+    Input("anos-key", "data"),
+    Input("filtro-metrica", "value"),
+)
+@instrumentar
+def update_box(sel, metrica):
+    return build_box_figure(DATASET, tuple(sel["anos"]), metrica)
 
-    # ---- Boxplot (métrica escolhida) ----
+
+@RESULT_CACHE.memoize
+def build_box_figure(ds, anos_key, metrica):
+    # Quartis e bigodes calculados no servidor (cubo): o payload não
+    # depende do número de linhas, só do número de sistemas.
     col_box = METRICS[metrica][0]
-    fig_box = px.box(
-        dff, x="sistema", y=col_box, color="sistema",
-        points=False, color_discrete_sequence=["#5DADE2", "#58D68D"],
-        labels=LABELS
-    )
-    fig_box.update_layout(showlegend=False)
+    with etapa("cubo"):
+        stats = ds.cube.caixa(col_box, anos_key).dropna(subset=["median"])
+    with etapa("figura"):
+        fig_box = go.Figure([
+            go.Box(
+                x=[sistema], name=sistema,
+                q1=[r["q1"]], median=[r["median"]], q3=[r["q3"]],
+                lowerfence=[r["lowerfence"]], upperfence=[r["upperfence"]],
+                marker_color=color, boxpoints=False,
+            )
+            for (sistema, r), color in zip(stats.iterrows(), COLOR_SEQ)
+        ])
+    fig_box.update_layout(showlegend=False,
+                          xaxis_title="sistema", yaxis_title=LABELS[col_box])
     fig_box.update_layout(
         xaxis_title_font=dict(size=12),
         yaxis_title_font=dict(size=12)
     )
+    return style_figure(fig_box)
 
-    # ---- Série temporal (média sempre) ----
-    grp = dff.groupby(["ano", "sistema"])[col_box].mean().reset_index()
-    fig_series = px.line(
-        grp, x="ano", y=col_box, color="sistema", markers=True,
-        color_discrete_sequence=["#5DADE2", "#58D68D"],
-        labels=LABELS
-    )
-    fig_series.update_xaxes(dtick=1)
+
+@app.callback(
+    Output("graf-serie", "figure"),
+    Input("anos-key", "data"),
+    Input("filtro-metrica", "value"),
+    Input("filtro-ponderacao", "value"),
+)
+@instrumentar
+def update_series(sel, metrica, ponderacao):
+    # Só a métrica mudou: os traços (um por sistema) e o layout continuam
+    # os mesmos, então enviamos apenas os novos valores de y e os rótulos.
+    if ctx.triggered_id == "filtro-metrica":
+        col = METRICS[metrica][0]
+        with etapa("cubo"):
+            grp = cubo_de(DATASET, ponderacao).serie(col, tuple(sel["anos"]))
+        patch = Patch()
+        label = LABELS.get(col, col)
+        for i, (sistema, g) in enumerate(grp.groupby("sistema", sort=False)):
+            patch["data"][i]["y"] = g[col].tolist()
+            patch["data"][i]["hovertemplate"] = (
+                f"sistema={sistema}<br>ano=%{{x}}<br>{label}=%{{y}}<extra></extra>")
+        patch["layout"]["yaxis"]["title"]["text"] = label
+        return patch
+
+    return build_series_figure(DATASET, tuple(sel["anos"]), metrica, ponderacao)
+
+
+@RESULT_CACHE.memoize
+def build_series_figure(ds, anos_key, metrica, ponderacao="fazenda"):
+    # Série temporal (média, na ponderação escolhida), direto do cubo
+    col = METRICS[metrica][0]
+    with etapa("cubo"):
+        grp = cubo_de(ds, ponderacao).serie(col, anos_key)
+    with etapa("figura"):
+        fig_series = px.line(
+            grp, x="ano", y=col, color="sistema", markers=True,
+            color_discrete_sequence=COLOR_SEQ,
+            labels=LABELS
+        )
+    # horizontes longos (modo dinâmico da simulação): um rótulo a cada 5 anos
+    fig_series.update_xaxes(dtick=1 if len(anos_key) <= 12 else 5)
     fig_series.update_layout(
         xaxis_title_font=dict(size=12),
         yaxis_title_font=dict(size=12)
     )
+    return style_figure(fig_series)
+
+
+# Consolidado: totais do grupo (Σ área·x das métricas por hectare) e
+# intensidades (médias na ponderação escolhida; por produção, custo e
+# pegada por saca viram razão de totais, como nos relatórios das
+# cooperativas). Tudo sai das somas por grupo do cubo, sem tocar nas linhas.
+CONSOLIDADO_TOTAIS = {
+    "Receita (R$ mil)": ("receita_total_RSha", 1e-3),
+    "Custo (R$ mil)": ("custo_total_RSha", 1e-3),
+    "Emissões (t CO₂e)": ("CI_ha_tCO2e", 1.0),
+    "Água (mil m³)": ("agua_total_m3ha", 1e-3),
+}
+CONSOLIDADO_MEDIAS = ["Produtividade (sacas/ha)", "Custo por saca (R$/sc)",
+                      "Pegada de carbono (kg CO₂e/saca)", "Margem líquida (%)"]
+
+
+@RESULT_CACHE.memoize
+def rollup_for(ds, anos_key, nivel="sistema", ponderacao="fazenda"):
+    """Consolidado por sistema (e região/cooperativa) dos anos selecionados."""
+    ponderadas = ds.cube.ponderadas
+    nivel = nivel if nivel in ponderadas.niveis else None
+    chaves = ["sistema"] + (ponderadas.niveis[:ponderadas.niveis.index(nivel) + 1]
+                            if nivel else [])
+    medias = ds.cube.consolidar(anos_key, nivel, peso_de(ds, ponderacao))
+    tabela = medias[chaves + ["linhas", "area", "producao"]].rename(columns={
+        **NIVEL_LABELS, "linhas": "Fazendas-ano", "area": "Área (ha)",
+        "producao": "Produção (sacas)"})
+    if "area" in ponderadas.peso:
+        totais = ds.cube.consolidar(anos_key, nivel, "area", total=True)
+        for label, (col, escala) in CONSOLIDADO_TOTAIS.items():
+            if col in totais.columns:
+                tabela[label] = totais[col].to_numpy() * escala
+    for label in CONSOLIDADO_MEDIAS:
+        col = METRICS[label][0]
+        if col in medias.columns:
+            tabela[label] = medias[col].to_numpy()
+    return tabela
+
+
+@app.callback(
+    Output("tabela-consolidado", "columns"),
+    Output("tabela-consolidado", "data"),
+    Output("export-consolidado-csv", "href"),
+    Output("export-consolidado-parquet", "href"),
+    Input("anos-key", "data"),
+    Input("filtro-nivel", "value"),
+    Input("filtro-ponderacao", "value"),
+)
+@instrumentar
+def update_rollup(sel, nivel, ponderacao):
+    with etapa("cubo"):
+        tabela = rollup_for(DATASET, tuple(sel["anos"]), nivel, ponderacao)
+    colunas = []
+    for col in tabela.columns:
+        if col in NIVEL_LABELS.values():
+            colunas.append({"name": col, "id": col, "type": "text"})
+        else:
+            casas = 0 if col == "Fazendas-ano" else 2
+            colunas.append({"name": col, "id": col, "type": "numeric",
+                            "format": Format(precision=casas, scheme=Scheme.fixed,
+                                             group=Group.yes)})
+    dados = tabela.astype(object).where(tabela.notna(), None).to_dict("records")
+    params = {"anos": ",".join(str(a) for a in sel["anos"]), "nivel": nivel,
+              "ponderacao": ponderacao}
+    return (colunas, dados, f"/export/consolidado?{urlencode(params)}",
+            f"/export/consolidado?{urlencode({**params, 'formato': 'parquet'})}")
+
+
+# Correlações: a matriz completa (Pearson e Spearman, por sistema) é
+# calculada uma vez por seleção de anos como tarefa em segundo plano (ver
+# `update_jobs`) — ~2,4 s com 1 milhão de linhas, que não cabem dentro
+# do callback da dispersão. O heatmap e as anotações da dispersão (r, R², ρ
+# e reta) só leem do resultado pronto; a exportação, que precisa da matriz
+# na hora, usa `correlation_for` (cache de resultados).
+def correlation_job(ds, anos_key, progresso=None):
+    return MatrizCorrelacao.de_grupos(
+        {s: empilhar(partes, METRIC_COLS)
+         for s, partes in ds.por_sistema(anos_key).items()}, METRIC_COLS,
+        progresso)
+
+
+@RESULT_CACHE.memoize
+def correlation_for(ds, anos_key):
+    return correlation_job(ds, anos_key)
+
+
+def correlation_matrix(ds, anos_key, corr_job=None):
+    """Matriz da tarefa `corr_job` (pronta) ou, sem tarefa, calculada na hora."""
+    corr = TAREFAS.resultado(corr_job) if corr_job else None
+    return corr if corr is not None else correlation_for(ds, anos_key)
+
+
+@app.callback(
+    Output("graf-correlacao", "figure"),
+    Input("anos-key", "data"),
+    Input("filtro-correlacao", "value"),
+    Input("tarefa-corr", "data"),
+)
+@instrumentar
+def update_correlation(sel, metodo, tarefa):
+    corr_job = ready_job(tarefa, sel)
+    if corr_job is None:
+        fig = style_figure(go.Figure())
+        fig.update_layout(height=520, annotations=[dict(
+            text="calculando correlações…", showarrow=False,
+            xref="paper", yref="paper", x=0.5, y=0.5)])
+        fig.update_xaxes(visible=False)
+        fig.update_yaxes(visible=False)
+        return fig
+    return build_correlation_figure(DATASET, tuple(sel["anos"]), metodo,
+                                    corr_job)
+
+
+@RESULT_CACHE.memoize
+def build_correlation_figure(ds, anos_key, metodo="pearson", corr_job=None):
+    with etapa("correlacao"):
+        corr = correlation_matrix(ds, anos_key, corr_job)
+    rotulos = list(METRICS)
+    with etapa("figura"):
+        fig = make_subplots(rows=1, cols=max(len(corr.sistemas), 1),
+                            shared_yaxes=True, horizontal_spacing=0.02,
+                            subplot_titles=corr.sistemas)
+        for s, sistema in enumerate(corr.sistemas):
+            z = getattr(corr, metodo)[s]
+            fig.add_trace(go.Heatmap(
+                z=np.round(z, 3).astype(np.float32), x=rotulos, y=rotulos,
+                customdata=corr.n[s].astype(np.int32),
+                zmin=-1, zmax=1, colorscale="RdBu", showscale=s == 0,
+                colorbar=dict(thickness=10, len=0.9),
+                hovertemplate=(f"%{{y}} × %{{x}}<br>{METODOS[metodo]} = "
+                               "%{z:.3f}<br>n = %{customdata:,}"
+                               f"<extra>{sistema}</extra>")),
+                row=1, col=s + 1)
+    style_figure(fig)
+    fig.update_layout(height=520)
+    fig.update_xaxes(showticklabels=False, showgrid=False)
+    fig.update_yaxes(autorange="reversed", showgrid=False,
+                     tickfont=dict(size=10))
+    return fig
+
+
+@app.callback(
+    Output("scatter-x", "value"),
+    Output("scatter-y", "value"),
+    Input("graf-correlacao", "clickData"),
+    prevent_initial_call=True,
+)
+def select_pair(click):
+    """Clique numa célula do heatmap leva o par para a dispersão."""
+    ponto = (click or {}).get("points", [{}])[0]
+    if ponto.get("x") not in METRICS or ponto.get("y") not in METRICS:
+        return dash.no_update, dash.no_update
+    return ponto["x"], ponto["y"]
+
+
+def trend_traces(corr, col_x, col_y, xr=None):
+    """Reta de tendência (y sobre x) por sistema e o texto com r, R² e ρ."""
+    traces, textos = [], []
+    for sistema, color in zip(corr.sistemas, COLOR_SEQ):
+        par = corr.par(sistema, col_x, col_y)
+        if par["n"] < 3 or not np.isfinite(par["r"]):
+            continue
+        textos.append(f"{sistema}: r = {par['r']:.2f} · R² = {par['r2']:.2f} · "
+                      f"ρ = {par['rho']:.2f}")
+        x0, x1 = xr if xr is not None else (par["x_min"], par["x_max"])
+        x = np.array([x0, x1])
+        traces.append(go.Scatter(
+            x=x, y=par["intercepto"] + par["inclinacao"] * x, mode="lines",
+            line=dict(color=color, dash="dash", width=2),
+            name=f"{sistema} (tendência)", showlegend=False, hoverinfo="skip"))
+    return traces, "<br>".join(textos)
+
+
+# Dispersão: abaixo de SCATTER_WEBGL_MIN linhas, SVG normal; a partir daí,
+# WebGL (Scattergl); a partir de SCATTER_DENSITY_MIN, densidade agregada no
+# servidor (grade 2D por sistema). Ao aproximar (zoom), a região visível é
+# recalculada e volta a mostrar pontos quando couber abaixo do limite.
+SCATTER_WEBGL_MIN = 5_000
+SCATTER_DENSITY_MIN = 50_000
+SCATTER_BINS = 60
+
 
-    # ---- Dispersão ----
+def zoom_ranges(relayout):
+    """Extrai ((x0, x1) | None, (y0, y1) | None) de um `relayoutData`."""
+    def eixo(nome):
+        if not relayout or relayout.get(f"{nome}.autorange"):
+            return None
+        if f"{nome}.range" in relayout:
+            r0, r1 = relayout[f"{nome}.range"]
+        elif f"{nome}.range[0]" in relayout:
+            r0, r1 = relayout[f"{nome}.range[0]"], relayout[f"{nome}.range[1]"]
+        else:
+            return None
+        # arredonda para que zooms quase iguais compartilhem o cache
+        return (float("%.6g" % min(r0, r1)), float("%.6g" % max(r0, r1)))
+    return eixo("xaxis"), eixo("yaxis")
+
+
+def density_traces(grupos, col_x, col_y, xr, yr, label_x, label_y):
+    """Grade 2D por sistema: um marcador por célula não vazia.
+
+    `grupos` é {sistema: [fatias]} (as partições do Dataset).
+    """
+    xy = {s: empilhar(partes, [col_x, col_y]) for s, partes in grupos.items()}
+    xs = {s: m[:, 0] for s, m in xy.items()}
+    ys = {s: m[:, 1] for s, m in xy.items()}
+    if xr is None:
+        x = np.concatenate(list(xs.values()))
+        xr = (np.nanmin(x), np.nanmax(x))
+    if yr is None:
+        y = np.concatenate(list(ys.values()))
+        yr = (np.nanmin(y), np.nanmax(y))
+    ex = np.linspace(xr[0], xr[1], SCATTER_BINS + 1)
+    ey = np.linspace(yr[0], yr[1], SCATTER_BINS + 1)
+
+    traces = []
+    counts = []
+    for sistema in grupos:
+        H, _, _ = np.histogram2d(xs[sistema], ys[sistema], bins=[ex, ey])
+        ix, iy = np.nonzero(H)
+        counts.append(H[ix, iy])
+        traces.append((sistema, (ex[ix] + ex[ix + 1]) / 2,
+                       (ey[iy] + ey[iy + 1]) / 2))
+    c_max = max([c.max() for c in counts if len(c)] or [1])
+
+    out = []
+    for (sistema, cx, cy), c, color in zip(traces, counts, COLOR_SEQ):
+        # float32/int32: metade do payload, precisão de sobra para a grade
+        out.append(go.Scattergl(
+            x=cx.astype(np.float32), y=cy.astype(np.float32),
+            mode="markers", name=sistema, customdata=c.astype(np.int32),
+            marker=dict(color=color, opacity=0.55,
+                        size=(3 + 15 * np.sqrt(c / c_max)).astype(np.float32)),
+            hovertemplate=(f"sistema={sistema}<br>{label_x}≈%{{x:.2f}}<br>"
+                           f"{label_y}≈%{{y:.2f}}<br>fazendas-ano=%{{customdata:,.0f}}"
+                           "<extra></extra>")))
+    return out
+
+
+@app.callback(
+    Output("graf-scatter", "figure"),
+    Input("anos-key", "data"),
+    Input("scatter-x", "value"),
+    Input("scatter-y", "value"),
+    Input("graf-scatter", "relayoutData"),
+    Input("tarefa-corr", "data"),
+)
+@instrumentar
+def update_scatter(sel, mx, my, relayout, tarefa):
+    ds = DATASET
+    anos_key = tuple(sel["anos"])
+    corr_job = ready_job(tarefa, sel)
+    if ctx.triggered_id == "tarefa-corr" and corr_job is None:
+        return dash.no_update
+    xr, yr = (None, None)
+    if ctx.triggered_id == "graf-scatter":
+        # Com todos os pontos já no navegador, o zoom é só do Plotly
+        if ds.n_linhas(anos_key) < SCATTER_DENSITY_MIN:
+            return dash.no_update
+        xr, yr = zoom_ranges(relayout)
+    return build_scatter_figure(ds, anos_key, mx, my, xr, yr, corr_job)
+
+
+@RESULT_CACHE.memoize
+def build_scatter_figure(ds, anos_key, mx, my, xr=None, yr=None, corr_job=None):
     col_x = METRICS[mx][0]
     col_y = METRICS[my][0]
-    fig_scatter = px.scatter(
-        dff, x=col_x, y=col_y, color="sistema", size="area_ha",
-        hover_data=["farm_id", "ano"],
-        color_discrete_sequence=["#5DADE2", "#58D68D"],
-        labels=LABELS
-    )
+
+    # Partições (ano, sistema), sem cópia; o zoom filtra só dentro delas
+    grupos = {}
+    with etapa("filtro"):
+        for sistema, partes in ds.por_sistema(anos_key).items():
+            grupos[sistema] = []
+            for g in partes:
+                linhas(len(g))
+                if xr is not None:
+                    g = g[g[col_x].between(*xr)]
+                if yr is not None:
+                    g = g[g[col_y].between(*yr)]
+                grupos[sistema].append(g)
+
+    n = sum(len(g) for partes in grupos.values() for g in partes)
+    if n >= SCATTER_DENSITY_MIN:
+        with etapa("densidade"):
+            traces = density_traces(
+                grupos, col_x, col_y, xr, yr, LABELS[col_x], LABELS[col_y])
+        fig_scatter = go.Figure(traces)
+        fig_scatter.update_layout(
+            xaxis_title=LABELS[col_x], yaxis_title=LABELS[col_y],
+            legend_title_text="sistema",
+            annotations=[dict(
+                text=f"densidade de {n:,} fazendas-ano — aproxime para ver os pontos",
+                xref="paper", yref="paper", x=0, y=1.06, showarrow=False,
+                font=dict(size=10, color="rgba(255,255,255,0.6)"))])
+    else:
+        partes = [g for ps in grupos.values() for g in ps]
+        dff = pd.concat(partes) if partes else ds.df.iloc[:0]
+        with etapa("figura"):
+            fig_scatter = px.scatter(
+                dff, x=col_x, y=col_y, color="sistema", size="area_ha",
+                hover_data=["farm_id", "ano"],
+                color_discrete_sequence=COLOR_SEQ,
+                category_orders={"sistema": ds.sistemas},
+                render_mode="webgl" if n >= SCATTER_WEBGL_MIN else "auto",
+                labels=LABELS
+            )
+
+    # r, R², ρ e retas vêm da tarefa de correlações (todos os anos
+    # selecionados, sem o recorte do zoom); até ela terminar, sem retas
+    tendencias, texto = [], ""
+    if corr_job is not None:
+        with etapa("correlacao"):
+            tendencias, texto = trend_traces(
+                correlation_matrix(ds, anos_key, corr_job), col_x, col_y, xr)
+    fig_scatter.add_traces(tendencias)
+    if texto:
+        fig_scatter.add_annotation(
+            text=texto, xref="paper", yref="paper", x=0.01, y=0.99,
+            xanchor="left", yanchor="top", align="left", showarrow=False,
+            bgcolor="rgba(0,0,0,0.35)", font=dict(size=10))
+
+    # Mantém o zoom do usuário entre atualizações da mesma seleção
+    fig_scatter.update_layout(uirevision=f"{anos_key}|{mx}|{my}")
+    if xr is not None:
+        fig_scatter.update_xaxes(range=list(xr))
+    if yr is not None:
+        fig_scatter.update_yaxes(range=list(yr))
+
     fig_scatter.update_layout(
         xaxis_title_font=dict(size=12),
         yaxis_title_font=dict(size=12)
@@ -449,27 +1366,251 @@ def update_all(anos_sel, metrica, mx, my):
             x=0.5
         )
     )
+    return style_figure(fig_scatter)
 
-    # ---- Uniformização visual ----
-    for fig in (fig_bench, fig_box, fig_series, fig_scatter):
-        fig.update_layout(
-            margin=dict(l=8, r=8, t=30, b=8),
-            height=380,
-            plot_bgcolor="rgba(0,0,0,0)",
-            paper_bgcolor="rgba(0,0,0,0)",
-            font=dict(color="#EDEDED"),
-            # xaxis_title=None,
-            # yaxis_title=None,
-        )
-        # Linhas de grade brancas com 5% de opacidade
-        fig.update_xaxes(showgrid=True, gridcolor="rgba(255,255,255,0.05)")
-        fig.update_yaxes(showgrid=True, gridcolor="rgba(255,255,255,0.05)")
 
-    # ---- Tabela ----
-    cols_out = [{"name": c, "id": c} for c in bench.columns]
-    data_out = bench.round(2).to_dict("records")
+# Ordem das linhas por (versão dos dados, anos, ordenação, filtro), por
+# processo: navegar entre páginas do mesmo estado não refaz filtro nem
+# ordenação. A chave é a versão, não o Dataset — guardar o objeto manteria
+# vivas as versões já substituídas pela ingestão.
+class _VersaoSubstituida(Exception):
+    pass
+
+
+def table_order(ds, anos_key, sort_key, filter_query):
+    """Posições (na seleção de anos) das linhas filtradas e ordenadas.
+
+    Lê das faixas de cada ano só as colunas do filtro e da ordenação, sem
+    passar por `filtered` (que copiaria todas as colunas de seleções com
+    lacunas).
+    """
+    sort_by = [{"column_id": c, "direction": d} for c, d in sort_key]
+    if not sort_by and not filter_query:
+        return None
+    usadas = {c for c, _ in sort_key}
+    if filter_query:
+        usadas.update(separar_filtro(p)[0] for p in filter_query.split(" && "))
+    cols = [c for c in ds.df.columns if c in usadas]
+    partes = [p[cols] for p in ds.fatias_anos(anos_key)] or [ds.df.iloc[:0][cols]]
+    dff = partes[0] if len(partes) == 1 else pd.concat(partes)
+    return ordem_linhas(dff, sort_by, filter_query)
+
+
+@lru_cache(maxsize=8)
+def _farm_table_order(versao, anos_key, sort_key, filter_query):
+    ds = DATASET
+    if ds.versao != versao:  # trocado no meio do caminho: não guarda
+        raise _VersaoSubstituida(versao)
+    return table_order(ds, anos_key, sort_key, filter_query)
+
+
+def farm_table_order(ds, anos_key, sort_key, filter_query):
+    try:
+        return _farm_table_order(ds.versao, anos_key, sort_key, filter_query)
+    except _VersaoSubstituida:
+        # requisição que começou com a versão anterior: calcula sem cache
+        return table_order(ds, anos_key, sort_key, filter_query)
+
+
+@app.callback(
+    Output("tabela-fazendas", "data"),
+    Output("tabela-fazendas", "page_count"),
+    Input("anos-key", "data"),
+    Input("tabela-fazendas", "page_current"),
+    Input("tabela-fazendas", "page_size"),
+    Input("tabela-fazendas", "sort_by"),
+    Input("tabela-fazendas", "filter_query"),
+)
+@instrumentar
+def update_farm_table(sel, page_current, page_size, sort_by, filter_query):
+    ds = DATASET
+    anos_key = tuple(sel["anos"])
+    sort_key = tuple((s["column_id"], s["direction"]) for s in sort_by or [])
+    dff = ds.filtered(anos_key)
+    linhas(len(dff))
+    with etapa("ordem"):
+        ordem = farm_table_order(ds, anos_key, sort_key, filter_query or "")
+    with etapa("pagina"):
+        return pagina(dff, ordem, page_current or 0,
+                      page_size or TABLE_PAGE_SIZE, TABLE_IDS)
+
+
+@app.callback(
+    Output("export-csv", "href"),
+    Output("export-parquet", "href"),
+    Input("anos-key", "data"),
+    Input("tabela-fazendas", "sort_by"),
+    Input("tabela-fazendas", "filter_query"),
+)
+@instrumentar
+def update_export_links(sel, sort_by, filter_query):
+    params = {"anos": ",".join(str(a) for a in sel["anos"]), "gzip": "1"}
+    if filter_query:
+        params["filtro"] = filter_query
+    if sort_by:
+        params["ordenar"] = ",".join(
+            f"{s['column_id']}:{s['direction']}" for s in sort_by)
+    return (f"/export/fazendas?{urlencode(params)}",
+            f"/export/fazendas?{urlencode({**params, 'formato': 'parquet'})}")
+
+
+# ------------------------------------------------------------
+# Exportação (CSV/Parquet em fluxo, opcionalmente gzip)
+# ------------------------------------------------------------
+# Parâmetros comuns: anos=2022,2024 (padrão: todos), formato=csv|parquet,
+# gzip=1. As respostas são geradores: o worker serializa uma fatia por vez.
+def export_params():
+    args = flask.request.args
+    formato = args.get("formato", "csv")
+    if formato not in FORMATOS:
+        flask.abort(400, f"formato deve ser um de {sorted(FORMATOS)}")
+    ds = DATASET
+    try:
+        anos = tuple(sorted(int(a) for a in args["anos"].split(",") if a)) \
+            if args.get("anos") else tuple(ds.anos)
+    except ValueError:
+        flask.abort(400, "anos deve ser uma lista de inteiros separados por vírgula")
+    gzip = args.get("gzip", "0").lower() in ("1", "true", "sim")
+    return ds, anos, formato, gzip
+
+
+def ponderacao_param():
+    """Parâmetro `ponderacao=fazenda|area|producao` (padrão: fazenda)."""
+    ponderacao = flask.request.args.get("ponderacao", "fazenda")
+    if ponderacao not in PONDERACOES:
+        flask.abort(400, f"ponderacao deve ser uma de {list(PONDERACOES)}")
+    return ponderacao
+
+
+def export_response(partes, base, formato, gzip):
+    nome = nome_arquivo(base, formato, gzip)
+    mimetype = "application/gzip" if gzip and formato == "csv" \
+        else FORMATOS[formato][0]
+    return flask.Response(
+        flask.stream_with_context(partes), mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nome}"'})
+
+
+@server.route("/export/fazendas")
+def export_farms():
+    """Linhas das fazendas nos anos pedidos (com filtro/ordenação da tabela)."""
+    ds, anos, formato, gzip = export_params()
+    args = flask.request.args
+    sort_key = tuple(
+        tuple(item.split(":", 1)) if ":" in item else (item, "asc")
+        for item in args.get("ordenar", "").split(",") if item)
+    ordem = farm_table_order(ds, anos, sort_key, args.get("filtro", ""))
+    colunas = [c for c in TABLE_IDS if c in ds.df.columns] + ["area_ha"]
+    if ordem is None:
+        # sem filtro nem ordenação: a faixa de cada ano vai direto para o
+        # gerador, sem concatenar as linhas (memória constante)
+        partes = exportar(ds.fatias_anos(anos) or [ds.df.iloc[:0]], formato,
+                          colunas, gzip)
+    else:
+        partes = exportar(ds.df, formato, colunas, gzip,
+                          ds.posicoes_df(anos, ordem))
+    return export_response(partes, "fazendas", formato, gzip)
+
+
+@server.route("/export/benchmark")
+def export_benchmark():
+    """Tabela do benchmark (média) com diferença e benefício ajustado."""
+    ds, anos, formato, gzip = export_params()
+    cenario = flask.request.args.get("cenario", CENARIO_BASE)
+    if cenario not in CENARIOS.index:
+        flask.abort(400, f"cenário desconhecido: {cenario!r}")
+    bench = benchmark_for(ds, anos, cenario, ponderacao_param())
+    return export_response(exportar(bench, formato, gzip=gzip),
+                           "benchmark", formato, gzip)
+
+
+@server.route("/export/cenarios")
+def export_scenarios():
+    """Médias por (cenário, sistema) de todos os cenários do dashboard."""
+    ds, anos, formato, gzip = export_params()
+    tabela = resumir(cubo_de(ds, ponderacao_param()), CENARIOS, anos,
+                     preco_base(ds))
+    return export_response(exportar(tabela, formato, gzip=gzip),
+                           "cenarios", formato, gzip)
+
+
+@server.route("/export/serie")
+def export_series():
+    """Médias por (ano, sistema) de todas as métricas."""
+    ds, anos, formato, gzip = export_params()
+    cube = cubo_de(ds, ponderacao_param())
+    serie = None
+    for col in cube.cols:
+        parte = cube.serie(col, anos)
+        serie = parte if serie is None else serie.merge(
+            parte, on=["ano", "sistema"], how="outer")
+    if serie is None:
+        serie = pd.DataFrame(columns=["ano", "sistema"])
+    return export_response(exportar(serie, formato, gzip=gzip),
+                           "serie", formato, gzip)
+
+
+@server.route("/export/correlacoes")
+def export_correlations():
+    """Pearson, R² e Spearman de cada par de métricas, por sistema."""
+    ds, anos, formato, gzip = export_params()
+    tabela = correlation_for(ds, anos).longa()
+    for col in ("metrica_x", "metrica_y"):
+        tabela[col] = tabela[col].map(LABELS)
+    return export_response(exportar(tabela, formato, gzip=gzip),
+                           "correlacoes", formato, gzip)
+
+
+@server.route("/export/consolidado")
+def export_rollup():
+    """Consolidado por sistema/região/cooperativa (`nivel`), com totais."""
+    ds, anos, formato, gzip = export_params()
+    nivel = flask.request.args.get("nivel", "sistema")
+    if nivel not in NIVEL_LABELS:
+        flask.abort(400, f"nivel deve ser um de {list(NIVEL_LABELS)}")
+    tabela = rollup_for(ds, anos, nivel, ponderacao_param())
+    return export_response(exportar(tabela, formato, gzip=gzip),
+                           "consolidado", formato, gzip)
+
+
+@server.route("/ingest", methods=["POST"])
+def ingest_now():
+    """Força a leitura imediata de dados novos neste worker."""
+    ds = refresh_dataset()
+    return flask.jsonify({"versao": ds.versao, "linhas": len(ds.df),
+                          "anos": ds.anos})
+
+
+if INGEST_INTERVAL > 0:
+    MonitorIngestao(refresh_dataset, INGEST_INTERVAL).start()
+
+
+@server.route("/cache/stats")
+def cache_stats():
+    """Contadores de acerto/falha e ocupação do cache de resultados."""
+    return flask.jsonify(RESULT_CACHE.stats())
+
+
+# Instrumentação: tempo da requisição inteira (despacho + serialização) e
+# bytes da resposta de cada callback; histogramas em /metrics.
+@server.before_request
+def medir_inicio():
+    if flask.request.path.endswith("/_dash-update-component"):
+        inicio_requisicao()
+
+
+@server.after_request
+def medir_fim(resposta):
+    if flask.request.path.endswith("/_dash-update-component"):
+        fim_requisicao(resposta.calculate_content_length() or 0)
+    return resposta
+
 
-    return kpi_cards, fig_bench, fig_box, fig_series, fig_scatter
+@server.route("/metrics")
+def metrics():
+    """Histogramas dos callbacks no formato de texto do Prometheus."""
+    return flask.Response(METRICAS.exportar(),
+                          content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Armazenamento colunar (um .npy por coluna + manifesto.json)
+# ------------------------------------------------------------
+# Cada coluna vira um arquivo `<coluna>.npy` que pode ser aberto com
+# `np.load(..., mmap_mode="r")`: nada é interpretado como texto na carga
+# e só as colunas pedidas são tocadas. Colunas de texto (ex.: `sistema`)
+# são gravadas como códigos inteiros, com as categorias no manifesto.
+#
+# A gravação acontece numa pasta temporária ao lado do destino, que só é
+# renomeada para o nome final (com o manifesto) quando todas as linhas
+# foram escritas: uma gravação interrompida não deixa uma pasta "válida"
+# com linhas zeradas. As linhas são gravadas ordenadas por ORDEM_LINHAS — a
+# ordem física do Dataset (ver `ingestao.py`) — e o manifesto registra essa
+# ordem: na carga, nada é reordenado nem copiado das colunas mapeadas.
+MANIFESTO = "manifesto.json"
+ORDEM_LINHAS = ["ano", "sistema", "farm_id"]
+
+# Colunas derivadas que o dashboard usa (e de onde vêm)
+FONTES_DERIVADAS = {
+    "custo_por_saca_R$": ["custo_total_RSha", "produtividade_sacas_ha"],
+    "margem_liquida_%": ["margem_liquida", "receita_total_RSha", "custo_total_RSha"],
+    "N_kg_ha": ["fertilizante_kgN_ha"],
+    "rentabilidade_RSha": ["lucro_Rsha"],
+}
+
+
+# Tipos compactos: inteiros pequenos com largura fixa (estável entre lotes
+# e ingestões), float32 para as medidas (7 dígitos significativos bastam
+# para os KPIs; somas e médias são feitas em float64) e `sistema` como
+# categoria. Constantes por ano (chuva, preço da saca) vão para uma tabela
+# de consulta indexada por ano em vez de se repetirem em cada linha.
+TIPOS_INTEIROS = {"ano": np.int16, "farm_id": np.int32}
+COLUNAS_ANO = ["chuva_mm", "preco_saca_Reais"]
+
+
+def tipo_compacto(col, dtype):
+    """dtype compacto para a coluna `col` (None = categoria)."""
+    if col in TIPOS_INTEIROS:
+        return np.dtype(TIPOS_INTEIROS[col])
+    if pd.api.types.is_integer_dtype(dtype):
+        return np.dtype(np.int32)
+    if pd.api.types.is_float_dtype(dtype):
+        return np.dtype(np.float32)
+    if pd.api.types.is_bool_dtype(dtype):
+        return np.dtype(bool)
+    return None
+
+
+def compactar(df):
+    """Devolve (df compacto, tabela de constantes por ano).
+
+    Colunas que já estão no tipo compacto (ex.: lidas via mmap da pasta
+    colunar) não são copiadas.
+    """
+    constantes = [c for c in COLUNAS_ANO if c in df.columns]
+    tabela_anos = None
+    if constantes and "ano" in df.columns:
+        tabela_anos = df.groupby("ano")[constantes].first()
+        df = df.drop(columns=constantes)
+
+    dados = {}
+    for col in df.columns:
+        serie = df[col]
+        alvo = tipo_compacto(col, serie.dtype)
+        if alvo is None:
+            if not isinstance(serie.dtype, pd.CategoricalDtype):
+                serie = serie.astype("category")
+        elif serie.dtype != alvo:
+            serie = serie.astype(alvo)
+        dados[col] = serie
+    return pd.DataFrame(dados, copy=False), tabela_anos
+
+
+def garantir_derivadas(df):
+    """Cria (in place) as colunas derivadas que faltarem no DataFrame."""
+    if "fertilizante_kgN_ha" in df.columns and "N_kg_ha" not in df.columns:
+        df["N_kg_ha"] = df["fertilizante_kgN_ha"]
+    if "lucro_Rsha" in df.columns and "rentabilidade_RSha" not in df.columns:
+        df["rentabilidade_RSha"] = df["lucro_Rsha"]
+    if "custo_por_saca_R$" not in df.columns:
+        df["custo_por_saca_R$"] = df["custo_total_RSha"] / \
+            df["produtividade_sacas_ha"]
+    if "margem_liquida_%" not in df.columns:
+        if "margem_liquida" in df.columns:
+            df["margem_liquida_%"] = 100 * df["margem_liquida"].astype(float)
+        else:
+            df["margem_liquida_%"] = 100 * \
+                (df["receita_total_RSha"] - df["custo_total_RSha"]) / \
+                df["receita_total_RSha"]
+    return df
+
+
+class EscritorColunar:
+    """Grava um painel de `n_linhas` em `pasta`, lote a lote.
+
+    Os arquivos `.npy` são pré-alocados com `open_memmap` no primeiro lote
+    (o total de linhas é conhecido de antemão) e preenchidos por fatia, de
+    modo que a memória usada é a de um lote, não a do painel. As colunas
+    são gravadas já nos tipos de `tipo_compacto`.
+    `categorias` fixa de antemão as categorias das colunas de texto (senão
+    valem as do primeiro lote).
+
+    Tudo é escrito numa pasta temporária; `fechar` ordena as linhas por
+    ORDEM_LINHAS (uma coluna por vez na memória), grava o manifesto e
+    troca a pasta de destino, e `abortar` descarta a gravação (use um ou
+    outro, nunca os dois).
+    """
+
+    def __init__(self, pasta, n_linhas, categorias=None):
+        self.pasta = Path(pasta)
+        self.n_linhas = int(n_linhas)
+        self.pos = 0
+        self.arrays = {}
+        self.categorias = dict(categorias or {})
+        self.pasta.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = Path(tempfile.mkdtemp(prefix=f".{self.pasta.name}-",
+                                         dir=self.pasta.parent))
+        os.chmod(self.tmp, 0o755)  # mkdtemp cria 0700
+
+    def _abrir(self, lote):
+        for col in lote.columns:
+            serie = lote[col]
+            if col in self.categorias or serie.dtype == object \
+                    or isinstance(serie.dtype, pd.CategoricalDtype) \
+                    or pd.api.types.is_string_dtype(serie.dtype):
+                cats = self.categorias.setdefault(
+                    col, sorted(pd.unique(serie.astype(str))))
+                dtype = np.int8 if len(cats) < 128 else np.int32
+            else:
+                dtype = tipo_compacto(col, serie.dtype)
+            self.arrays[col] = np.lib.format.open_memmap(
+                self.tmp / f"{col}.npy", mode="w+", dtype=dtype,
+                shape=(self.n_linhas,))
+
+    def escrever(self, lote):
+        if not self.arrays:
+            self._abrir(lote)
+        fim = self.pos + len(lote)
+        if fim > self.n_linhas:
+            raise ValueError(
+                f"Lote excede o total declarado ({fim} > {self.n_linhas}).")
+        for col, arr in self.arrays.items():
+            if col in self.categorias:
+                codigos = pd.Categorical(
+                    lote[col].astype(str), categories=self.categorias[col]).codes
+                if (codigos < 0).any():
+                    raise ValueError(f"Categoria nova em '{col}' após o 1º lote.")
+                arr[self.pos:fim] = codigos
+            else:
+                arr[self.pos:fim] = lote[col].to_numpy()
+        self.pos = fim
+
+    def _ordenar(self):
+        """Reordena as linhas escritas por ORDEM_LINHAS; devolve a ordem."""
+        if not all(c in self.arrays for c in ORDEM_LINHAS):
+            return None
+        # `sistema` ordena pelos códigos: a ordem das categorias do manifesto
+        ordem = np.lexsort([np.asarray(self.arrays[c][:self.pos])
+                            for c in reversed(ORDEM_LINHAS)])
+        if (ordem != np.arange(len(ordem))).any():
+            for arr in self.arrays.values():
+                arr[:self.pos] = arr[:self.pos][ordem]
+        return ORDEM_LINHAS
+
+    def fechar(self):
+        """Conclui a gravação: ordena, grava o manifesto e publica a pasta."""
+        try:
+            ordem = self._ordenar()
+            for arr in self.arrays.values():
+                arr.flush()
+            manifesto = {
+                "n_linhas": self.pos,
+                "colunas": list(self.arrays),
+                "categorias": self.categorias,
+                "ordem": ordem,
+            }
+            self.arrays = {}
+            (self.tmp / MANIFESTO).write_text(
+                json.dumps(manifesto, ensure_ascii=False, indent=2),
+                encoding="utf-8")
+            # um diretório não é substituído por rename: a versão anterior
+            # sai do caminho antes e é apagada depois
+            antiga = None
+            if self.pasta.exists():
+                antiga = Path(tempfile.mkdtemp(prefix=f".{self.pasta.name}-antiga-",
+                                               dir=self.pasta.parent))
+                os.rename(self.pasta, antiga / self.pasta.name)
+            os.rename(self.tmp, self.pasta)
+        except BaseException:
+            self.abortar()
+            raise
+        if antiga is not None:
+            shutil.rmtree(antiga, ignore_errors=True)
+
+    def abortar(self):
+        """Descarta a gravação (arquivos parciais incluídos)."""
+        self.arrays = {}
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def gravar_colunar(df, pasta):
+    """Grava um DataFrame completo (com as derivadas) no formato colunar."""
+    df = garantir_derivadas(df.copy())
+    escritor = EscritorColunar(pasta, len(df))
+    try:
+        escritor.escrever(df)
+    except BaseException:
+        escritor.abortar()
+        raise
+    escritor.fechar()
+
+
+def ler_colunar(pasta, colunas=None, mmap=True):
+    """Lê as `colunas` pedidas da pasta colunar (todas, se `None`).
+
+    Com `mmap=True` as colunas numéricas são visões somente leitura do
+    arquivo em disco; as páginas só são carregadas quando acessadas.
+    Cada coluna é cortada em `n_linhas` do manifesto.
+    """
+    pasta = Path(pasta)
+    manifesto = json.loads((pasta / MANIFESTO).read_text(encoding="utf-8"))
+    disponiveis = manifesto["colunas"]
+    if colunas is None:
+        colunas = disponiveis
+    else:
+        colunas = [c for c in colunas if c in disponiveis]
+
+    n = manifesto["n_linhas"]
+    dados = {}
+    for col in colunas:
+        arr = np.load(pasta / f"{col}.npy", mmap_mode="r" if mmap else None)[:n]
+        if col in manifesto["categorias"]:
+            dados[col] = pd.Categorical.from_codes(
+                np.asarray(arr), manifesto["categorias"][col])
+        else:
+            dados[col] = arr
+    return pd.DataFrame(dados, columns=colunas, copy=False)
+
+
+def carregar_dados(caminho_csv, pasta_colunar=None, colunas=None, opcionais=()):
+    """Carrega o painel para o dashboard, preferindo o formato colunar.
+
+    Se `pasta_colunar` existir, lê só as `colunas` pedidas via mmap; caso
+    contrário lê o CSV (apenas as colunas necessárias e as fontes das
+    derivadas) e calcula as derivadas. Colunas em `opcionais` (ex.: região
+    e cooperativa, ausentes em bases antigas) são lidas se existirem.
+    """
+    if pasta_colunar is not None and (Path(pasta_colunar) / MANIFESTO).exists():
+        df = ler_colunar(pasta_colunar, colunas)
+        faltando = [] if colunas is None else \
+            [c for c in colunas if c not in df.columns and c not in opcionais]
+        if not faltando:
+            return df
+
+    if colunas is None:
+        df = pd.read_csv(caminho_csv)
+    else:
+        fontes = set(colunas)
+        for col in colunas:
+            fontes.update(FONTES_DERIVADAS.get(col, []))
+        df = pd.read_csv(caminho_csv, usecols=lambda c: c in fontes)
+    df = garantir_derivadas(df)
+    if colunas is not None:
+        df = df[[c for c in colunas if c in df.columns]]
+    return df
@@ -0,0 +1,82 @@
+"""Compara a carga do dashboard: CSV vs pasta colunar (.npy via mmap).
+
+Gera um painel sintético em uma pasta temporária (CSV e colunar) e mede,
+em um subprocesso novo por modo, o tempo de `carregar_dados` e o pico de
+memória (RSS) do processo.
+
+    python benchmarks/bench_carga.py --n-farms 100000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PASTA_APP = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PASTA_APP))
+
+# Executado em um processo novo para medir carga "a frio"
+MEDIR = """
+import json, resource, sys, time
+sys.path.insert(0, {pasta_app!r})
+from armazenamento import carregar_dados
+colunas = {colunas!r}
+t0 = time.perf_counter()
+df = carregar_dados({csv!r}, {colunar!r}, colunas)
+# toca todas as colunas, como fariam os primeiros callbacks
+_ = [df[c].to_numpy().sum() for c in colunas if df[c].dtype.kind in "if"]
+dt = time.perf_counter() - t0
+try:
+    # VmHWM é o pico deste processo (ru_maxrss herda o do pai no Linux)
+    with open("/proc/self/status") as f:
+        rss = next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024
+except OSError:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{"linhas": len(df), "tempo_s": dt, "rss_mb": rss}}))
+"""
+
+
+def medir(csv, colunar, colunas):
+    codigo = MEDIR.format(pasta_app=str(PASTA_APP), colunas=colunas,
+                          csv=str(csv), colunar=None if colunar is None else str(colunar))
+    saida = subprocess.run([sys.executable, "-c", codigo], check=True,
+                           capture_output=True, text=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    from simulacao_cafe import escrever_streaming
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-farms", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # Mesmas colunas que o app.py pede (sem importar o Dash)
+    colunas = ["farm_id", "ano", "sistema", "area_ha",
+               "produtividade_sacas_ha", "C_organico_gkg", "irrigacao_mm",
+               "agua_pulverizacao_Lha", "agua_total_m3ha",
+               "produtividade_hidrica_kg_m3", "diesel_Lha", "diesel_por_saca_L",
+               "N_kg_ha", "GHG_kgCO2e_saca", "CI_ha_tCO2e", "custo_total_RSha",
+               "custo_por_saca_R$", "receita_total_RSha", "rentabilidade_RSha",
+               "margem_liquida_%", "biodiversidade_indice", "erosao_ton_ha",
+               "infiltracao_mm_h"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(tmp) / "dados_cafe.csv"
+        colunar = Path(tmp) / "dados_cafe_colunas"
+        print("Gerando dados...")
+        escrever_streaming(csv, args.n_farms, formato="csv")
+        escrever_streaming(colunar, args.n_farms, formato="npy")
+
+        res_csv = medir(csv, None, colunas)
+        res_col = medir(csv, colunar, colunas)
+
+    print(f"\n{'modo':<10}{'linhas':>12}{'tempo (s)':>12}{'RSS (MB)':>12}")
+    for nome, r in (("csv", res_csv), ("colunar", res_col)):
+        print(f"{nome:<10}{r['linhas']:>12,}{r['tempo_s']:>12.3f}{r['rss_mb']:>12.1f}")
+    print(f"\nGanho de tempo: {res_csv['tempo_s'] / max(res_col['tempo_s'], 1e-9):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Memória de N workers do dashboard: cópia privada vs dataset compartilhado.
+
+Gera um painel sintético (CSV) em uma pasta temporária e, para cada modo,
+sobe N processos que importam o `app.py` (como os workers do gunicorn), um
+após o outro, e respondem à primeira carga da página com todos os anos —
+cards, benchmark, dispersão, correlações, consolidado e o bootstrap dos
+IC — sem o cache de resultados, para que cada worker percorra os dados.
+Relata o tempo de partida e da primeira carga de cada worker e a soma de
+RSS, PSS (páginas compartilhadas divididas entre os processos) e USS (só
+as privadas), medidas depois dessa carga.
+
+    python benchmarks/bench_compartilhado.py --n-farms 100000 --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import psutil
+
+PASTA_APP = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PASTA_APP))
+
+# Cada worker responde uma linha JSON quando está pronto e espera o stdin fechar
+WORKER = """
+import json, sys, time
+sys.path.insert(0, {pasta_app!r})
+t0 = time.perf_counter()
+import app
+partida = time.perf_counter() - t0
+t0 = time.perf_counter()
+ds, anos = app.DATASET, tuple(app.DATASET.anos)
+app.build_kpi_cards.uncached(ds, anos)
+app.build_benchmark_figure.uncached(ds, anos)
+app.build_scatter_figure.uncached(ds, anos, "C orgânico (g/kg)",
+                                  "Produtividade (sacas/ha)")
+app.correlation_for.uncached(ds, anos)
+app.rollup_for.uncached(ds, anos, "cooperativa")
+app.benchmark_ci(ds, anos)
+carga = time.perf_counter() - t0
+print(json.dumps({{"partida_s": partida, "carga_s": carga,
+                  "linhas": len(ds.df)}}), flush=True)
+sys.stdin.read()
+"""
+
+
+def medir(pasta_dados, workers, compartilhado, pasta_shm):
+    env = dict(os.environ, CAFE_DADOS_DIR=str(pasta_dados),
+               CAFE_INGEST_INTERVAL="0",
+               CAFE_BOOTSTRAP_REPS="200",
+               CAFE_CACHE_DIR=str(Path(pasta_shm) / ".cache"),
+               CAFE_MEMORIA_COMPARTILHADA="1" if compartilhado else "0",
+               CAFE_COMPARTILHADO_DIR=str(pasta_shm))
+    codigo = WORKER.format(pasta_app=str(PASTA_APP))
+    procs, partidas = [], []
+    try:
+        for _ in range(workers):
+            p = subprocess.Popen([sys.executable, "-c", codigo], env=env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, text=True)
+            procs.append(p)
+            linha = p.stdout.readline()
+            if not linha:
+                raise RuntimeError("worker terminou antes de ficar pronto")
+            partidas.append(json.loads(linha))
+        memoria = [psutil.Process(p.pid).memory_full_info() for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    mb = lambda campo: sum(getattr(m, campo) for m in memoria) / 2**20
+    shm = sum(f.stat().st_size for f in Path(pasta_shm).rglob("*")
+              if f.is_file()) / 2**20 if compartilhado else 0.0
+    return {
+        "linhas": partidas[0]["linhas"],
+        "partida_s": [r["partida_s"] for r in partidas],
+        "carga_s": [r["carga_s"] for r in partidas],
+        "rss_mb": mb("rss"), "pss_mb": mb("pss"), "uss_mb": mb("uss"),
+        "shm_mb": shm,
+    }
+
+
+def main():
+    from simulacao_cafe import escrever_streaming
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-farms", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    base_shm = Path("/dev/shm") if Path("/dev/shm").is_dir() \
+        else Path(tempfile.gettempdir())
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Gerando dados...")
+        escrever_streaming(Path(tmp) / "dados_cafe.csv", args.n_farms,
+                           formato="csv")
+        pasta_shm = Path(tempfile.mkdtemp(prefix="cafe_bench_", dir=base_shm))
+        try:
+            resultados = {
+                "privado": medir(tmp, args.workers, False, pasta_shm),
+                "compartilhado": medir(tmp, args.workers, True, pasta_shm),
+            }
+        finally:
+            shutil.rmtree(pasta_shm, ignore_errors=True)
+
+    print(f"\n{args.workers} workers, "
+          f"{resultados['privado']['linhas']:,} linhas")
+    print(f"{'modo':<15}{'1º worker (s)':>15}{'demais (s)':>12}{'carga (s)':>11}"
+          f"{'RSS (MB)':>10}{'PSS (MB)':>10}{'USS (MB)':>10}{'shm (MB)':>10}")
+    for nome, r in resultados.items():
+        demais = r["partida_s"][1:] or [float("nan")]
+        print(f"{nome:<15}{r['partida_s'][0]:>15.2f}"
+              f"{sum(demais) / len(demais):>12.2f}"
+              f"{sum(r['carga_s']) / len(r['carga_s']):>11.2f}{r['rss_mb']:>10.0f}"
+              f"{r['pss_mb']:>10.0f}{r['uss_mb']:>10.0f}{r['shm_mb']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,592 @@
+"""Teste de carga ponta a ponta do servidor Dash (latência p50/p95/p99).
+
+Sobe o `app.py` localmente sobre um painel sintético, com `--workers`
+processos e `--threads` threads por processo, e simula `--usuarios`
+sessões simultâneas. Cada sessão se comporta como o navegador:
+- lê `/_dash-layout` (valores iniciais) e `/_dash-dependencies` (grafo de
+  callbacks) e dispara os callbacks iniciais em ordem topológica;
+- repete interações sorteadas (anos, eixos da dispersão, métrica,
+  cenário, página/ordenação da tabela, zoom na dispersão, método ou
+  clique no heatmap de correlações), enviando os
+  `_dash-update-component` encadeados que cada mudança provoca, além dos
+  `dcc.Interval` ativos no seu ritmo.
+
+Relata vazão, latência (p50/p95/p99) geral e por callback, taxa de erro,
+bytes das respostas e RSS de cada worker. Listas separadas por vírgula em
+`--linhas`, `--workers`, `--threads` e `--usuarios` rodam todas as
+combinações; o JSON de saída permite comparar configurações.
+
+    python benchmarks/bench_concorrencia.py --linhas 30000 --usuarios 50
+    python benchmarks/bench_concorrencia.py --linhas 30000,300000 \\
+        --workers 1,2 --threads 4,8 --usuarios 200 --duracao 60
+
+Servidores: `werkzeug` (pré-fork próprio: um socket compartilhado por
+`--workers` processos, cada um com um pool de `--threads` threads) ou
+`gunicorn` (`-w/--threads`), se instalado. Nada sai da máquina.
+"""
+import argparse
+import base64
+import http.client
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import psutil
+    ERROS_PROCESSO = (OSError, psutil.Error)
+except ImportError:  # opcional: sem ele, RSS via /proc
+    psutil = None
+    ERROS_PROCESSO = (OSError, StopIteration)
+
+PASTA_APP = Path(__file__).resolve().parent.parent
+PASTA_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+sys.path.insert(0, str(PASTA_APP))
+
+HOST = "127.0.0.1"
+TIMEOUT_S = 60
+LIMITE_CSV = 1_000_000
+# interação: peso no sorteio
+INTERACOES = {
+    "anos": 0.25,
+    "eixos": 0.20,
+    "metrica": 0.15,
+    "cenario": 0.10,
+    "tabela": 0.20,
+    "zoom": 0.10,
+    "correlacao": 0.10,
+}
+
+
+# ------------------------------------------------------------
+# Servidor (processos worker do pré-fork com werkzeug)
+# ------------------------------------------------------------
+def servir(fd, threads, pronto):
+    """Worker: carrega o app e atende o socket herdado com `threads` threads."""
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+
+    from werkzeug.serving import BaseWSGIServer
+
+    import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    class ServidorPool(BaseWSGIServer):
+        """Uma conexão por requisição, atendida por um pool fixo de threads."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._atender, request, client_address)
+
+        def _atender(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    servidor = ServidorPool(HOST, 0, app.server, fd=fd)
+    Path(pronto).touch()
+    servidor.serve_forever()
+
+
+class Servidor:
+    """Sobe o app em outra(s) porta/processos e os encerra ao sair."""
+
+    def __init__(self, tipo, workers, threads, pasta_dados, pasta_tmp):
+        self.tipo, self.workers, self.threads = tipo, workers, threads
+        self.tmp = Path(pasta_tmp)
+        self.env = dict(os.environ, CAFE_DADOS_DIR=str(pasta_dados),
+                        CAFE_INGEST_INTERVAL="0",
+                        CAFE_CACHE_DIR=str(self.tmp / "cache"),
+                        CAFE_TAREFAS_DIR=str(self.tmp / "tarefas"))
+        self.processos = []
+
+    def __enter__(self):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((HOST, 0))
+        self.porta = self.sock.getsockname()[1]
+        self.log = log = open(self.tmp / "servidor.log", "ab")
+        if self.tipo == "gunicorn":
+            self.sock.close()
+            cmd = [shutil.which("gunicorn"), "-w", str(self.workers),
+                   "--threads", str(self.threads), "-b", f"{HOST}:{self.porta}",
+                   "--timeout", str(TIMEOUT_S), "app:server"]
+            self.processos.append(subprocess.Popen(
+                cmd, cwd=PASTA_APP, env=self.env, stdout=log, stderr=log))
+            self._esperar_http()
+            return self
+
+        self.sock.listen(1024)
+        fd = self.sock.fileno()
+        prontos = []
+        for i in range(self.workers):
+            pronto = self.tmp / f"pronto-{i}"
+            prontos.append(pronto)
+            cmd = [sys.executable, __file__, "--servir-fd", str(fd),
+                   "--threads", str(self.threads), "--pronto", str(pronto)]
+            self.processos.append(subprocess.Popen(
+                cmd, cwd=PASTA_APP, env=self.env, pass_fds=(fd,),
+                stdout=log, stderr=log))
+        limite = time.time() + 600
+        while not all(p.exists() for p in prontos):
+            if any(p.poll() is not None for p in self.processos):
+                raise RuntimeError(f"worker terminou; veja {self.tmp / 'servidor.log'}")
+            if time.time() > limite:
+                raise TimeoutError("workers não ficaram prontos")
+            time.sleep(0.2)
+        return self
+
+    def _esperar_http(self):
+        limite = time.time() + 600
+        while time.time() < limite:
+            try:
+                conn = http.client.HTTPConnection(HOST, self.porta, timeout=5)
+                conn.request("GET", "/_dash-layout")
+                if conn.getresponse().status == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError("servidor não respondeu")
+
+    def pids(self):
+        """PIDs que atendem requisições (workers do gunicorn ou do pré-fork)."""
+        if self.tipo == "gunicorn" and psutil is not None:
+            return [p.pid for p in psutil.Process(self.processos[0].pid).children()]
+        return [p.pid for p in self.processos]
+
+    def __exit__(self, *exc):
+        for p in self.processos:
+            p.terminate()
+        for p in self.processos:
+            try:
+                p.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+        self.sock.close()
+        self.log.close()
+
+
+def rss_mb(pid):
+    if psutil is not None:
+        return psutil.Process(pid).memory_info().rss / 2**20
+    with open(f"/proc/{pid}/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmRSS")) / 1024
+
+
+class AmostradorRSS(threading.Thread):
+    """RSS máximo e final de cada worker, amostrado a cada 0,5 s."""
+
+    def __init__(self, pids):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.maximo = {pid: 0.0 for pid in pids}
+        self.final = {}
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.wait(0.5):
+            self.amostrar()
+
+    def amostrar(self):
+        for pid in self.pids:
+            try:
+                self.final[pid] = rss_mb(pid)
+            except ERROS_PROCESSO:  # worker já encerrado
+                continue
+            self.maximo[pid] = max(self.maximo[pid], self.final[pid])
+
+
+# ------------------------------------------------------------
+# Cliente: sessão que imita o renderer do Dash
+# ------------------------------------------------------------
+def chave(ref):
+    return f"{ref['id']}.{ref['property']}"
+
+
+def saidas(output):
+    """'..a.x...b.y..' -> ['a.x', 'b.y']; 'a.x' -> ['a.x']."""
+    if output.startswith(".."):
+        return output[2:-2].split("...")
+    return [output]
+
+
+def valores_iniciais(layout):
+    """{'id.prop': valor} de todos os componentes com id no layout."""
+    estado, intervalos, pilha = {}, {}, [layout]
+    while pilha:
+        no = pilha.pop()
+        if isinstance(no, list):
+            pilha.extend(no)
+            continue
+        if not isinstance(no, dict) or "props" not in no:
+            continue
+        props = no["props"]
+        if "id" in props:
+            for prop, valor in props.items():
+                estado[f"{props['id']}.{prop}"] = valor
+            if no.get("type") == "Interval":
+                intervalos[props["id"]] = props.get("interval", 1000) / 1000
+        pilha.extend(v for v in props.values() if isinstance(v, (dict, list)))
+    return estado, intervalos
+
+
+def ordem_topologica(deps):
+    produz = {}
+    for i, d in enumerate(deps):
+        for s in saidas(d["output"]):
+            produz[s] = i
+    antes = {i: {produz[chave(e)] for e in d["inputs"] if chave(e) in produz} - {i}
+             for i, d in enumerate(deps)}
+    ordem, feitos = [], set()
+    while len(ordem) < len(deps):
+        prontos = [i for i in antes if i not in feitos and antes[i] <= feitos]
+        if not prontos:  # ciclo: segue na ordem declarada
+            prontos = [min(i for i in antes if i not in feitos)]
+        for i in prontos:
+            ordem.append(i)
+            feitos.add(i)
+    return ordem
+
+
+def numeros(valor):
+    """Lista ou array tipado do Plotly ({'dtype', 'bdata'}) -> np.ndarray."""
+    if isinstance(valor, dict) and "bdata" in valor:
+        return np.frombuffer(base64.b64decode(valor["bdata"]), dtype=valor["dtype"])
+    try:
+        return np.asarray(valor, dtype=float)
+    except (TypeError, ValueError):
+        return np.empty(0)
+
+
+class Sessao:
+    """Estado de uma aba do navegador e as requisições que ela dispara."""
+
+    def __init__(self, porta, deps, layout, rng, registros):
+        self.porta, self.deps, self.rng = porta, deps, rng
+        self.ordem = ordem_topologica(deps)
+        self.estado, self.intervalos = valores_iniciais(layout)
+        self.ultimo_tick = {i: time.perf_counter() for i in self.intervalos}
+        self.registros = registros
+
+    def post(self, dep, disparados):
+        corpo = {
+            "output": dep["output"],
+            "outputs": [{"id": s.split(".", 1)[0], "property": s.split(".", 1)[1]}
+                        for s in saidas(dep["output"])],
+            "inputs": [{**e, "value": self.estado.get(chave(e))} for e in dep["inputs"]],
+            "state": [{**e, "value": self.estado.get(chave(e))} for e in dep["state"]],
+            "changedPropIds": sorted(disparados),
+        }
+        if not dep["output"].startswith(".."):
+            corpo["outputs"] = corpo["outputs"][0]
+        dados = json.dumps(corpo).encode()
+        nome = saidas(dep["output"])[0]
+        t0 = time.perf_counter()
+        try:
+            conn = http.client.HTTPConnection(HOST, self.porta, timeout=TIMEOUT_S)
+            conn.request("POST", "/_dash-update-component", body=dados,
+                         headers={"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            conteudo = resp.read()
+            status = resp.status
+            conn.close()
+        except OSError:
+            conteudo, status = b"", 0
+        self.registros.append((nome, t0, time.perf_counter() - t0, status,
+                               len(conteudo)))
+        if status != 200:
+            return set()
+        mudou = set()
+        for id_, props in json.loads(conteudo).get("response", {}).items():
+            for prop, valor in props.items():
+                if isinstance(valor, dict) and "__dash_patch_update" in valor:
+                    continue  # Patch: só o navegador aplica
+                self.estado[f"{id_}.{prop}"] = valor
+                mudou.add(f"{id_}.{prop}")
+        return mudou
+
+    def propagar(self, mudou, inicial=False):
+        """Dispara, em ordem, os callbacks afetados por `mudou` (e os seguintes)."""
+        mudou = set(mudou)
+        for i in self.ordem:
+            dep = self.deps[i]
+            entradas = {chave(e) for e in dep["inputs"]}
+            disparados = entradas & mudou
+            if disparados or (inicial and not dep.get("prevent_initial_call")):
+                mudou |= self.post(dep, disparados)
+
+    def abrir(self):
+        self.propagar(set(), inicial=True)
+
+    def ticks(self):
+        """`n_intervals` dos dcc.Interval ativos que já venceram."""
+        agora = time.perf_counter()
+        for id_, periodo in self.intervalos.items():
+            if self.estado.get(f"{id_}.disabled") or agora - self.ultimo_tick[id_] < periodo:
+                continue
+            self.ultimo_tick[id_] = agora
+            prop = f"{id_}.n_intervals"
+            self.estado[prop] = (self.estado.get(prop) or 0) + 1
+            self.propagar({prop})
+
+    def _opcao(self, id_):
+        opcoes = self.estado.get(f"{id_}.options") or []
+        valores = [o["value"] if isinstance(o, dict) else o for o in opcoes]
+        return valores[self.rng.integers(len(valores))] if valores else None
+
+    def interagir(self):
+        tipos = list(INTERACOES)
+        pesos = np.array(list(INTERACOES.values()))
+        tipo = tipos[self.rng.choice(len(tipos), p=pesos / pesos.sum())]
+        e, rng = self.estado, self.rng
+        if tipo == "anos":
+            anos = [o["value"] for o in e.get("filtro-anos.options") or []]
+            if not anos:
+                return
+            k = rng.integers(1, len(anos) + 1)
+            e["filtro-anos.value"] = sorted(rng.choice(anos, k, replace=False).tolist())
+            self.propagar({"filtro-anos.value"})
+        elif tipo == "eixos":
+            eixo = ("scatter-x", "scatter-y")[rng.integers(2)]
+            e[f"{eixo}.value"] = self._opcao(eixo)
+            self.propagar({f"{eixo}.value"})
+        elif tipo == "metrica":
+            e["filtro-metrica.value"] = self._opcao("filtro-metrica")
+            self.propagar({"filtro-metrica.value"})
+        elif tipo == "cenario":
+            e["filtro-cenario.value"] = self._opcao("filtro-cenario")
+            self.propagar({"filtro-cenario.value"})
+        elif tipo == "tabela":
+            if rng.random() < 0.5:
+                paginas = e.get("tabela-fazendas.page_count") or 1
+                e["tabela-fazendas.page_current"] = int(rng.integers(paginas))
+                self.propagar({"tabela-fazendas.page_current"})
+            else:
+                colunas = [c["id"] for c in e.get("tabela-fazendas.columns") or []]
+                if not colunas:
+                    return
+                e["tabela-fazendas.sort_by"] = [{
+                    "column_id": colunas[rng.integers(len(colunas))],
+                    "direction": ("asc", "desc")[rng.integers(2)]}]
+                e["tabela-fazendas.page_current"] = 0
+                self.propagar({"tabela-fazendas.sort_by",
+                               "tabela-fazendas.page_current"})
+        elif tipo == "zoom":
+            e["graf-scatter.relayoutData"] = self._zoom()
+            self.propagar({"graf-scatter.relayoutData"})
+        elif tipo == "correlacao":
+            if rng.random() < 0.5:
+                e["filtro-correlacao.value"] = self._opcao("filtro-correlacao")
+                self.propagar({"filtro-correlacao.value"})
+            else:
+                # clique numa célula: leva o par para os eixos da dispersão
+                x, y = self._opcao("scatter-x"), self._opcao("scatter-y")
+                e["graf-correlacao.clickData"] = {"points": [{"x": x, "y": y}]}
+                self.propagar({"graf-correlacao.clickData"})
+
+    def _zoom(self):
+        """Janela aleatória dentro dos pontos da figura atual (ou autorange)."""
+        figura = self.estado.get("graf-scatter.figure") or {}
+        xs = [numeros(t.get("x")) for t in figura.get("data", [])]
+        ys = [numeros(t.get("y")) for t in figura.get("data", [])]
+        x = np.concatenate(xs) if xs else np.empty(0)
+        y = np.concatenate(ys) if ys else np.empty(0)
+        if not len(x) or not len(y) or self.rng.random() < 0.2:
+            return {"xaxis.autorange": True, "yaxis.autorange": True}
+        zoom = {}
+        for eixo, v in (("xaxis", x), ("yaxis", y)):
+            lo, hi = np.nanmin(v), np.nanmax(v)
+            largura = (hi - lo) * self.rng.uniform(0.2, 0.6)
+            ini = lo + self.rng.uniform(0, 1) * (hi - lo - largura)
+            zoom[f"{eixo}.range[0]"], zoom[f"{eixo}.range[1]"] = \
+                float(ini), float(ini + largura)
+        return zoom
+
+
+def get_json(porta, caminho):
+    conn = http.client.HTTPConnection(HOST, porta, timeout=TIMEOUT_S)
+    conn.request("GET", caminho)
+    resp = conn.getresponse()
+    dados = json.loads(resp.read())
+    conn.close()
+    return dados
+
+
+def usuario(porta, deps, layout, seed, fim, pausa, registros):
+    rng = np.random.default_rng(seed)
+    sessao = Sessao(porta, deps, layout, rng, registros)
+    sessao.abrir()
+    while time.perf_counter() < fim:
+        sessao.ticks()
+        sessao.interagir()
+        if pausa > 0:
+            time.sleep(min(rng.exponential(pausa), max(fim - time.perf_counter(), 0)))
+
+
+# ------------------------------------------------------------
+# Execução de uma configuração e relatório
+# ------------------------------------------------------------
+def percentis(latencias):
+    if not len(latencias):
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    ms = np.asarray(latencias) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "max": float(ms.max())}
+
+
+def resumir(registros, inicio, duracao):
+    registros = [r for r in registros if r[1] >= inicio]
+    erros = sum(1 for r in registros if r[3] >= 400 or r[3] == 0)
+    por_callback = {}
+    for nome in sorted({r[0] for r in registros}):
+        rs = [r for r in registros if r[0] == nome]
+        por_callback[nome] = {
+            "requisicoes": len(rs),
+            "erros": sum(1 for r in rs if r[3] >= 400 or r[3] == 0),
+            "latencia_ms": percentis([r[2] for r in rs]),
+            "bytes_medio": float(np.mean([r[4] for r in rs])),
+        }
+    return {
+        "requisicoes": len(registros),
+        "vazao_rps": len(registros) / duracao,
+        "erros": erros,
+        "taxa_erro": erros / len(registros) if registros else 0.0,
+        "latencia_ms": percentis([r[2] for r in registros]),
+        "bytes_total": int(sum(r[4] for r in registros)),
+        "por_callback": por_callback,
+    }
+
+
+def rodar(config, pasta_dados, args):
+    with tempfile.TemporaryDirectory() as tmp, Servidor(
+            args.servidor, config["workers"], config["threads"],
+            pasta_dados, tmp) as srv:
+        deps = get_json(srv.porta, "/_dash-dependencies")
+        layout = get_json(srv.porta, "/_dash-layout")
+        rss = AmostradorRSS(srv.pids())
+        rss.amostrar()
+        rss.start()
+
+        registros = []
+        t0 = time.perf_counter()
+        inicio = t0 + args.aquecimento
+        fim = inicio + args.duracao
+        threads = [threading.Thread(target=usuario, args=(
+            srv.porta, deps, layout, args.seed + i, fim, args.pausa, registros))
+            for i in range(config["usuarios"])]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - inicio
+        rss.parar.set()
+        rss.amostrar()
+        resumo = resumir(registros, inicio, duracao)
+        resumo["rss_mb"] = {str(pid): {"max": rss.maximo[pid], "final": rss.final.get(pid)}
+                            for pid in rss.pids}
+    return {**config, **resumo}
+
+
+def gerar_dados(linhas, pasta):
+    from contextlib import redirect_stdout
+
+    from simulacao_cafe import ANOS, escrever_streaming
+
+    n_farms = -(-linhas // len(ANOS))
+    formato = "csv" if linhas <= LIMITE_CSV else "npy"
+    destino = Path(pasta) / ("dados_cafe.csv" if formato == "csv" else "dados_cafe_colunas")
+    with redirect_stdout(sys.stderr):
+        escrever_streaming(destino, n_farms, formato=formato)
+
+
+def lista(texto):
+    return [int(v) for v in str(texto).split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", default="30000", help="linhas fazenda-ano")
+    parser.add_argument("--workers", default="1")
+    parser.add_argument("--threads", default="8")
+    parser.add_argument("--usuarios", default="50")
+    parser.add_argument("--duracao", type=float, default=30, help="segundos medidos")
+    parser.add_argument("--aquecimento", type=float, default=5,
+                        help="segundos iniciais descartados")
+    parser.add_argument("--pausa", type=float, default=0.5,
+                        help="pausa média entre interações de um usuário (s)")
+    parser.add_argument("--servidor", choices=["werkzeug", "gunicorn"],
+                        default="werkzeug")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--saida", type=Path, default=None)
+    # uso interno: processo worker do pré-fork
+    parser.add_argument("--servir-fd", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--pronto", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir_fd is not None:
+        servir(args.servir_fd, int(args.threads), args.pronto)
+        return
+    if args.servidor == "gunicorn" and shutil.which("gunicorn") is None:
+        parser.error("gunicorn não está instalado")
+
+    resultados = []
+    for linhas in lista(args.linhas):
+        with tempfile.TemporaryDirectory() as pasta_dados:
+            print(f"Gerando {linhas:,} linhas...", flush=True)
+            gerar_dados(linhas, pasta_dados)
+            for workers, threads, usuarios in itertools.product(
+                    lista(args.workers), lista(args.threads), lista(args.usuarios)):
+                config = {"linhas": linhas, "servidor": args.servidor,
+                          "workers": workers, "threads": threads,
+                          "usuarios": usuarios}
+                print(f"  {workers} worker(s) x {threads} thread(s), "
+                      f"{usuarios} usuários...", flush=True)
+                resultados.append(rodar(config, pasta_dados, args))
+
+    saida = args.saida or PASTA_RESULTADOS / f"carga_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps({
+        "meta": {"data": time.strftime("%Y-%m-%dT%H:%M:%S"), "cpus": os.cpu_count(),
+                 "duracao_s": args.duracao, "pausa_s": args.pausa,
+                 "aquecimento_s": args.aquecimento},
+        "resultados": resultados}, indent=2))
+
+    print(f"\n{'linhas':>10}{'w x t':>8}{'usuários':>10}{'req/s':>9}{'p50':>9}"
+          f"{'p95':>9}{'p99':>9}{'erros':>8}{'MB':>9}{'RSS máx (MB)':>16}")
+    for r in resultados:
+        lat = r["latencia_ms"]
+        rss = max((v["max"] for v in r["rss_mb"].values()), default=0)
+        fmt = lambda v: f"{v:>9.0f}" if v is not None else f"{'–':>9}"
+        print(f"{r['linhas']:>10,}{r['workers']:>4} x{r['threads']:<3}{r['usuarios']:>10}"
+              f"{r['vazao_rps']:>9.1f}{fmt(lat['p50'])}{fmt(lat['p95'])}{fmt(lat['p99'])}"
+              f"{r['taxa_erro']:>8.1%}{r['bytes_total'] / 2**20:>9.1f}"
+              f"{rss:>10.0f} x{len(r['rss_mb'])}")
+    ultimo = resultados[-1]["por_callback"]
+    print(f"\nPor callback (última configuração), latência em ms:")
+    for nome, c in ultimo.items():
+        lat = c["latencia_ms"]
+        print(f"  {nome:<32}{c['requisicoes']:>7} req  p50 {lat['p50']:>7.0f}  "
+              f"p95 {lat['p95']:>7.0f}  p99 {lat['p99']:>7.0f}  "
+              f"{c['bytes_medio'] / 1024:>8.1f} KB")
+    print(f"\nResultados em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Memória do DataFrame do dashboard: tipos originais vs compactos.
+
+Gera um painel sintético (CSV) em uma pasta temporária e mede, em um
+subprocesso novo por modo:
+- o tamanho do DataFrame (`memory_usage(deep=True)`) e o RSS do processo;
+- a alocação por "requisição" (tracemalloc) do filtro por anos: o antigo
+  `df[df["ano"].isin(anos)].copy()` contra a visão de `Dataset.filtered`.
+
+    python benchmarks/bench_memoria.py --n-farms 100000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+PASTA_APP = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PASTA_APP))
+
+# Executado em um processo novo para que o RSS seja só deste modo
+MEDIR = """
+import json, sys, time, tracemalloc
+sys.path.insert(0, {pasta_app!r})
+import pandas as pd
+from armazenamento import carregar_dados, compactar
+from ingestao import Dataset
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmRSS")) / 1024
+
+colunas = {colunas!r}
+anos_sel = {anos!r}
+df = carregar_dados({csv!r}, None, colunas)
+if {compacto!r}:
+    df, _ = compactar(df)
+    ds = Dataset(df, None, "bench")
+    filtrar = lambda: (ds.limpar_copias(), ds.filtered(anos_sel))[1]
+else:
+    filtrar = lambda: df[df["ano"].isin(anos_sel)].copy()
+_ = filtrar()  # aquece
+
+tracemalloc.start()
+t0 = time.perf_counter()
+dff = filtrar()
+# consome as colunas, como faria um callback
+_ = [dff[c].to_numpy().sum() for c in dff.columns if dff[c].dtype.kind in "if"]
+dt = time.perf_counter() - t0
+_, pico = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+
+print(json.dumps({{
+    "linhas": len(df),
+    "df_mb": df.memory_usage(deep=True).sum() / 2**20,
+    "rss_mb": rss_mb(),
+    "alocado_mb": pico / 2**20,
+    "filtro_ms": dt * 1000,
+}}))
+"""
+
+
+def medir(csv, colunas, anos, compacto):
+    codigo = MEDIR.format(pasta_app=str(PASTA_APP), colunas=colunas,
+                          csv=str(csv), anos=anos, compacto=compacto)
+    saida = subprocess.run([sys.executable, "-c", codigo], check=True,
+                           capture_output=True, text=True).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def main():
+    from simulacao_cafe import ANOS, escrever_streaming
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n-farms", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # Mesmas colunas que o app.py pede (sem importar o Dash)
+    colunas = ["farm_id", "ano", "sistema", "area_ha",
+               "produtividade_sacas_ha", "C_organico_gkg", "irrigacao_mm",
+               "agua_pulverizacao_Lha", "agua_total_m3ha",
+               "produtividade_hidrica_kg_m3", "diesel_Lha", "diesel_por_saca_L",
+               "N_kg_ha", "GHG_kgCO2e_saca", "CI_ha_tCO2e", "custo_total_RSha",
+               "custo_por_saca_R$", "receita_total_RSha", "rentabilidade_RSha",
+               "margem_liquida_%", "biodiversidade_indice", "erosao_ton_ha",
+               "infiltracao_mm_h", "chuva_mm", "preco_saca_Reais"]
+    anos = tuple(ANOS[-2:])  # seleção típica: os dois últimos anos
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = Path(tmp) / "dados_cafe.csv"
+        print("Gerando dados...")
+        escrever_streaming(csv, args.n_farms, formato="csv")
+
+        res_orig = medir(csv, colunas, anos, compacto=False)
+        res_comp = medir(csv, colunas, anos, compacto=True)
+
+    print(f"\n{'modo':<12}{'linhas':>12}{'df (MB)':>10}{'RSS (MB)':>10}"
+          f"{'alocado/req (MB)':>18}{'filtro (ms)':>13}")
+    for nome, r in (("original", res_orig), ("compacto", res_comp)):
+        print(f"{nome:<12}{r['linhas']:>12,}{r['df_mb']:>10.1f}{r['rss_mb']:>10.1f}"
+              f"{r['alocado_mb']:>18.2f}{r['filtro_ms']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
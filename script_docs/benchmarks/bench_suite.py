@@ -0,0 +1,276 @@
+"""Suíte de micro-benchmarks do dashboard em várias escalas (JSON + regressão).
+
+Para cada escala (linhas fazenda-ano) gera um painel sintético em uma pasta
+temporária e mede, em um subprocesso novo:
+- simulação (`simulacao_cafe.iterar_blocos`), em linhas/s;
+- carga como no `app.py` (`carregar_dados`, com as colunas derivadas),
+  compactação, cubo de agregados e montagem do `Dataset`;
+- partida do `app.py` apontado para os dados gerados (`CAFE_DADOS_DIR`);
+- `compute_benchmark` (média e mediana) sobre as linhas e via cubo;
+- cada callback de figura (cards, benchmark, boxplot, série, dispersão,
+  tabela) com cache vazio ("frio", incluindo a serialização JSON) e com
+  cache cheio ("quente"), mais o total por atualização.
+
+Os resultados vão para um JSON (metadados + tempos por escala/etapa). Com
+`--comparar`, cada etapa é confrontada com uma execução anterior e a
+execução falha (código 1) se alguma ficar mais de `--limite` mais lenta.
+
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --escalas 150,10000 \\
+        --comparar benchmarks/resultados/base.json --limite 0.25
+
+Escalas acima de `LIMITE_CSV` linhas são geradas na pasta colunar (.npy),
+como o app faria com bases grandes; abaixo, em CSV.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PASTA_APP = Path(__file__).resolve().parent.parent
+PASTA_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+sys.path.insert(0, str(PASTA_APP))
+
+ESCALAS = [150, 10_000, 1_000_000, 10_000_000]
+LIMITE_CSV = 1_000_000
+LIMITE_REGRESSAO = 0.20   # 20% mais lento que a base
+PISO_REGRESSAO_S = 0.002  # diferenças abaixo de 2 ms são ruído
+
+# Estado padrão do layout do app.py
+METRICA = "Produtividade (sacas/ha)"
+SCATTER_X = "C orgânico (g/kg)"
+SCATTER_Y = "Produtividade (sacas/ha)"
+
+
+def repeticoes(linhas):
+    """Quantas vezes medir cada etapa (menos vezes nas escalas grandes)."""
+    if linhas <= 10_000:
+        return 7
+    if linhas <= LIMITE_CSV:
+        return 3
+    return 1
+
+
+def cronometrar(func, n, antes=None):
+    """(último valor, {"mediana_s", "min_s", "n"}) de `n` execuções de `func`."""
+    tempos = []
+    valor = None
+    for _ in range(n):
+        if antes is not None:
+            antes()
+        t0 = time.perf_counter()
+        valor = func()
+        tempos.append(time.perf_counter() - t0)
+    tempos.sort()
+    return valor, {"mediana_s": tempos[len(tempos) // 2], "min_s": tempos[0],
+                   "n": n}
+
+
+def rss_pico_mb():
+    with open("/proc/self/status") as f:
+        return next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024
+
+
+# ------------------------------------------------------------
+# Medição de uma escala (roda no subprocesso)
+# ------------------------------------------------------------
+def medir_escala(linhas, pasta, formato, n):
+    from contextlib import redirect_stdout
+
+    from simulacao_cafe import ANOS, escrever_streaming, iterar_blocos
+
+    pasta = Path(pasta)
+    n_farms = -(-linhas // len(ANOS))
+    res = {}
+
+    _, res["simulacao"] = cronometrar(
+        lambda: sum(len(b["farm_id"]) for b in iterar_blocos(n_farms)), n)
+    res["simulacao"]["linhas_s"] = n_farms * len(ANOS) / res["simulacao"]["mediana_s"]
+
+    destino = pasta / ("dados_cafe.csv" if formato == "csv" else "dados_cafe_colunas")
+    with redirect_stdout(sys.stderr):  # progresso da escrita fora do JSON
+        escrever_streaming(destino, n_farms, formato="npy" if formato != "csv" else "csv")
+
+    # bibliotecas pesadas antes: a partida mede só dados e layout
+    import dash  # noqa: F401
+    import plotly.express  # noqa: F401
+    from plotly.utils import PlotlyJSONEncoder
+
+    _, res["partida_app"] = cronometrar(lambda: __import__("app"), 1)
+    import app
+    from agregacao import CuboAgregados
+    from armazenamento import COLUNAS_ANO, carregar_dados, compactar
+    from ingestao import Dataset
+
+    colunas = app.COLUNAS_APP + COLUNAS_ANO
+    df, res["carga"] = cronometrar(
+        lambda: carregar_dados(app.DATA_PATH, app.COLUNAR_PATH, colunas), n)
+    (df, tabela), res["compactar"] = cronometrar(lambda: compactar(df), n)
+    cubo, res["cubo"] = cronometrar(
+        lambda: CuboAgregados.de_dataframe(df, app.METRIC_COLS), n)
+    _, res["dataset"] = cronometrar(lambda: Dataset(df, cubo, "bench", tabela), n)
+    del df, cubo, tabela
+
+    ds = app.DATASET
+    anos = tuple(ds.anos)
+    for agg in ("mean", "median"):
+        _, res[f"benchmark.linhas.{agg}"] = cronometrar(
+            lambda: app.compute_benchmark(ds.filtered(anos), agg), n,
+            antes=ds.limpar_copias)
+        _, res[f"benchmark.cubo.{agg}"] = cronometrar(
+            lambda: app.compute_benchmark(
+                None, agg, ds.cube.estatisticas(anos, (agg,))), n)
+
+    def esvaziar_caches():
+        app.RESULT_CACHE.clear()
+        app._farm_table_order.cache_clear()
+        ds.limpar_copias()
+
+    ordenacao = (("produtividade_sacas_ha", "desc"),)
+    figuras = {
+        "kpis": lambda: app.build_kpi_cards(ds, anos),
+        "benchmark": lambda: app.build_benchmark_figure(ds, anos),
+        "box": lambda: app.build_box_figure(ds, anos, METRICA),
+        "serie": lambda: app.build_series_figure(ds, anos, METRICA),
+        "dispersao": lambda: app.build_scatter_figure(
+            ds, anos, SCATTER_X, SCATTER_Y),
+        "correlacao": lambda: app.build_correlation_figure(ds, anos),
+        "tabela": lambda: app.pagina(
+            ds.filtered(anos), app.farm_table_order(ds, anos, ordenacao, ""),
+            0, app.TABLE_PAGE_SIZE, app.TABLE_IDS),
+    }
+    total = {"mediana_s": 0.0, "min_s": 0.0, "n": n, "bytes": 0}
+    for nome, figura in figuras.items():
+        resposta = lambda: json.dumps(figura(), cls=PlotlyJSONEncoder)
+        corpo, frio = cronometrar(resposta, n, antes=esvaziar_caches)
+        _, quente = cronometrar(resposta, n)
+        frio["bytes"] = quente["bytes"] = len(corpo)
+        res[f"callback.{nome}.frio"] = frio
+        res[f"callback.{nome}.quente"] = quente
+        for campo in ("mediana_s", "min_s", "bytes"):
+            total[campo] += frio[campo]
+    res["callback.total.frio"] = total
+
+    return {"linhas": len(ds.df), "formato": formato,
+            "rss_pico_mb": rss_pico_mb(), "etapas": res}
+
+
+# ------------------------------------------------------------
+# Orquestração, JSON e comparação
+# ------------------------------------------------------------
+def rodar_escala(linhas, formato, n):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, CAFE_DADOS_DIR=tmp, CAFE_INGEST_INTERVAL="0",
+                   CAFE_CACHE_DIR=str(Path(tmp) / "cache"),
+                   CAFE_TAREFAS_DIR=str(Path(tmp) / "tarefas"))
+        cmd = [sys.executable, __file__, "--medir-escala", str(linhas),
+               "--pasta", tmp, "--formato", formato, "--repeticoes", str(n)]
+        saida = subprocess.run(cmd, check=True, capture_output=True, text=True,
+                               env=env, cwd=PASTA_APP).stdout
+    return json.loads(saida.strip().splitlines()[-1])
+
+
+def metadados(escalas):
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                cwd=PASTA_APP, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "escalas": escalas,
+    }
+
+
+def comparar(atual, base, limite=LIMITE_REGRESSAO, piso=PISO_REGRESSAO_S):
+    """Linhas (escala, etapa, base_s, atual_s, razão, regrediu) em comum."""
+    linhas = []
+    for escala, r in atual["resultados"].items():
+        etapas_base = base["resultados"].get(escala, {}).get("etapas", {})
+        for etapa, m in r["etapas"].items():
+            if etapa not in etapas_base:
+                continue
+            b, a = etapas_base[etapa]["mediana_s"], m["mediana_s"]
+            razao = a / b if b > 0 else float("inf")
+            regrediu = razao > 1 + limite and a - b > piso
+            linhas.append((escala, etapa, b, a, razao, regrediu))
+    return linhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", default=",".join(map(str, ESCALAS)),
+                        help="linhas fazenda-ano, separadas por vírgula")
+    parser.add_argument("--formato", choices=["auto", "csv", "npy"], default="auto")
+    parser.add_argument("--repeticoes", type=int, default=None)
+    parser.add_argument("--saida", type=Path, default=None)
+    parser.add_argument("--comparar", type=Path, default=None,
+                        help="JSON de uma execução anterior (base)")
+    parser.add_argument("--limite", type=float, default=LIMITE_REGRESSAO,
+                        help="fração de lentidão tolerada (0.2 = 20%%)")
+    # uso interno: uma escala no subprocesso
+    parser.add_argument("--medir-escala", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--pasta", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir_escala is not None:
+        print(json.dumps(medir_escala(args.medir_escala, args.pasta,
+                                      args.formato, args.repeticoes)))
+        return
+
+    escalas = [int(e) for e in args.escalas.split(",")]
+    resultado = {"meta": metadados(escalas), "resultados": {}}
+    for linhas in escalas:
+        formato = args.formato
+        if formato == "auto":
+            formato = "csv" if linhas <= LIMITE_CSV else "npy"
+        print(f"Escala {linhas:,} linhas ({formato})...", flush=True)
+        resultado["resultados"][str(linhas)] = rodar_escala(
+            linhas, formato, args.repeticoes or repeticoes(linhas))
+
+    saida = args.saida or PASTA_RESULTADOS / f"bench_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(resultado, indent=2))
+
+    print(f"\n{'escala':>12}  {'etapa':<28}{'mediana (ms)':>14}{'KB':>10}")
+    for escala, r in resultado["resultados"].items():
+        for etapa, m in r["etapas"].items():
+            kb = f"{m['bytes'] / 1024:.1f}" if "bytes" in m else ""
+            print(f"{int(escala):>12,}  {etapa:<28}{m['mediana_s'] * 1000:>14.2f}{kb:>10}")
+        sim = r["etapas"]["simulacao"]["linhas_s"]
+        print(f"{'':>12}  simulação: {sim:,.0f} linhas/s; RSS de pico "
+              f"{r['rss_pico_mb']:.0f} MB")
+    print(f"\nResultados em {saida}")
+
+    if args.comparar is None:
+        return
+    base = json.loads(args.comparar.read_text())
+    linhas = comparar(resultado, base, args.limite)
+    regressoes = [l for l in linhas if l[5]]
+    print(f"\nComparação com {args.comparar} (limite +{args.limite:.0%}):")
+    for escala, etapa, b, a, razao, regrediu in linhas:
+        marca = "  REGRESSÃO" if regrediu else ""
+        print(f"{int(escala):>12,}  {etapa:<28}{b * 1000:>10.2f} -> "
+              f"{a * 1000:>10.2f} ms ({razao:.2f}x){marca}")
+    if regressoes:
+        print(f"\n{len(regressoes)} etapa(s) acima do limite.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Bootstrap das diferenças Regenerativo x Convencional
+# ------------------------------------------------------------
+# Bootstrap por conglomerado: sorteia fazendas (com reposição) dentro de
+# cada sistema e cada fazenda sorteada entra com todas as suas linhas —
+# com vários anos selecionados, as linhas de uma fazenda são correlacionadas
+# e reamostrá-las uma a uma estreitaria o IC. Por réplica, as médias de
+# todas as métricas saem de uma vez:
+#   - as linhas viram somas e contagens por fazenda (S, K), uma vez por grupo;
+#   - uma matriz de índices (réplicas x fazendas) é sorteada por bloco;
+#   - os índices viram pesos (quantas vezes cada fazenda saiu) com bincount;
+#   - médias = (pesos @ S) / (pesos @ K), produtos de matrizes para as 19
+#     métricas — a média das linhas das fazendas sorteadas, repetições
+#     incluídas.
+# Sem ids de fazenda, cada linha é o próprio conglomerado.
+# Os blocos de réplicas têm tamanho fixo (limitado por LIMITE_PESOS) e
+# cada bloco usa um Generator próprio, derivado de
+# SeedSequence(seed, spawn_key=(grupo, bloco)) — o resultado é
+# reprodutível bloco a bloco.
+#
+# Roda no processo que chama, bloco após bloco: no dashboard, numa thread
+# da fila de tarefas. Não há pool de processos — um fork a partir de uma
+# thread do servidor pode herdar locks travados e o "spawn" reimportaria
+# o app (e recarregaria os dados) em cada filho. O paralelismo vem dos
+# produtos de matrizes (BLAS) e de várias tarefas/workers simultâneos.
+N_REPLICAS = 2000
+LIMITE_PESOS = 4_000_000      # elementos da matriz de pesos por bloco
+
+
+def rng_replicas(seed, grupo, bloco):
+    """Generator independente para o bloco de réplicas (grupo, bloco)."""
+    return np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(int(grupo), int(bloco))))
+
+
+def tamanho_bloco(n_linhas, limite=LIMITE_PESOS):
+    return max(1, limite // max(n_linhas, 1))
+
+
+def _preparar(X, ids=None):
+    """(S, K): somas e contagens de valores válidos por conglomerado.
+
+    Calculadas uma vez por grupo. Sem `ids` e sem lacunas, S é o próprio X
+    e K é None (cada linha pesa 1). K é (conglomerados,) quando não há
+    lacunas e (conglomerados x métricas) quando há.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    ok = ~np.isnan(X)
+    completo = ok.all()
+    if ids is None:
+        if completo:
+            return X, None
+        return np.where(ok, X, 0.0), ok.astype(np.float64)
+    _, cod = np.unique(np.asarray(ids), return_inverse=True)
+    n_c = int(cod.max()) + 1 if len(cod) else 0
+    S = np.zeros((n_c, X.shape[1]))
+    np.add.at(S, cod, X if completo else np.where(ok, X, 0.0))
+    if completo:
+        return S, np.bincount(cod, minlength=n_c).astype(np.float64)
+    K = np.zeros((n_c, X.shape[1]))
+    np.add.at(K, cod, ok.astype(np.float64))
+    return S, K
+
+
+def medias_replicas(S, n_rep, rng, K=None):
+    """Médias (n_rep x métricas) de `n_rep` reamostragens das linhas de S.
+
+    Cada linha de `S` é um conglomerado (somas sem NaN) e `K` suas
+    contagens de valores válidos (ver `_preparar`); com `K=None` cada linha
+    conta 1.
+    """
+    n = len(S)
+    tipo = np.int32 if n < 2**31 else np.int64
+    idx = rng.integers(0, n, size=(n_rep, n), dtype=tipo)
+    deslocado = idx + (np.arange(n_rep) * n)[:, None]
+    pesos = np.bincount(deslocado.ravel(), minlength=n_rep * n) \
+        .reshape(n_rep, n).astype(np.float64)
+    if K is None:
+        return (pesos @ S) / n
+    total = pesos @ K
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (pesos @ S) / (total[:, None] if total.ndim == 1 else total)
+
+
+def replicas(grupos, n_rep=N_REPLICAS, seed=42, progresso=None,
+             conglomerados=None):
+    """{grupo: médias (n_rep x métricas)} para cada matriz em `grupos`.
+
+    `grupos` é {nome: X (linhas x métricas)}; `conglomerados`, se dado, é
+    {nome: ids (um por linha de X)} e a reamostragem sorteia ids em vez de
+    linhas. `progresso(fração,
+    mensagem)`, se dado, é chamado a cada bloco concluído (e pode
+    interromper o cálculo levantando uma exceção).
+    """
+    nomes = list(grupos)
+    conglomerados = conglomerados or {}
+    preparadas = {g: _preparar(grupos[nome], conglomerados.get(nome))
+                  for g, nome in enumerate(nomes)}
+    tarefas = []
+    for g in range(len(nomes)):
+        passo = tamanho_bloco(len(preparadas[g][0]))
+        for bloco, ini in enumerate(range(0, n_rep, passo)):
+            tarefas.append((g, bloco, min(passo, n_rep - ini), seed))
+
+    partes = []
+    for g, bloco, n, seed in tarefas:
+        S, K = preparadas[g]
+        partes.append(medias_replicas(S, n, rng_replicas(seed, g, bloco), K))
+        if progresso is not None:
+            progresso(len(partes) / len(tarefas),
+                      f"bootstrap {len(partes)}/{len(tarefas)} blocos")
+
+    saida = {nome: [] for nome in nomes}
+    for (g, _, _, _), parte in zip(tarefas, partes):
+        saida[nomes[g]].append(parte)
+    return {nome: np.concatenate(p) if p else np.empty((0, 0))
+            for nome, p in saida.items()}
+
+
+def intervalos_diferenca(X_conv, X_reg, colunas, n_rep=N_REPLICAS, seed=42,
+                         nivel=0.95, progresso=None,
+                         ids_conv=None, ids_reg=None):
+    """IC percentil da diferença (%) Regenerativo x Convencional por métrica.
+
+    `ids_conv`/`ids_reg` (farm_id de cada linha) fazem o bootstrap por
+    fazenda. Devolve DataFrame (coluna x [diferenca, ic_inf, ic_sup, ep]).
+    """
+    if not len(X_conv) or not len(X_reg):
+        return pd.DataFrame(np.nan, index=pd.Index(colunas, name="coluna"),
+                            columns=["diferenca", "ic_inf", "ic_sup", "ep"])
+    ids = {"convencional": ids_conv, "regenerativo": ids_reg}
+    reps = replicas({"convencional": X_conv, "regenerativo": X_reg},
+                    n_rep, seed, progresso,
+                    {k: v for k, v in ids.items() if v is not None})
+    with np.errstate(divide="ignore", invalid="ignore"):
+        conv, reg = np.nanmean(X_conv, axis=0), np.nanmean(X_reg, axis=0)
+        ponto = np.where(conv != 0, (reg - conv) / conv * 100, np.nan)
+        c, r = reps["convencional"], reps["regenerativo"]
+        dif = np.where(c != 0, (r - c) / c * 100, np.nan)
+    alfa = (1 - nivel) / 2
+    return pd.DataFrame({
+        "diferenca": ponto,
+        "ic_inf": np.nanquantile(dif, alfa, axis=0),
+        "ic_sup": np.nanquantile(dif, 1 - alfa, axis=0),
+        "ep": np.nanstd(dif, axis=0, ddof=1),
+    }, index=pd.Index(colunas, name="coluna"))
@@ -0,0 +1,194 @@
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+from pathlib import Path
+
+import plotly
+from plotly.basedatatypes import BaseFigure
+
+from metricas import registrar_cache
+
+# ------------------------------------------------------------
+# Cache de resultados (figuras, benchmark) compartilhado entre workers
+# ------------------------------------------------------------
+# Com `diskcache` instalado, os resultados ficam em um SQLite + arquivos
+# numa pasta local, visível para todos os workers do gunicorn na mesma
+# máquina, com despejo LRU por tamanho. Sem `diskcache`, cai para um LRU
+# em memória, por processo, com o mesmo limite de bytes.
+#
+# Figuras são guardadas como o dict do Plotly (`to_plotly_json`), não como
+# `go.Figure`: desserializar uma Figure refaz toda a validação do Plotly e
+# custa quase o mesmo que montá-la de novo. O Dash aceita o dict direto.
+#
+# A chave inclui a versão do código (hash dos módulos desta pasta e versão
+# do Plotly): o cache em disco sobrevive a reinícios, e um deploy não pode
+# servir figuras montadas pelo código anterior.
+try:
+    import diskcache
+except ImportError:  # opcional
+    diskcache = None
+
+CACHE_DIR = os.environ.get(
+    "CAFE_CACHE_DIR", str(Path(tempfile.gettempdir()) / "cafe_dashboard_cache"))
+CACHE_MB = int(os.environ.get("CAFE_CACHE_MB", "256"))
+
+_AUSENTE = object()
+
+
+def versao_arquivos(*caminhos):
+    """Impressão digital (mtime, tamanho) dos arquivos/pastas de dados.
+
+    Entra na chave de todo resultado: quando os dados mudam, a versão muda
+    e as entradas antigas deixam de ser usadas (e saem pelo LRU).
+    """
+    partes = []
+    for caminho in caminhos:
+        caminho = Path(caminho)
+        if caminho.is_dir():
+            arquivos = sorted(caminho.iterdir())
+        elif caminho.exists():
+            arquivos = [caminho]
+        else:
+            continue
+        for arq in arquivos:
+            st = arq.stat()
+            partes.append(f"{arq.name}:{st.st_mtime_ns}:{st.st_size}")
+    if not partes:
+        return "0"
+    # hashlib (e não hash()): precisa ser igual em todos os processos
+    return hashlib.sha1("|".join(partes).encode()).hexdigest()[:12]
+
+
+def versao_codigo(pasta=Path(__file__).parent):
+    """Hash dos `.py` de `pasta` e da versão do Plotly (igual entre workers)."""
+    h = hashlib.sha1(plotly.__version__.encode())
+    for arq in sorted(Path(pasta).glob("*.py")):
+        h.update(arq.name.encode())
+        h.update(arq.read_bytes())
+    return h.hexdigest()[:12]
+
+
+VERSAO_CODIGO = versao_codigo()
+
+
+class _LRUMemoria:
+    """LRU por bytes (tamanho do pickle), usado quando não há diskcache."""
+
+    def __init__(self, limite_bytes):
+        self.limite = limite_bytes
+        self.itens = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, chave):
+        with self.lock:
+            if chave not in self.itens:
+                self.misses += 1
+                return _AUSENTE
+            self.itens.move_to_end(chave)
+            self.hits += 1
+            return pickle.loads(self.itens[chave])
+
+    def set(self, chave, valor):
+        dado = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if chave in self.itens:
+                self.bytes -= len(self.itens.pop(chave))
+            self.itens[chave] = dado
+            self.bytes += len(dado)
+            while self.bytes > self.limite and self.itens:
+                _, antigo = self.itens.popitem(last=False)
+                self.bytes -= len(antigo)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "entradas": len(self.itens), "bytes": self.bytes}
+
+    def clear(self):
+        with self.lock:
+            self.itens.clear()
+            self.bytes = 0
+
+
+class _LRUDisco:
+    """Cache em disco compartilhado (diskcache), LRU por tamanho."""
+
+    def __init__(self, pasta, limite_bytes):
+        self.cache = diskcache.Cache(
+            pasta, size_limit=limite_bytes,
+            eviction_policy="least-recently-used")
+        self.cache.stats(enable=True)
+
+    def get(self, chave):
+        return self.cache.get(chave, default=_AUSENTE)
+
+    def set(self, chave, valor):
+        self.cache.set(chave, valor)
+
+    def stats(self):
+        hits, misses = self.cache.stats()
+        return {"hits": hits, "misses": misses,
+                "entradas": len(self.cache), "bytes": self.cache.volume()}
+
+    def clear(self):
+        self.cache.clear()
+
+
+class CacheResultados:
+    """Memoização de funções puras chaveada por (função, versões, argumentos).
+
+    A chamada é ligada à assinatura com os padrões aplicados: `f(ds, k)`,
+    `f(ds, k, PADRAO)` e `f(ds, k, param=PADRAO)` caem na mesma entrada.
+    Os valores devem já estar em forma canônica (ex.: anos como tupla
+    ordenada) para que estados de filtro iguais caiam na mesma entrada.
+    Objetos com atributo `chave_cache` (ex.: o Dataset) entram na chave por
+    esse valor, não pelo conteúdo.
+    """
+
+    def __init__(self, versao, pasta=CACHE_DIR, limite_mb=CACHE_MB):
+        self.versao = versao
+        limite = int(limite_mb) * 1024 * 1024
+        if diskcache is not None:
+            self.backend = _LRUDisco(pasta, limite)
+        else:
+            self.backend = _LRUMemoria(limite)
+
+    def memoize(self, func):
+        nome = f"{func.__module__}.{func.__qualname__}"
+        assinatura = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            chamada = assinatura.bind(*args, **kwargs)
+            chamada.apply_defaults()
+            chave = (nome, self.versao, VERSAO_CODIGO) + tuple(
+                getattr(a, "chave_cache", a) for a in chamada.arguments.values())
+            valor = self.backend.get(chave)
+            registrar_cache(func.__name__, valor is not _AUSENTE)
+            if valor is _AUSENTE:
+                valor = func(*chamada.args, **chamada.kwargs)
+                if isinstance(valor, BaseFigure):
+                    valor = valor.to_plotly_json()
+                self.backend.set(chave, valor)
+            return valor
+
+        wrapper.uncached = func
+        return wrapper
+
+    def stats(self):
+        st = self.backend.stats()
+        total = st["hits"] + st["misses"]
+        st["hit_rate"] = st["hits"] / total if total else 0.0
+        st["backend"] = "diskcache" if diskcache is not None else "memoria"
+        st["versao"] = self.versao
+        return st
+
+    def clear(self):
+        self.backend.clear()
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+
+from simulacao_cafe import (CONV_N2O_N_TO_N2O, EF1_N2O_N_PER_KG_N,
+                            EF_DIESEL_KGCO2_PER_L, EF_UPSTREAM_N_KGCO2E_PER_KG,
+                            N2O_TO_CO2E, PRECO_SACA, inflacao_custo)
+
+# ------------------------------------------------------------
+# Cenários "e se" (preço, inflação de custos, fatores de emissão)
+# ------------------------------------------------------------
+# Um cenário é uma linha de uma tabela de parâmetros:
+#   preco_fator    multiplica o preço da saca do ano (1 = preço simulado)
+#   custo_fator    multiplica o custo total (1 = inflação simulada)
+#   ef_diesel      kg CO2 / L de diesel
+#   ef_upstream_n  kg CO2e / kg N (produção e transporte)
+#   gwp_n2o        GWP100 do N2O (AR4 = 298, AR5 = 265, AR6 = 273)
+# e, opcionalmente, `preco_<ano>` / `inflacao_<ano>` com valores absolutos
+# para anos específicos (NaN = usa o fator).
+#
+# Todos os KPIs afetados são lineares nos parâmetros do cenário, linha a
+# linha: receita = preço·prod, custo/saca = f·custo/prod, GHG/saca =
+# ef_d·diesel/prod + ef_n·N/prod etc. A média por (ano, sistema) de cada
+# termo já está no cubo de agregados, então o broadcast cenários × linhas
+# se reduz a cenários × células (ano, sistema) — o mesmo resultado, exato,
+# sem materializar uma matriz do tamanho do painel.
+PARAMETROS = ["preco_fator", "custo_fator", "ef_diesel", "ef_upstream_n",
+              "gwp_n2o"]
+
+# Colunas recalculadas (nomes do dashboard)
+COLUNAS_CENARIO = [
+    "receita_total_RSha", "custo_total_RSha", "rentabilidade_RSha",
+    "margem_liquida_%", "custo_por_saca_R$", "GHG_kgCO2e_saca", "CI_ha_tCO2e",
+]
+
+# Colunas do cubo de onde saem as médias por célula
+FONTES = ["produtividade_sacas_ha", "custo_total_RSha", "custo_por_saca_R$",
+          "diesel_Lha", "N_kg_ha", "diesel_por_saca_L", "GHG_kgCO2e_saca"]
+
+
+def ef_total_n(ef_upstream_n, gwp_n2o):
+    """kg CO2e por kg de N: upstream + N2O do solo (Tier 1)."""
+    return ef_upstream_n + EF1_N2O_N_PER_KG_N * CONV_N2O_N_TO_N2O * gwp_n2o
+
+
+def cenario_base(nome="Base (AR4)", **parametros):
+    """Um cenário com os valores da simulação, alterando só `parametros`."""
+    cenario = {"nome": nome, "preco_fator": 1.0, "custo_fator": 1.0,
+               "ef_diesel": EF_DIESEL_KGCO2_PER_L,
+               "ef_upstream_n": EF_UPSTREAM_N_KGCO2E_PER_KG,
+               "gwp_n2o": float(N2O_TO_CO2E)}
+    cenario.update(parametros)
+    return cenario
+
+
+def cenarios_padrao():
+    """Conjunto de cenários oferecido no dashboard."""
+    return pd.DataFrame([
+        cenario_base(),
+        cenario_base("GWP AR5 (N₂O = 265)", gwp_n2o=265.0),
+        cenario_base("GWP AR6 (N₂O = 273)", gwp_n2o=273.0),
+        cenario_base("Preço da saca −20%", preco_fator=0.8),
+        cenario_base("Preço da saca +20%", preco_fator=1.2),
+        cenario_base("Custos +15%", custo_fator=1.15),
+        cenario_base("Preço −20% e custos +15%", preco_fator=0.8,
+                     custo_fator=1.15),
+    ]).set_index("nome")
+
+
+def _por_ano(cenarios, prefixo, anos, base, fator):
+    """Matriz (cenários x anos): `prefixo_<ano>` se houver, senão base·fator."""
+    saida = fator[:, None] * base[None, :]
+    for i, ano in enumerate(anos):
+        col = f"{prefixo}_{ano}"
+        if col in cenarios.columns:
+            v = cenarios[col].to_numpy(dtype=float)
+            saida[:, i] = np.where(np.isnan(v), saida[:, i], v)
+    return saida
+
+
+def medias_cenarios(cube, cenarios, anos=None, preco_base=None):
+    """Médias por (cenário, sistema) das `COLUNAS_CENARIO`.
+
+    `preco_base` ({ano: R$/saca}) é o preço com que as linhas foram
+    simuladas (padrão: `PRECO_SACA`; anos fora dele, ex. ingeridos, devem
+    vir da tabela de constantes do Dataset). Devolve um dicionário
+    coluna -> DataFrame (cenário x sistema).
+    """
+    m = cube._sel_anos(anos)
+    anos_sel = cube.anos[m]
+    preco_base = {**PRECO_SACA, **(preco_base or {})}
+    p0 = np.array([preco_base.get(int(a), np.nan) for a in anos_sel], dtype=float)
+    i0 = np.array([inflacao_custo(a) for a in anos_sel], dtype=float)
+
+    def coluna(nome, campo):
+        j = cube.cols.index(nome)
+        return getattr(cube, campo)[m, :, j]  # (anos, sistemas)
+
+    n = coluna("produtividade_sacas_ha", "count")
+    prod = coluna("produtividade_sacas_ha", "soma")
+    custo = coluna("custo_total_RSha", "soma")
+    custo_saca = coluna("custo_por_saca_R$", "soma")
+    diesel = coluna("diesel_Lha", "soma")
+    nitro = coluna("N_kg_ha", "soma")
+    diesel_saca = coluna("diesel_por_saca_L", "soma")
+    # N/prod não está no cubo: sai do GHG/saca da linha de base
+    ef_n0 = ef_total_n(EF_UPSTREAM_N_KGCO2E_PER_KG, N2O_TO_CO2E)
+    nitro_saca = (coluna("GHG_kgCO2e_saca", "soma")
+                  - EF_DIESEL_KGCO2_PER_L * diesel_saca) / ef_n0
+
+    # parâmetros: (cenários,) e (cenários, anos)
+    par = {p: cenarios[p].to_numpy(dtype=float) for p in PARAMETROS}
+    preco = _por_ano(cenarios, "preco", anos_sel, p0, par["preco_fator"])
+    infl = _por_ano(cenarios, "inflacao", anos_sel, i0, par["custo_fator"])
+    fator_custo = infl / i0[None, :]
+    ef_d = par["ef_diesel"][:, None, None]
+    ef_n = ef_total_n(par["ef_upstream_n"], par["gwp_n2o"])[:, None, None]
+
+    # somas por (cenário, ano, sistema) -> soma nos anos -> média
+    P = preco[:, :, None]
+    F = fator_custo[:, :, None]
+    somas = {
+        "receita_total_RSha": P * prod,
+        "custo_total_RSha": F * custo,
+        "custo_por_saca_R$": F * custo_saca,
+        "GHG_kgCO2e_saca": ef_d * diesel_saca + ef_n * nitro_saca,
+        "CI_ha_tCO2e": (ef_d * diesel + ef_n * nitro) / 1000.0,
+        "margem_liquida_%": 100.0 * (n - F / P * custo_saca),
+    }
+    somas["rentabilidade_RSha"] = somas["receita_total_RSha"] - \
+        somas["custo_total_RSha"]
+
+    total = n.sum(axis=0)  # (sistemas,)
+    indice = pd.Index(cenarios.index, name="cenario")
+    saida = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for col in COLUNAS_CENARIO:
+            media = somas[col].sum(axis=1) / total[None, :]
+            saida[col] = pd.DataFrame(
+                np.where(total[None, :] > 0, media, np.nan), index=indice,
+                columns=pd.Index(cube.sistemas, name="sistema"))
+    return saida
+
+
+def resumir(cube, cenarios, anos=None, preco_base=None):
+    """Resumo longo (cenário, sistema, colunas) de `medias_cenarios`."""
+    medias = medias_cenarios(cube, cenarios, anos, preco_base)
+    longo = [df.stack().rename(col) for col, df in medias.items()]
+    return pd.concat(longo, axis=1).reset_index()
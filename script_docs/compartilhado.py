@@ -0,0 +1,166 @@
+import fcntl
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ingestao import Dataset
+
+# ------------------------------------------------------------
+# Dataset compartilhado entre os workers (arquivos mmap em /dev/shm)
+# ------------------------------------------------------------
+# Sem este modo, cada worker do gunicorn lê e deriva os dados e guarda uma
+# cópia privada: a memória da máquina cresce com o número de workers.
+# Aqui o primeiro processo que carrega uma versão a "publica" uma única vez
+# — colunas já compactas e ordenadas por (ano, sistema, farm_id), um
+# `.npy` por coluna, mais os índices, o cubo e a tabela de constantes — em
+# `CAFE_COMPARTILHADO_DIR/<versão>/` (por padrão em /dev/shm, memória
+# compartilhada). Os demais workers só anexam: `np.load(mmap_mode="r")`
+# devolve visões somente leitura das mesmas páginas físicas, sem parse,
+# sem cópia e sem reordenar. A publicação é atômica (pasta temporária +
+# rename) e protegida por um lock de arquivo: workers que sobem juntos
+# esperam o primeiro em vez de publicar em paralelo.
+#
+# Ao publicar, só as `MANTER_VERSOES` versões mais recentes ficam (um worker
+# que sobe anexa a versão dos arquivos e, em seguida, a da ingestão); as
+# apagadas continuam legíveis por quem já as anexou (o Linux só libera as
+# páginas quando o último mmap é fechado).
+_SHM = Path("/dev/shm")
+COMPARTILHADO_DIR = Path(os.environ.get(
+    "CAFE_COMPARTILHADO_DIR",
+    str(_SHM / "cafe_dashboard" if _SHM.is_dir()
+        else Path(tempfile.gettempdir()) / "cafe_dashboard_compartilhado")))
+MANIFESTO = "manifesto.json"
+INDICES = ["ordem_farm", "farm_ids", "farm_ini"]
+MANTER_VERSOES = 3
+
+
+def pasta_versao(versao, base=COMPARTILHADO_DIR):
+    return Path(base) / versao
+
+
+def publicado(versao, base=COMPARTILHADO_DIR):
+    """True se a versão já está publicada (e completa)."""
+    return (pasta_versao(versao, base) / MANIFESTO).exists()
+
+
+def publicar(ds, base=COMPARTILHADO_DIR):
+    """Grava `ds` em `base/<versão>/` (se ainda não estiver) e devolve a pasta."""
+    base = Path(base)
+    destino = pasta_versao(ds.versao, base)
+    if publicado(ds.versao, base):
+        return destino
+    base.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{ds.versao}-", dir=base))
+    try:
+        os.chmod(tmp, 0o755)  # mkdtemp cria 0700
+        categorias = {}
+        for col in ds.df.columns:
+            serie = ds.df[col]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                categorias[col] = [str(c) for c in serie.cat.categories]
+                arr = serie.cat.codes.to_numpy()
+            else:
+                arr = serie.to_numpy()
+            np.save(tmp / f"{col}.npy", arr)
+        for nome in INDICES:
+            np.save(tmp / f"_{nome}.npy", getattr(ds, nome))
+        with open(tmp / "extras.pkl", "wb") as f:
+            pickle.dump({"cube": ds.cube, "tabela_anos": ds.tabela_anos}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        manifesto = {
+            "versao": ds.versao,
+            "linhas": len(ds.df),
+            "colunas": list(ds.df.columns),
+            "categorias": categorias,
+            "particoes": [[a, s, i, f] for (a, s), (i, f) in ds.particoes.items()],
+            "faixas": [[a, i, f] for a, (i, f) in ds.faixas.items()],
+        }
+        (tmp / MANIFESTO).write_text(
+            json.dumps(manifesto, ensure_ascii=False), encoding="utf-8")
+        try:
+            os.rename(tmp, destino)
+        except OSError:  # outro processo publicou a mesma versão antes
+            shutil.rmtree(tmp, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    limpar(base)
+    return destino
+
+
+def limpar(base=COMPARTILHADO_DIR, manter=MANTER_VERSOES):
+    """Apaga as versões publicadas além das `manter` mais recentes."""
+    versoes = [p for p in Path(base).iterdir()
+               if p.is_dir() and not p.name.startswith(".")]
+    versoes.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+    for pasta in versoes[manter:]:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def abrir(versao, base=COMPARTILHADO_DIR):
+    """Anexa a versão publicada: Dataset com visões somente leitura (mmap)."""
+    pasta = pasta_versao(versao, base)
+    manifesto = json.loads((pasta / MANIFESTO).read_text(encoding="utf-8"))
+    dados = {}
+    for col in manifesto["colunas"]:
+        # ndarray comum (não np.memmap) sobre as mesmas páginas: sem cópia
+        arr = np.asarray(np.load(pasta / f"{col}.npy", mmap_mode="r"))
+        if col in manifesto["categorias"]:
+            dados[col] = pd.Categorical.from_codes(
+                arr, manifesto["categorias"][col])
+        else:
+            dados[col] = arr
+    df = pd.DataFrame(dados, columns=manifesto["colunas"], copy=False)
+    indices = {nome: np.asarray(np.load(pasta / f"_{nome}.npy", mmap_mode="r"))
+               for nome in INDICES}
+    indices["particoes"] = {(a, s): (i, f) for a, s, i, f in manifesto["particoes"]}
+    indices["faixas"] = {a: (i, f) for a, i, f in manifesto["faixas"]}
+    with open(pasta / "extras.pkl", "rb") as f:
+        extras = pickle.load(f)
+    return Dataset(df, extras["cube"], manifesto["versao"], extras["tabela_anos"],
+                   indices=indices)
+
+
+class _Trava:
+    """Lock exclusivo entre processos (flock) sobre `base/.trava`."""
+
+    def __init__(self, base):
+        self.caminho = Path(base) / ".trava"
+
+    def __enter__(self):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.arquivo = open(self.caminho, "w")
+        fcntl.flock(self.arquivo, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.arquivo, fcntl.LOCK_UN)
+        self.arquivo.close()
+
+
+def anexar_ou_carregar(versao, carregar, base=COMPARTILHADO_DIR):
+    """Dataset da `versao` publicada; se não houver, `carregar()` e publica.
+
+    Só um processo por vez carrega/publica; os que chegam depois anexam o
+    que ele publicou.
+    """
+    if publicado(versao, base):
+        try:
+            return abrir(versao, base)
+        except FileNotFoundError:  # apagada por `limpar` no meio do caminho
+            pass
+    with _Trava(base):
+        if not publicado(versao, base):
+            publicar(carregar(), base)
+    return abrir(versao, base)
+
+
+def compartilhar(ds, base=COMPARTILHADO_DIR):
+    """Publica `ds` (se preciso) e devolve a versão anexada, sem cópia privada."""
+    return anexar_ou_carregar(ds.versao, lambda: ds, base)
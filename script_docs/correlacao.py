@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Correlações de todos os pares de métricas (Pearson e Spearman)
+# ------------------------------------------------------------
+# Em vez de calcular r para o par escolhido na dispersão, calculamos de uma
+# vez a matriz inteira, por sistema, para uma seleção de anos:
+#   - Pearson: com X centrado e M a máscara de valores finitos, as somas
+#     pareadas (n, Σx, Σx², Σxy de cada par de colunas) saem de quatro
+#     produtos de matrizes (métricas x linhas @ linhas x métricas);
+#   - Spearman: é o Pearson dos postos; cada coluna é ordenada uma única
+#     vez (postos médios nos empates) e os postos passam pelo mesmo cálculo.
+# Junto com r saem a reta de regressão (y sobre x) e a faixa de x de cada
+# par, então navegar entre pares na dispersão não recalcula nada.
+#
+# Valores ausentes: cada par usa as linhas em que as duas métricas são
+# finitas. No Spearman os postos são os da coluna inteira (não refeitos par
+# a par) — idêntico ao exato quando não há lacunas, como nos dados simulados.
+METODOS = {"pearson": "Pearson (r)", "spearman": "Spearman (ρ)"}
+
+
+def postos(x):
+    """Postos (1..n) de `x`, com empates pela média; não finitos ficam NaN."""
+    x = np.asarray(x, dtype=np.float64)
+    ok = np.isfinite(x)
+    completo = ok.all()
+    v = x if completo else x[ok]
+    ordem = np.argsort(v)
+    s = v[ordem]
+    novo = np.r_[True, s[1:] != s[:-1]]  # início de cada bloco de empates
+    inicio = np.flatnonzero(novo)
+    fim = np.r_[inicio[1:], len(s)]
+    media = (inicio + fim + 1) / 2.0     # média das posições inicio+1..fim
+    r = np.empty(len(v))
+    r[ordem] = media[np.cumsum(novo) - 1]
+    if completo:
+        return r
+    out = np.full(len(x), np.nan)
+    out[ok] = r
+    return out
+
+
+def somas_pareadas(X):
+    """Estatísticas de cada par (i, j) de colunas de X nas linhas válidas dos dois.
+
+    Devolve (n, r, inclinação, intercepto), matrizes métricas x métricas com
+    x = coluna i e y = coluna j (reta de y sobre x).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    ok = np.isfinite(X)
+    # centrar antes de somar evita cancelamento em colunas com média alta
+    if ok.all():
+        # sem lacunas todo par usa todas as linhas: basta X0ᵀX0
+        centro = X.mean(axis=0) if len(X) else np.zeros(X.shape[1])
+        X0 = X - centro
+        sxy = X0.T @ X0
+        n = np.full(sxy.shape, float(len(X)))
+        sx = np.zeros(sxy.shape)
+        sxx = np.repeat(np.diag(sxy)[:, None], len(sxy), axis=1)
+    else:
+        M = ok.astype(np.float64)
+        centro = np.where(ok, X, 0.0).sum(axis=0) / np.maximum(M.sum(axis=0), 1)
+        X0 = np.where(ok, X - centro, 0.0)
+        n = M.T @ M
+        sx = X0.T @ M                   # sx[i, j] = Σ x_i nas linhas do par
+        sxx = (X0 * X0).T @ M
+        sxy = X0.T @ X0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        vx = sxx - sx * sx / n
+        r = np.clip(cov / np.sqrt(vx * vx.T), -1.0, 1.0)
+        inclinacao = cov / vx
+        intercepto = (sx.T / n + centro[None, :]) \
+            - inclinacao * (sx / n + centro[:, None])
+    return n, r, inclinacao, intercepto
+
+
+class MatrizCorrelacao:
+    """Pearson, Spearman e retas de todos os pares de métricas, por sistema.
+
+    Arrays com forma (sistemas, métricas, métricas); `minimo`/`maximo`
+    (sistemas, métricas) dão a faixa de x das retas de tendência.
+    """
+
+    def __init__(self, sistemas, cols, n, pearson, spearman, inclinacao,
+                 intercepto, minimo, maximo):
+        self.sistemas = list(sistemas)
+        self.cols = list(cols)
+        self.n = n
+        self.pearson = pearson
+        self.spearman = spearman
+        self.inclinacao = inclinacao
+        self.intercepto = intercepto
+        self.minimo = minimo
+        self.maximo = maximo
+        self._pos = {c: i for i, c in enumerate(self.cols)}
+
+    @classmethod
+    def de_grupos(cls, grupos, cols, progresso=None):
+        """Calcula as matrizes a partir de {sistema: matriz linhas x `cols`}.
+
+        `progresso(fração, mensagem)`, se dado, é chamado a cada sistema
+        concluído (e pode interromper o cálculo levantando uma exceção).
+        """
+        partes = []
+        for k, X in enumerate(grupos.values()):
+            X = np.asarray(X, dtype=np.float64)
+            n, r, b, a = somas_pareadas(X)
+            # postos coluna a coluna, direto numa matriz métricas x linhas
+            R = np.empty((len(cols), len(X)))
+            for j, coluna in enumerate(np.ascontiguousarray(X.T)):
+                R[j] = postos(coluna)
+            rho = somas_pareadas(R.T)[1]
+            ok = np.isfinite(X)
+            minimo = np.where(ok, X, np.inf).min(axis=0, initial=np.inf)
+            maximo = np.where(ok, X, -np.inf).max(axis=0, initial=-np.inf)
+            partes.append((n, r, rho, b, a,
+                           np.where(np.isfinite(minimo), minimo, np.nan),
+                           np.where(np.isfinite(maximo), maximo, np.nan)))
+            if progresso is not None:
+                progresso((k + 1) / len(grupos),
+                          f"correlações {k + 1}/{len(grupos)} sistemas")
+        if not partes:
+            k = len(cols)
+            vazio, faixa = np.empty((0, k, k)), np.empty((0, k))
+            return cls([], cols, vazio, vazio, vazio, vazio, vazio, faixa, faixa)
+        return cls(grupos.keys(), cols, *(np.stack(c) for c in zip(*partes)))
+
+    def tabela(self, sistema, metodo="pearson"):
+        """Matriz (DataFrame métricas x métricas) de um sistema."""
+        s = self.sistemas.index(sistema)
+        return pd.DataFrame(getattr(self, metodo)[s], index=self.cols,
+                            columns=self.cols)
+
+    def par(self, sistema, col_x, col_y):
+        """r, R², ρ, n e reta de tendência de um par, sem recalcular."""
+        s = self.sistemas.index(sistema)
+        i, j = self._pos[col_x], self._pos[col_y]
+        r = float(self.pearson[s, i, j])
+        return {
+            "n": int(self.n[s, i, j]),
+            "r": r,
+            "r2": r * r,
+            "rho": float(self.spearman[s, i, j]),
+            "inclinacao": float(self.inclinacao[s, i, j]),
+            "intercepto": float(self.intercepto[s, i, j]),
+            "x_min": float(self.minimo[s, i]),
+            "x_max": float(self.maximo[s, i]),
+        }
+
+    def longa(self):
+        """Um registro por (sistema, par i < j): n, Pearson, R² e Spearman."""
+        i, j = np.triu_indices(len(self.cols), k=1)
+        partes = []
+        for s, sistema in enumerate(self.sistemas):
+            r = self.pearson[s, i, j]
+            partes.append(pd.DataFrame({
+                "sistema": sistema,
+                "metrica_x": np.asarray(self.cols, dtype=object)[i],
+                "metrica_y": np.asarray(self.cols, dtype=object)[j],
+                "n": self.n[s, i, j].astype(np.int64),
+                "pearson": r,
+                "r2": r * r,
+                "spearman": self.spearman[s, i, j],
+            }))
+        if not partes:
+            return pd.DataFrame(columns=["sistema", "metrica_x", "metrica_y",
+                                         "n", "pearson", "r2", "spearman"])
+        return pd.concat(partes, ignore_index=True)
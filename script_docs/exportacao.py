@@ -0,0 +1,126 @@
+import zlib
+
+# ------------------------------------------------------------
+# Exportação em fluxo (CSV / Parquet, opcionalmente gzip)
+# ------------------------------------------------------------
+# Cada exportação é um gerador de blocos de bytes: as linhas são
+# percorridas em fatias de `TAMANHO_PARTE` e cada fatia é serializada e
+# entregue antes da próxima ser lida. A memória do worker fica na ordem de
+# uma fatia, qualquer que seja o tamanho da exportação, e o Flask envia a
+# resposta em "chunked transfer encoding".
+TAMANHO_PARTE = 50_000
+
+FORMATOS = {
+    # formato: (mimetype, extensão)
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def _fatias(df, colunas, tamanho, ordem=None):
+    """Fatias de `df` (só `colunas`); `ordem` = posições das linhas, se houver.
+
+    `df` pode ser uma lista de DataFrames (ex.: as faixas de cada ano),
+    percorridos em sequência sem serem concatenados.
+    """
+    if isinstance(df, list):
+        for bloco in df:
+            yield from _fatias(bloco, colunas, tamanho)
+        return
+    n = len(df) if ordem is None else len(ordem)
+    for ini in range(0, n, tamanho):
+        if ordem is None:
+            parte = df.iloc[ini:ini + tamanho]
+        else:
+            parte = df.iloc[ordem[ini:ini + tamanho]]
+        yield parte[colunas]
+
+
+def _modelo(df):
+    """DataFrame que dá colunas e tipos (o primeiro, se `df` for uma lista)."""
+    return df[0] if isinstance(df, list) else df
+
+
+def partes_csv(df, colunas=None, tamanho=TAMANHO_PARTE, ordem=None):
+    """Gera o CSV de `df` em blocos (cabeçalho só no primeiro)."""
+    colunas = list(_modelo(df).columns) if colunas is None else colunas
+    yield (",".join(colunas) + "\n").encode("utf-8")
+    for parte in _fatias(df, colunas, tamanho, ordem):
+        yield parte.to_csv(header=False, index=False).encode("utf-8")
+
+
+class _Buffer:
+    """Destino de escrita que acumula bytes até serem retirados."""
+
+    def __init__(self):
+        self.partes = []
+        self.closed = False
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def retirar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+
+def partes_parquet(df, colunas=None, tamanho=TAMANHO_PARTE, ordem=None,
+                   compressao="snappy"):
+    """Gera o Parquet de `df` em blocos: um row group por fatia (requer pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    colunas = list(_modelo(df).columns) if colunas is None else colunas
+    destino = _Buffer()
+    # o esquema vem de uma fatia vazia: vale também para exportações vazias
+    esquema = pa.Schema.from_pandas(_modelo(df).iloc[:0][colunas],
+                                    preserve_index=False)
+    escritor = pq.ParquetWriter(destino, esquema, compression=compressao)
+    for parte in _fatias(df, colunas, tamanho, ordem):
+        escritor.write_table(pa.Table.from_pandas(
+            parte, schema=esquema, preserve_index=False))
+        yield destino.retirar()
+    escritor.close()
+    yield destino.retirar()
+
+
+def comprimir_gzip(partes, nivel=6):
+    """Comprime um gerador de blocos em gzip, também em fluxo."""
+    comp = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # 31 = cabeçalho gzip
+    for parte in partes:
+        dados = comp.compress(parte)
+        if dados:
+            yield dados
+    yield comp.flush()
+
+
+def exportar(df, formato, colunas=None, gzip=False, ordem=None,
+             tamanho=TAMANHO_PARTE):
+    """Gerador de bytes de `df` no `formato` pedido.
+
+    `ordem` (posições das linhas) permite exportar o resultado filtrado e
+    ordenado da tabela sem materializá-lo; sem `ordem`, `df` pode ser uma
+    lista de DataFrames exportados em sequência (ex.: a faixa de cada ano). Em Parquet a compressão gzip é
+    aplicada às colunas (o arquivo continua sendo um Parquet válido); em
+    CSV o fluxo todo vira um `.csv.gz`.
+    """
+    if formato == "csv":
+        partes = partes_csv(df, colunas, tamanho, ordem)
+        return comprimir_gzip(partes) if gzip else partes
+    if formato == "parquet":
+        return partes_parquet(df, colunas, tamanho, ordem,
+                              compressao="gzip" if gzip else "snappy")
+    raise ValueError(f"Formato desconhecido: {formato!r}")
+
+
+def nome_arquivo(base, formato, gzip=False):
+    ext = FORMATOS[formato][1]
+    return f"{base}.{ext}.gz" if gzip and formato == "csv" else f"{base}.{ext}"
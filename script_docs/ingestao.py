@@ -0,0 +1,420 @@
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from agregacao import CuboAgregados, alargar_bordas, faixa_colunas
+from armazenamento import FONTES_DERIVADAS, compactar, garantir_derivadas
+
+# ------------------------------------------------------------
+# Dataset versionado + ingestão incremental
+# ------------------------------------------------------------
+# O app guarda um único `Dataset` (linhas, cubo e versão) em uma variável
+# global. A ingestão monta um Dataset *novo* a partir do atual mais as
+# linhas novas e troca a referência de uma vez: requisições em andamento
+# continuam com o objeto antigo, as seguintes já veem o novo.
+#
+# Seleções de anos devolvem visões (fatias `iloc`) sempre que possível; as
+# que exigem cópia (anos com lacunas em `filtered`) ficam num LRU limitado
+# por bytes (`CAFE_COPIAS_MB`), por fotografia.
+LIMITE_COPIAS_MB = float(os.environ.get("CAFE_COPIAS_MB", "64"))
+
+
+def _unir_faixas(faixas):
+    """Funde faixas `[ini, fim)` ordenadas que se tocam."""
+    blocos = []
+    for ini, fim in faixas:
+        if fim <= ini:
+            continue
+        if blocos and blocos[-1][1] == ini:
+            blocos[-1] = (blocos[-1][0], fim)
+        else:
+            blocos.append((ini, fim))
+    return blocos
+
+
+def empilhar(partes, cols, dtype=np.float64):
+    """Colunas `cols` das fatias `partes` numa única matriz (linhas x cols).
+
+    Cópia temporária, do tamanho só das colunas pedidas: quem precisa de
+    uma matriz por sistema (bootstrap, correlações) a monta e descarta.
+    """
+    n = sum(len(p) for p in partes)
+    X = np.empty((n, len(cols)), dtype=dtype)
+    ini = 0
+    for p in partes:
+        for j, col in enumerate(cols):
+            X[ini:ini + len(p), j] = p[col].to_numpy()
+        ini += len(p)
+    return X
+
+
+def _ordenado(*chaves):
+    """Se as linhas estão em ordem crescente pelas `chaves` (a 1ª manda)."""
+    ok = np.ones(max(len(chaves[0]) - 1, 0), dtype=bool)   # empate até aqui
+    for x in reversed(chaves):
+        x = np.asarray(x)
+        ok = (x[1:] > x[:-1]) | ((x[1:] == x[:-1]) & ok)
+    return bool(ok.all())
+
+
+class Dataset:
+    """Fotografia imutável dos dados servidos pelo dashboard.
+
+    As linhas ficam fisicamente ordenadas por (ano, sistema, farm_id):
+    cada partição (ano, sistema) é uma faixa contígua `[inicio, fim)` e
+    cada ano é a união contígua das suas partições. Um índice por
+    `farm_id` (posições das linhas ordenadas por fazenda e ano) responde à
+    série de uma fazenda com uma busca binária. `tabela_anos` guarda as
+    constantes por ano (ex.: chuva, preço da saca), uma linha por ano.
+    """
+
+    def __init__(self, df, cube, versao, tabela_anos=None, indices=None):
+        # `indices` (de `indexar`) dispensa a ordenação e o cálculo das
+        # faixas: usado ao anexar um Dataset já publicado (ver
+        # `compartilhado.py`), cujas linhas já estão na ordem certa.
+        if indices is None:
+            df, indices = self.indexar(df)
+        self.df = df
+        self.cube = cube
+        self.versao = versao
+        self.tabela_anos = tabela_anos
+        self.sistemas = list(df["sistema"].cat.categories)
+        self.particoes = indices["particoes"]
+        self.faixas = indices["faixas"]
+        self.anos = sorted(self.faixas)
+        self.ordem_farm = indices["ordem_farm"]
+        self.farm_ids = indices["farm_ids"]
+        self.farm_ini = indices["farm_ini"]
+
+        # cópias das seleções com lacunas (LRU por bytes), por fotografia
+        self._copias = OrderedDict()
+        self._bytes_copias = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def indexar(df):
+        """(df ordenado por (ano, sistema, farm_id), índices das partições)."""
+        if not isinstance(df["sistema"].dtype, pd.CategoricalDtype):
+            df = df.assign(sistema=df["sistema"].astype("category"))
+        ano = df["ano"].to_numpy()
+        codigos = df["sistema"].cat.codes.to_numpy()
+        farm = df["farm_id"].to_numpy()
+        # a pasta colunar já vem nessa ordem (ver `armazenamento.py`): uma
+        # verificação linear evita o lexsort e a cópia das colunas mapeadas
+        if not _ordenado(ano, codigos, farm):
+            ordem = np.lexsort((farm, codigos, ano))
+            df = df.iloc[ordem].reset_index(drop=True)
+            ano, codigos, farm = ano[ordem], codigos[ordem], farm[ordem]
+
+        sistemas = list(df["sistema"].cat.categories)
+        anos = sorted(int(a) for a in np.unique(ano))
+
+        # partições (ano, sistema) -> [ini, fim): busca binária na chave
+        # ordenada ano * n_sistemas + código
+        n_s = max(len(sistemas), 1)
+        ano_idx = np.searchsorted(anos, ano)
+        chave = ano_idx * n_s + codigos
+        bordas = np.searchsorted(chave, np.arange(len(anos) * n_s + 1))
+        particoes = {}
+        for i, a in enumerate(anos):
+            for j, sistema in enumerate(sistemas):
+                k = i * n_s + j
+                particoes[a, sistema] = (int(bordas[k]), int(bordas[k + 1]))
+        faixas = {a: (int(bordas[i * n_s]), int(bordas[(i + 1) * n_s]))
+                  for i, a in enumerate(anos)}
+
+        # farm_id -> posições das suas linhas (em ordem de ano)
+        ordem_farm = np.argsort(farm, kind="stable").astype(np.int64)
+        farm_ids, farm_ini = np.unique(farm[ordem_farm], return_index=True)
+        farm_ini = np.append(farm_ini, len(farm))
+        return df, {"particoes": particoes, "faixas": faixas,
+                    "ordem_farm": ordem_farm, "farm_ids": farm_ids,
+                    "farm_ini": farm_ini}
+
+    @property
+    def chave_cache(self):
+        """Identifica esta fotografia nas chaves do cache de resultados."""
+        return self.versao
+
+    def _fatias(self, faixas):
+        """Fatias `iloc` (visões, sem cópia) das faixas, unidas quando se tocam."""
+        return [self.df.iloc[i:f] for i, f in _unir_faixas(sorted(faixas))]
+
+    def n_linhas(self, anos_key):
+        """Número de linhas dos anos em `anos_key`, sem tocar nas linhas."""
+        return sum(f - i for a, (i, f) in self.faixas.items()
+                   if a in set(anos_key))
+
+    def fatias_anos(self, anos_key):
+        """Linhas dos anos em `anos_key` como fatias (visões), em ordem.
+
+        Anos consecutivos formam uma única fatia. É a seleção de `filtered`
+        sem a cópia das seleções com lacunas.
+        """
+        return self._fatias(self.faixas[a] for a in set(anos_key)
+                            if a in self.faixas)
+
+    def posicoes_df(self, anos_key, pos):
+        """Converte posições na seleção de `anos_key` em posições de `df`."""
+        faixas = _unir_faixas(sorted(self.faixas[a] for a in set(anos_key)
+                                     if a in self.faixas))
+        inicios = np.array([i for i, _ in faixas], dtype=np.int64)
+        acumulado = np.cumsum([0] + [f - i for i, f in faixas])[:-1]
+        k = np.searchsorted(acumulado, pos, side="right") - 1
+        return inicios[k] + (np.asarray(pos, dtype=np.int64) - acumulado[k])
+
+    def filtered(self, anos_key):
+        """Linhas dos anos em `anos_key`, sem copiar quando possível.
+
+        Anos consecutivos formam uma única faixa: o resultado é uma fatia
+        `iloc` (visão, sem cópia). Só seleções com lacunas (ex.: 2022 e
+        2024) concatenam as faixas; essas cópias ficam no LRU por bytes.
+        """
+        partes = self.fatias_anos(anos_key)
+        if not partes:
+            return self.df.iloc[:0]
+        if len(partes) == 1:
+            return partes[0]
+        chave = tuple(sorted(set(anos_key)))
+        with self._lock:
+            if chave in self._copias:
+                self._copias.move_to_end(chave)
+                return self._copias[chave]
+        copia = pd.concat(partes)
+        tamanho = int(copia.memory_usage(index=False).sum())
+        with self._lock:
+            if chave not in self._copias and tamanho <= LIMITE_COPIAS_MB * 2**20:
+                self._copias[chave] = copia
+                self._bytes_copias += tamanho
+                while self._bytes_copias > LIMITE_COPIAS_MB * 2**20:
+                    _, antiga = self._copias.popitem(last=False)
+                    self._bytes_copias -= int(antiga.memory_usage(index=False).sum())
+        return copia
+
+    def limpar_copias(self):
+        with self._lock:
+            self._copias.clear()
+            self._bytes_copias = 0
+
+    def por_sistema(self, anos_key):
+        """{sistema: [fatias]} dos anos em `anos_key`, montado por partições.
+
+        Cada fatia é uma partição (ano, sistema), uma visão sem cópia — com
+        as linhas em ordem (ano, sistema), as partições de um sistema em anos
+        diferentes não são contíguas. Quem precisa de uma matriz única usa
+        `empilhar` só com as colunas de que precisa.
+        """
+        anos = [a for a in set(anos_key) if a in self.faixas]
+        return {s: self._fatias(self.particoes[a, s] for a in anos)
+                for s in self.sistemas}
+
+    def particao(self, ano, sistema):
+        """Linhas de um (ano, sistema): fatia contígua, sem cópia."""
+        ini, fim = self.particoes.get((ano, sistema), (0, 0))
+        return self.df.iloc[ini:fim]
+
+    def linhas_fazenda(self, farm_id):
+        """Posições (em `df`) das linhas de `farm_id`, em ordem de ano."""
+        i = np.searchsorted(self.farm_ids, farm_id)
+        if i >= len(self.farm_ids) or self.farm_ids[i] != farm_id:
+            return self.ordem_farm[:0]
+        return self.ordem_farm[self.farm_ini[i]:self.farm_ini[i + 1]]
+
+    def serie_fazenda(self, farm_id):
+        """Série anual de uma fazenda; custo independente do total de linhas."""
+        return self.df.take(self.linhas_fazenda(farm_id))
+
+
+class Ingestor:
+    """Detecta linhas novas e produz uma nova versão do Dataset.
+
+    Duas fontes são observadas:
+    - o CSV principal, quando cresce (linhas acrescentadas ao final): só
+      os bytes após o último offset lido são interpretados;
+    - arquivos `*.csv` novos em `pasta_novos` (ex.: a safra de um novo ano
+      ou novas fazendas), lidos uma única vez cada.
+
+    Crescer só é tratado como acréscimo se o CSV é o mesmo arquivo: mesmo
+    inode, mesmo cabeçalho e os mesmos bytes antes do offset (hash dos
+    últimos `BYTES_CAUDA`). Se ele foi substituído ou regenerado — inode,
+    cabeçalho ou cauda diferentes, tamanho menor, ou reescrito com o mesmo
+    tamanho (mtime diferente) —, tudo é relido e o Dataset é remontado.
+    """
+
+    BYTES_CAUDA = 4096
+
+    def __init__(self, caminho_csv, pasta_novos, colunas, cols_metricas,
+                 acompanhar_csv=True):
+        self.caminho_csv = Path(caminho_csv)
+        self.pasta_novos = Path(pasta_novos)
+        self.colunas = list(colunas)
+        self.cols_metricas = list(cols_metricas)
+        self.acompanhar_csv = acompanhar_csv
+        self.lock = threading.Lock()
+        self.cabecalho = None
+        self.offset = 0
+        self.inode = self.mtime = self.cauda = None
+        if acompanhar_csv and self.caminho_csv.exists():
+            self._marcar_csv_lido(self.caminho_csv.stat().st_size)
+        self.vistos = set()
+
+    def _ler_cabecalho(self):
+        with open(self.caminho_csv, "rb") as f:
+            linha = f.readline()
+        return linha.decode("utf-8-sig").strip().split(",")
+
+    def _cauda(self, fim):
+        """Hash dos `BYTES_CAUDA` bytes do CSV que terminam em `fim`."""
+        ini = max(fim - self.BYTES_CAUDA, 0)
+        with open(self.caminho_csv, "rb") as f:
+            f.seek(ini)
+            return hashlib.sha1(f.read(fim - ini)).hexdigest()
+
+    def _marcar_csv_lido(self, offset):
+        st = self.caminho_csv.stat()
+        self.cabecalho = self._ler_cabecalho()
+        self.inode, self.mtime = st.st_ino, st.st_mtime_ns
+        self.offset = offset
+        self.cauda = self._cauda(offset)
+
+    def _csv_substituido(self, st):
+        """True se o CSV não é mais o arquivo lido até `offset` (+ acréscimos)."""
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            return True
+        if st.st_size == self.offset:
+            return st.st_mtime_ns != self.mtime
+        return self._ler_cabecalho() != self.cabecalho \
+            or self._cauda(self.offset) != self.cauda
+
+    def _ler_bloco(self, ini, fim):
+        """Linhas completas de [ini, fim) do CSV: (lote ou None, bytes usados)."""
+        with open(self.caminho_csv, "rb") as f:
+            f.seek(ini)
+            bloco = f.read(fim - ini)
+        # só linhas completas; o resto fica para a próxima leitura
+        n = bloco.rfind(b"\n") + 1
+        if not n:
+            return None, 0
+        if ini == 0:
+            lote = pd.read_csv(io.BytesIO(bloco[:n]), usecols=self._usecols())
+        else:
+            lote = pd.read_csv(io.BytesIO(bloco[:n]), header=None,
+                               names=self.cabecalho, usecols=self._usecols())
+        return lote, n
+
+    def _usecols(self):
+        fontes = set(self.colunas)
+        for col in self.colunas:
+            fontes.update(FONTES_DERIVADAS.get(col, []))
+        return lambda c: c in fontes
+
+    def _preparar(self, lote):
+        lote = garantir_derivadas(lote)
+        return lote[[c for c in self.colunas if c in lote.columns]]
+
+    def novos_lotes(self):
+        """Lê apenas o que chegou desde a última chamada.
+
+        Devolve (lotes, origens, recarga); `origens` descreve o que foi lido
+        e entra na versão do novo Dataset (igual em todos os workers). Com
+        `recarga`, o CSV foi substituído e `lotes` traz tudo de novo (CSV e
+        `pasta_novos`): as linhas atuais devem ser descartadas.
+        """
+        lotes = []
+        origens = []
+        recarga = False
+
+        if self.acompanhar_csv and self.caminho_csv.exists():
+            st = self.caminho_csv.stat()
+            if self.cabecalho is None or self._csv_substituido(st):
+                # apareceu depois da partida ou foi substituído: lê inteiro
+                recarga = self.cabecalho is not None
+                if recarga:
+                    self.vistos = set()
+                self.cabecalho = self._ler_cabecalho()
+                lote, fim = self._ler_bloco(0, st.st_size)
+                if lote is not None:
+                    lotes.append(lote)
+                origens.append(f"csv:{st.st_ino}:{st.st_mtime_ns}:0-{fim}")
+                self._marcar_csv_lido(fim)
+            elif st.st_size > self.offset:
+                lote, fim = self._ler_bloco(self.offset, st.st_size)
+                if lote is not None:
+                    lotes.append(lote)
+                    origens.append(f"csv:{self.offset}-{self.offset + fim}")
+                    self._marcar_csv_lido(self.offset + fim)
+
+        if self.pasta_novos.is_dir():
+            for arq in sorted(self.pasta_novos.glob("*.csv")):
+                if arq.name in self.vistos:
+                    continue
+                lotes.append(pd.read_csv(arq, usecols=self._usecols()))
+                self.vistos.add(arq.name)
+                st = arq.stat()
+                origens.append(f"{arq.name}:{st.st_mtime_ns}:{st.st_size}")
+
+        return [self._preparar(l) for l in lotes if len(l)], origens, recarga
+
+    def atualizar(self, ds, existente=None):
+        """Devolve um novo Dataset com as linhas novas, ou `ds` se nada mudou.
+
+        As derivadas e o cubo são calculados só para as linhas novas; o
+        cubo resultante é a mescla com o cubo atual (com as bordas dos
+        histogramas alargadas, se as linhas novas saem da faixa). Se o CSV
+        foi substituído, o Dataset é remontado do zero. `existente(versão)`,
+        se dado, pode devolver o Dataset da nova versão já montado (ex.:
+        publicado por outro worker), dispensando a montagem.
+        """
+        with self.lock:
+            lotes, origens, recarga = self.novos_lotes()
+            if not lotes:
+                if recarga:
+                    print("[ingestão] CSV substituído sem linhas; "
+                          "mantendo a versão atual", flush=True)
+                return ds
+            # numa recarga a versão só depende dos arquivos lidos
+            marca = "|".join((["recarga"] if recarga else [ds.versao]) + origens)
+            versao = hashlib.sha1(marca.encode()).hexdigest()[:12]
+            pronto = existente(versao) if existente is not None else None
+            if pronto is not None:
+                return pronto
+            novos, tabela_nova = compactar(pd.concat(lotes, ignore_index=True))
+            if recarga or not len(ds.df):
+                cube = CuboAgregados.de_dataframe(novos, self.cols_metricas)
+                return Dataset(novos, cube, versao, tabela_nova)
+            df, _ = compactar(pd.concat([ds.df, novos], ignore_index=True))
+            tabela_anos = ds.tabela_anos
+            if tabela_nova is not None:
+                tabela_anos = tabela_nova if tabela_anos is None \
+                    else tabela_nova.combine_first(tabela_anos)
+            bordas = alargar_bordas(ds.cube.bordas, ds.cube.hist.shape[-1],
+                                    *faixa_colunas(novos, ds.cube.cols))
+            cube_novo = CuboAgregados.de_dataframe(
+                novos, self.cols_metricas, bordas=bordas,
+                niveis=ds.cube.ponderadas.niveis)
+            cube = ds.cube.rebinar(bordas).mesclar(cube_novo)
+            return Dataset(df, cube, versao, tabela_anos)
+
+
+class MonitorIngestao(threading.Thread):
+    """Thread que chama `aplicar()` a cada `intervalo` segundos."""
+
+    def __init__(self, aplicar, intervalo):
+        super().__init__(daemon=True, name="ingestao-dados")
+        self.aplicar = aplicar
+        self.intervalo = intervalo
+
+    def run(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.aplicar()
+            except Exception as exc:  # não derruba o worker
+                print(f"[ingestão] falhou: {exc!r}", flush=True)
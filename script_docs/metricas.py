@@ -0,0 +1,229 @@
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+# ------------------------------------------------------------
+# Instrumentação dos callbacks (histogramas em memória + Prometheus)
+# ------------------------------------------------------------
+# Cada callback instrumentado registra, por processo:
+#   - tempo total do callback e da requisição inteira (inclui o despacho
+#     do Dash e a serialização JSON da resposta);
+#   - tempo de cada etapa marcada com `etapa("nome")` (filtro, cubo,
+#     figura...), linhas processadas (`linhas(n)`) e bytes da resposta;
+#   - acertos/falhas do cache de resultados, por função.
+# Os histogramas usam baldes fixos (como o cliente oficial do Prometheus)
+# e são expostos em texto em `/metrics`. Com vários workers, cada processo
+# responde pelos seus próprios contadores.
+#
+# Perfil opcional: com `CAFE_PERFIL_LENTO_MS` definido, os callbacks rodam
+# sob cProfile e os que passarem do limite deixam um `.prof` em
+# `CAFE_PERFIL_DIR` e um resumo (20 funções por tempo acumulado) no log.
+BALDES_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+BALDES_BYTES = (1_000, 5_000, 10_000, 50_000, 100_000, 250_000, 500_000,
+                1_000_000, 5_000_000)
+BALDES_LINHAS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+PERFIL_LENTO_MS = float(os.environ.get("CAFE_PERFIL_LENTO_MS", "0"))
+PERFIL_DIR = Path(os.environ.get(
+    "CAFE_PERFIL_DIR", str(Path(tempfile.gettempdir()) / "cafe_dashboard_perfis")))
+
+
+class Histograma:
+    """Contagens cumulativas por balde, soma e total (uma série de rótulos)."""
+
+    def __init__(self, baldes):
+        self.baldes = baldes
+        self.contagens = [0] * (len(baldes) + 1)  # último = +Inf
+        self.soma = 0.0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.baldes, valor)] += 1
+        self.soma += valor
+
+
+class Metricas:
+    """Registro de histogramas e contadores rotulados, seguro entre threads."""
+
+    # nome -> (tipo, ajuda, baldes)
+    DEFINICOES = {
+        "cafe_callback_segundos": (
+            "histogram", "Tempo de execução do callback", BALDES_SEGUNDOS),
+        "cafe_requisicao_segundos": (
+            "histogram", "Tempo da requisição do callback, com serialização",
+            BALDES_SEGUNDOS),
+        "cafe_etapa_segundos": (
+            "histogram", "Tempo de cada etapa dentro do callback", BALDES_SEGUNDOS),
+        "cafe_callback_linhas": (
+            "histogram", "Linhas processadas pelo callback", BALDES_LINHAS),
+        "cafe_resposta_bytes": (
+            "histogram", "Tamanho da resposta serializada", BALDES_BYTES),
+        "cafe_callback_erros_total": (
+            "counter", "Callbacks que terminaram com exceção", None),
+        "cafe_cache_total": (
+            "counter", "Consultas ao cache de resultados", None),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {nome: {} for nome in self.DEFINICOES}
+
+    def observar(self, nome, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self.lock:
+            serie = self.series[nome]
+            if chave not in serie:
+                serie[chave] = Histograma(self.DEFINICOES[nome][2])
+            serie[chave].observar(valor)
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self.lock:
+            serie = self.series[nome]
+            serie[chave] = serie.get(chave, 0) + valor
+
+    def exportar(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)."""
+        linhas = []
+        with self.lock:
+            for nome, (tipo, ajuda, baldes) in self.DEFINICOES.items():
+                linhas.append(f"# HELP {nome} {ajuda}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+                for chave, valor in sorted(self.series[nome].items()):
+                    if tipo == "counter":
+                        linhas.append(f"{nome}{_rotulos(chave)} {valor}")
+                        continue
+                    acumulado = 0
+                    for le, n in zip(baldes + ("+Inf",), valor.contagens):
+                        acumulado += n
+                        rot = _rotulos(chave + (("le", _numero(le)),))
+                        linhas.append(f"{nome}_bucket{rot} {acumulado}")
+                    linhas.append(f"{nome}_sum{_rotulos(chave)} {valor.soma!r}")
+                    linhas.append(f"{nome}_count{_rotulos(chave)} {acumulado}")
+        return "\n".join(linhas) + "\n"
+
+
+def _numero(v):
+    return v if isinstance(v, str) else repr(float(v))
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+def _rotulos(chave):
+    if not chave:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in chave) + "}"
+
+
+METRICAS = Metricas()
+_atual = threading.local()  # callback em execução nesta thread
+_perfil_lock = threading.Lock()  # um cProfile por vez no processo
+
+
+def callback_atual():
+    return getattr(_atual, "nome", None)
+
+
+@contextmanager
+def etapa(nome):
+    """Mede uma etapa do callback em execução (nada fora de callbacks)."""
+    callback = callback_atual()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if callback is not None:
+            METRICAS.observar("cafe_etapa_segundos", time.perf_counter() - t0,
+                              callback=callback, etapa=nome)
+
+
+def linhas(n):
+    """Soma `n` às linhas processadas pelo callback em execução."""
+    if callback_atual() is not None:
+        _atual.linhas += int(n)
+
+
+def registrar_cache(funcao, acerto):
+    METRICAS.incrementar("cafe_cache_total", funcao=funcao,
+                         resultado="acerto" if acerto else "falha")
+
+
+def _salvar_perfil(perfil, nome, dt):
+    PERFIL_DIR.mkdir(parents=True, exist_ok=True)
+    destino = PERFIL_DIR / f"{nome}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.prof"
+    perfil.dump_stats(destino)
+    resumo = io.StringIO()
+    pstats.Stats(perfil, stream=resumo).sort_stats("cumulative").print_stats(20)
+    print(f"[lento] {nome}: {dt * 1000:.0f} ms (perfil em {destino})\n"
+          f"{resumo.getvalue()}", flush=True)
+
+
+def instrumentar(func):
+    """Decorador de callbacks: tempo total, etapas, linhas e erros.
+
+    O nome do callback fica na thread durante a execução, para que
+    `etapa`, `linhas` e o gancho de fim de requisição saibam a quem
+    atribuir as medidas.
+    """
+    nome = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        _atual.nome, _atual.linhas = nome, 0
+        perfil = None
+        if PERFIL_LENTO_MS > 0 and _perfil_lock.acquire(blocking=False):
+            perfil = cProfile.Profile()
+            perfil.enable()
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            # PreventUpdate e afins também passam aqui: só contam os erros
+            if type(exc).__module__.split(".")[0] != "dash":
+                METRICAS.incrementar("cafe_callback_erros_total", callback=nome)
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            if perfil is not None:
+                perfil.disable()
+                _perfil_lock.release()
+                if dt * 1000 >= PERFIL_LENTO_MS:
+                    _salvar_perfil(perfil, nome, dt)
+            METRICAS.observar("cafe_callback_segundos", dt, callback=nome)
+            if _atual.linhas:
+                METRICAS.observar("cafe_callback_linhas", _atual.linhas,
+                                  callback=nome)
+            _atual.ultimo, _atual.duracao, _atual.nome = nome, dt, None
+
+    return wrapper
+
+
+def inicio_requisicao():
+    _atual.ultimo = None
+    _atual.inicio = time.perf_counter()
+
+
+def fim_requisicao(n_bytes):
+    """Fecha a requisição de callback: tempo total e bytes da resposta."""
+    nome = getattr(_atual, "ultimo", None)
+    inicio = getattr(_atual, "inicio", None)
+    if nome is None or inicio is None:
+        return
+    total = time.perf_counter() - inicio
+    METRICAS.observar("cafe_requisicao_segundos", total, callback=nome)
+    # o que sobra além do callback é despacho do Dash + serialização JSON
+    METRICAS.observar("cafe_etapa_segundos", max(total - _atual.duracao, 0.0),
+                      callback=nome, etapa="serializacao")
+    METRICAS.observar("cafe_resposta_bytes", n_bytes, callback=nome)
+    _atual.ultimo = _atual.inicio = None
@@ -1,11 +1,11 @@
 import numpy as np
 import pandas as pd
 
+from armazenamento import EscritorColunar, garantir_derivadas, gravar_colunar
+
 # -------------------------------------------------------------------
-# 0) SEMENTE E PARÂMETROS GERAIS
+# 0) PARÂMETROS GERAIS
 # -------------------------------------------------------------------
-np.random.seed(42)
-
 N_FARMS = 50
 ANOS = [2022, 2023, 2024]  # pode estender depois
 
@@ -30,6 +30,49 @@ CHUVA_MM = {
     2024: 1200
 }
 
+# Anos fora das tabelas acima (ex.: horizontes longos do modo dinâmico): o
+# custo sobe INFLACAO_ANUAL ao ano a partir do ano conhecido mais próximo,
+# o preço acompanha a inflação com um choque anual e a chuva varia em torno
+# de CHUVA_REF. Os choques são sorteados por ano (iguais para todas as
+# fazendas e sementes), então cada ano tem um único preço e uma única chuva.
+INFLACAO_ANUAL = 0.04
+CHUVA_REF = 1100
+VOL_PRECO = 0.15  # desvio-padrão do log do preço
+VOL_CHUVA = 0.12  # desvio-padrão do log da chuva
+
+
+def _choques_ano(ano):
+    """(choque do preço, choque da chuva) ~ N(0, 1), fixos para o ano."""
+    rng = np.random.default_rng(np.random.SeedSequence(int(ano)))
+    return rng.standard_normal(2)
+
+
+def inflacao_custo(ano):
+    """Inflator de custos do ano (base 2022 = 1.00)."""
+    ano = int(ano)
+    if ano in INFLACAO_CUSTO:
+        return INFLACAO_CUSTO[ano]
+    ref = max(INFLACAO_CUSTO) if ano > max(INFLACAO_CUSTO) else min(INFLACAO_CUSTO)
+    return INFLACAO_CUSTO[ref] * (1 + INFLACAO_ANUAL) ** (ano - ref)
+
+
+def preco_saca(ano):
+    """Preço da saca (R$) no ano."""
+    ano = int(ano)
+    if ano in PRECO_SACA:
+        return PRECO_SACA[ano]
+    ref = max(PRECO_SACA)
+    base = PRECO_SACA[ref] * inflacao_custo(ano) / inflacao_custo(ref)
+    return int(round(base * np.exp(VOL_PRECO * _choques_ano(ano)[0]), -1))
+
+
+def chuva_mm(ano):
+    """Chuva (mm/ano) do ano."""
+    ano = int(ano)
+    if ano in CHUVA_MM:
+        return CHUVA_MM[ano]
+    return int(round(CHUVA_REF * np.exp(VOL_CHUVA * _choques_ano(ano)[1])))
+
 # -------------------------------------------------------------------
 # 1) FATORES DE EMISSÃO (PADRÃO / PRONTOS PARA TROCA)
 # -------------------------------------------------------------------
@@ -60,124 +103,585 @@ EF_TOTAL_N_KGCO2E_PER_KG = EF_UPSTREAM_N_KGCO2E_PER_KG + EF_SOIL_N_KGCO2E_PER_KG
 # -------------------------------------------------------------------
 
 # -------------------------------------------------------------------
-# 2) SIMULAÇÃO
+# 2) PARÂMETROS POR SISTEMA (faixas uniformes: mínimo, máximo)
+# -------------------------------------------------------------------
+SISTEMAS = ["convencional", "regenerativo"]
+P_SISTEMAS = [0.5, 0.5]
+
+AREA_HA = (5, 30)
+
+# Região e cooperativa de cada fazenda (fixas ao longo dos anos). Cada
+# região tem suas cooperativas; a fazenda sorteia a região com as
+# probabilidades abaixo e uma cooperativa da região, uniforme.
+REGIOES = {
+    "Sul de Minas": ["SM-01", "SM-02", "SM-03", "SM-04"],
+    "Cerrado Mineiro": ["CM-01", "CM-02", "CM-03"],
+    "Mogiana": ["MO-01", "MO-02"],
+    "Matas de Minas": ["MM-01", "MM-02", "MM-03"],
+}
+P_REGIOES = [0.4, 0.25, 0.15, 0.2]
+COOPERATIVAS = [c for coops in REGIOES.values() for c in coops]
+
+PARAMS_SISTEMA = {
+    "convencional": {
+        "prod_ha": (25, 35),              # sacas/ha
+        "C_org": (10, 15),                # g/kg
+        "irrig_mm": (300, 500),           # mm
+        "diesel_Lha": (60, 100),          # L/ha
+        "N_kg_ha": (150, 200),            # kg/ha
+        "herb_Lha": (3, 7),               # L/ha de herbicida (para ilustrar)
+        "h2o_pulv_Lha": (400, 800),       # L/ha de água para pulverização
+        "erosao_t_ha": (2.0, 6.0),        # t/ha
+        "infiltr_mm_h": (10, 20),         # mm/h
+        "biodiversidade": (2.0, 5.0),     # 0-10
+        "custo_RSha": (8000, 10000),      # R$/ha (antes da inflação do ano)
+    },
+    "regenerativo": {
+        "prod_ha": (28, 38),
+        "C_org": (15, 25),
+        "irrig_mm": (200, 400),
+        "diesel_Lha": (40, 70),
+        "N_kg_ha": (120, 170),
+        "herb_Lha": (0.5, 3.0),
+        "h2o_pulv_Lha": (250, 600),
+        "erosao_t_ha": (0.5, 3.0),
+        "infiltr_mm_h": (20, 35),
+        "biodiversidade": (5.0, 8.5),
+        "custo_RSha": (7000, 9000),
+    },
+}
+
+# Esquema de saída (ordem das colunas do CSV)
+COLUNAS = [
+    "farm_id", "ano", "regiao", "cooperativa", "sistema", "area_ha", "chuva_mm",
+    "produtividade_sacas_ha", "producao_total_sacas", "preco_saca_Reais",
+    "receita_total_RSha", "custo_total_RSha", "custo_por_saca_Reais",
+    "rentabilidade_RSha", "margem_liquida",
+    "C_organico_gkg", "erosao_ton_ha", "infiltracao_mm_h", "biodiversidade_indice",
+    "irrigacao_mm", "agua_pulverizacao_Lha", "agua_total_m3ha",
+    "produtividade_hidrica_kg_m3",
+    "diesel_Lha", "diesel_por_saca_L",
+    "N_kg_ha", "herbicida_Lha",
+    "GHG_diesel_kgCO2e_ha", "GHG_N_total_kgCO2e_ha", "GHG_total_kgCO2e_ha",
+    "GHG_kgCO2e_saca", "CI_ha_tCO2e", "CI_saca_tCO2e",
+]
+
+
+# -------------------------------------------------------------------
+# 3) SIMULAÇÃO (vetorizada: um sorteio por parâmetro e por sistema)
+# -------------------------------------------------------------------
+def sortear_parametros(rng, ano, n):
+    """Sorteia sistema, área e parâmetros base de `n` fazendas em um ano.
+
+    Cada parâmetro é sorteado de uma vez para todas as fazendas do mesmo
+    sistema (um vetor por sistema), em vez de um `uniform` por linha.
+    """
+    sistema = rng.choice(np.array(SISTEMAS), size=n, p=P_SISTEMAS)
+    area_ha = rng.uniform(*AREA_HA, size=n)
+
+    params = {nome: np.empty(n) for nome in PARAMS_SISTEMA[SISTEMAS[0]]}
+    for s in SISTEMAS:
+        mask = sistema == s
+        k = int(mask.sum())
+        for nome, (lo, hi) in PARAMS_SISTEMA[s].items():
+            params[nome][mask] = rng.uniform(lo, hi, size=k)
+
+    # Custo base (R$/ha), ajustado por inflação do ano
+    params["custo_RSha"] *= inflacao_custo(ano)
+    return sistema, area_ha, params
+
+
+def calcular_kpis(ano, sistema, area_ha, p):
+    """Calcula os KPIs derivados como operações de coluna.
+
+    Recebe os parâmetros base (`p`, vetores) e devolve um dicionário
+    coluna -> vetor no esquema de `COLUNAS` (sem `farm_id`/`ano`).
+    """
+    n = len(area_ha)
+    prod_ha = p["prod_ha"]
+    prod_seguro = np.maximum(prod_ha, 1e-6)
+
+    # Produção total (sacas) e receita
+    producao_sacas = prod_ha * area_ha
+    preco = preco_saca(ano)
+    receita_RSha = prod_ha * preco
+
+    # Água total (m³/ha): irrigação + água de pulverização
+    # 1 mm = 1 L/m²; 1 ha = 10.000 m² => mm * 10.000 L/ha => /1000 = m³/ha
+    h2o_irrig_m3ha = (p["irrig_mm"] * 10000) / 1000.0
+    h2o_pulv_m3ha = p["h2o_pulv_Lha"] / 1000.0
+    h2o_total_m3ha = h2o_irrig_m3ha + h2o_pulv_m3ha
+
+    # Emissões GHG (kg CO2e/ha) — diesel + N total (upstream + solo)
+    ghg_diesel_kgco2e_ha = p["diesel_Lha"] * EF_DIESEL_KGCO2_PER_L
+    ghg_N_kgco2e_ha = p["N_kg_ha"] * EF_TOTAL_N_KGCO2E_PER_KG
+    ghg_total_kgco2e_ha = ghg_diesel_kgco2e_ha + ghg_N_kgco2e_ha
+
+    # Emissões por saca (kg CO2e/saca) — dividir por produtividade por ha
+    ghg_kgco2e_saca = ghg_total_kgco2e_ha / prod_seguro
+
+    # KPIs econômicos
+    custo_RSha = p["custo_RSha"]
+    custo_por_saca = custo_RSha / prod_seguro
+    rentabilidade_RSha = receita_RSha - custo_RSha
+    margem = rentabilidade_RSha / np.maximum(receita_RSha, 1e-6)
+
+    # KPIs ambientais/operacionais
+    produtividade_hidrica = (prod_ha * 60) / \
+        np.maximum(h2o_total_m3ha, 1e-6)  # kg café / m³ água
+    diesel_por_saca = p["diesel_Lha"] / prod_seguro
+    ci_ha_tco2e = ghg_total_kgco2e_ha / 1000.0
+    ci_saca_tco2e = ghg_kgco2e_saca / 1000.0
+
+    return dict(
+        sistema=sistema,
+        area_ha=area_ha,
+        chuva_mm=np.full(n, chuva_mm(ano)),
+        produtividade_sacas_ha=prod_ha,
+        producao_total_sacas=producao_sacas,
+        preco_saca_Reais=np.full(n, preco),
+        receita_total_RSha=receita_RSha,
+        custo_total_RSha=custo_RSha,
+        custo_por_saca_Reais=custo_por_saca,
+        rentabilidade_RSha=rentabilidade_RSha,
+        margem_liquida=margem,
+
+        C_organico_gkg=p["C_org"],
+        erosao_ton_ha=p["erosao_t_ha"],
+        infiltracao_mm_h=p["infiltr_mm_h"],
+        biodiversidade_indice=p["biodiversidade"],
+
+        irrigacao_mm=p["irrig_mm"],
+        agua_pulverizacao_Lha=p["h2o_pulv_Lha"],
+        agua_total_m3ha=h2o_total_m3ha,
+        produtividade_hidrica_kg_m3=produtividade_hidrica,
+
+        diesel_Lha=p["diesel_Lha"],
+        diesel_por_saca_L=diesel_por_saca,
+
+        N_kg_ha=p["N_kg_ha"],
+        herbicida_Lha=p["herb_Lha"],
+
+        GHG_diesel_kgCO2e_ha=ghg_diesel_kgco2e_ha,
+        GHG_N_total_kgCO2e_ha=ghg_N_kgco2e_ha,
+        GHG_total_kgCO2e_ha=ghg_total_kgco2e_ha,
+        GHG_kgCO2e_saca=ghg_kgco2e_saca,
+        CI_ha_tCO2e=ci_ha_tco2e,
+        CI_saca_tCO2e=ci_saca_tco2e,
+    )
+
+
+# -------------------------------------------------------------------
+# 4) BLOCOS COM FLUXOS ALEATÓRIOS PRÓPRIOS (reprodutível em paralelo)
+# -------------------------------------------------------------------
+# As fazendas são divididas em blocos de tamanho fixo; cada (ano, bloco)
+# recebe seu próprio Generator derivado de SeedSequence(seed, spawn_key).
+# Como a partição não depende do número de processos, o resultado é
+# idêntico bit a bit com 1 ou 32 workers.
+BLOCO_FARMS = 50_000
+
+
+def rng_bloco(seed, ano, bloco):
+    """Generator independente e auditável para o bloco (ano, bloco)."""
+    return np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(int(ano), int(bloco))))
+
+
+def simular_ano_bloco(ano, bloco, n_farms, seed=42):
+    """Simula um ano para as fazendas do bloco `bloco` (ids 1-based)."""
+    ini = bloco * BLOCO_FARMS
+    fim = min(ini + BLOCO_FARMS, n_farms)
+    rng = rng_bloco(seed, ano, bloco)
+    sistema, area_ha, params = sortear_parametros(rng, ano, fim - ini)
+    return calcular_kpis(ano, sistema, area_ha, params)
+
+
+def sortear_cooperativas(seed, bloco, n):
+    """(região, cooperativa) das `n` fazendas do bloco.
+
+    Fluxo próprio por bloco (independente dos anos e do modo), então a
+    fazenda fica na mesma cooperativa em todos os anos e modos.
+    """
+    rng = np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(int(bloco), 0, 0)))
+    nomes = list(REGIOES)
+    r = rng.choice(len(nomes), size=n, p=P_REGIOES)
+    tamanhos = np.array([len(REGIOES[x]) for x in nomes])
+    inicio = np.concatenate([[0], np.cumsum(tamanhos)[:-1]])
+    c = inicio[r] + (rng.random(n) * tamanhos[r]).astype(np.int64)
+    return np.array(nomes)[r], np.array(COOPERATIVAS)[c]
+
+
+def intercalar_anos(bloco, n_farms, anos, por_ano, seed=42):
+    """Monta as colunas de um bloco na ordem (farm_id, ano).
+
+    `por_ano` traz um dicionário de colunas por ano; empilhar em
+    (fazendas, anos) e achatar dá a ordem fazenda-major sem ordenar.
+    Região e cooperativa, fixas por fazenda, são repetidas em cada ano.
+    """
+    ini = bloco * BLOCO_FARMS
+    fim = min(ini + BLOCO_FARMS, n_farms)
+    n_anos = len(anos)
+    regiao, cooperativa = sortear_cooperativas(seed, bloco, fim - ini)
+    colunas = {
+        "farm_id": np.repeat(np.arange(ini + 1, fim + 1), n_anos),
+        "ano": np.tile(np.asarray(anos), fim - ini),
+        "regiao": np.repeat(regiao, n_anos),
+        "cooperativa": np.repeat(cooperativa, n_anos),
+    }
+    for col in COLUNAS:
+        if col not in colunas:
+            colunas[col] = np.stack([c[col] for c in por_ano], axis=1).ravel()
+    return colunas
+
+
+def simular_bloco(bloco, n_farms, anos=ANOS, seed=42, cenario=None):
+    """Simula todos os anos de um bloco de fazendas, na ordem (farm_id, ano).
+
+    Com `cenario` (nome em CENARIOS_CONVERSAO) usa o modo dinâmico.
+    """
+    if cenario is not None:
+        return simular_bloco_dinamico(bloco, n_farms, anos, seed, cenario)
+    por_ano = [simular_ano_bloco(ano, bloco, n_farms, seed) for ano in anos]
+    return intercalar_anos(bloco, n_farms, anos, por_ano, seed)
+
+
+def _simular_bloco_args(args):
+    return simular_bloco(*args)
+
+
+def n_blocos(n_farms):
+    return -(-n_farms // BLOCO_FARMS)
+
+
+def iterar_blocos(n_farms=N_FARMS, anos=ANOS, seed=42, workers=1,
+                  cenario=None):
+    """Produz os blocos de fazendas em ordem, um dicionário de colunas por vez.
+
+    Com `workers > 1` no máximo `2 * workers` blocos ficam em voo, o que
+    mantém a memória limitada independentemente de `n_farms`.
+    """
+    tarefas = [(bloco, n_farms, list(anos), seed, cenario)
+               for bloco in range(n_blocos(n_farms))]
+
+    if workers <= 1:
+        for t in tarefas:
+            yield simular_bloco(*t)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pendentes = deque()
+        for t in tarefas:
+            pendentes.append(pool.submit(_simular_bloco_args, t))
+            if len(pendentes) >= 2 * workers:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+
+
+def simular(n_farms=N_FARMS, anos=ANOS, seed=42, workers=1, cenario=None):
+    """Gera o painel fazenda-ano completo, já ordenado por (farm_id, ano).
+
+    Com `workers > 1` os blocos são simulados em um pool de processos;
+    a saída é a mesma de `workers=1`. Com `cenario`, modo dinâmico.
+    """
+    partes = list(iterar_blocos(n_farms, anos, seed, workers, cenario))
+    colunas = {col: np.concatenate([p[col] for p in partes])
+               for col in COLUNAS}
+    return pd.DataFrame(colunas, columns=COLUNAS)
+
+
+# -------------------------------------------------------------------
+# 5) MODO DINÂMICO (estado do solo carregado de um ano para o outro)
+# -------------------------------------------------------------------
+# No modo padrão cada ano é um sorteio independente. No modo dinâmico cada
+# fazenda tem um estado (carbono do solo, infiltração, erosão,
+# biodiversidade e produtividade) que a cada ano anda uma fração
+# (VELOCIDADE) da distância até o equilíbrio do manejo atual:
+#   - o carbono orgânico é lento: leva décadas para saturar;
+#   - a infiltração segue o carbono (o equilíbrio depende de quanto o solo
+#     já avançou entre os equilíbrios convencional e regenerativo);
+#   - a erosão responde metade à cobertura (logo ao converter) e metade ao
+#     solo, escalada pela chuva do ano;
+#   - a produtividade acompanha o solo com defasagem e cai nos primeiros
+#     anos após a conversão (transição), queda que se dissipa.
+# Os equilíbrios de cada fazenda saem das faixas de PARAMS_SISTEMA no mesmo
+# quantil para os dois sistemas (uma fazenda acima da média continua acima
+# ao converter); no equilíbrio, as distribuições são as do modo padrão. Os
+# insumos (água, diesel, N, herbicida, custo) seguem o manejo do ano, no
+# quantil da fazenda com uma variação anual.
+#
+# A conversão segue um cenário de CENARIOS_CONVERSAO. Cada ano é um passo
+# de vetor sobre as fazendas do bloco; os blocos podem ir para processos
+# diferentes (`workers`) com o mesmo resultado.
+CENARIOS_CONVERSAO = {
+    # regen_inicial: fração de fazendas já regenerativas no primeiro ano
+    # taxa_conversao: probabilidade anual de uma convencional converter
+    # inicio: anos (após o primeiro) até começarem as conversões
+    # reversao: probabilidade anual de uma regenerativa voltar
+    "status_quo": dict(regen_inicial=0.5, taxa_conversao=0.0, inicio=0,
+                       reversao=0.0),
+    "gradual": dict(regen_inicial=0.1, taxa_conversao=0.05, inicio=0,
+                    reversao=0.01),
+    "acelerada": dict(regen_inicial=0.1, taxa_conversao=0.15, inicio=0,
+                      reversao=0.0),
+    "programa": dict(regen_inicial=0.0, taxa_conversao=0.5, inicio=5,
+                     reversao=0.0),
+}
+
+# Variáveis de estado: fração do caminho ao equilíbrio por ano e ruído anual
+VELOCIDADE = {"C_org": 0.08, "infiltr_mm_h": 0.5, "erosao_t_ha": 0.6,
+              "biodiversidade": 0.2, "prod_ha": 0.5}
+RUIDO = {"C_org": 0.15, "infiltr_mm_h": 0.8, "erosao_t_ha": 0.15,
+         "biodiversidade": 0.15, "prod_ha": 1.0}
+QUEDA_TRANSICAO = 0.15   # queda da produtividade de equilíbrio ao converter
+ANOS_TRANSICAO = 3       # anos com custo extra (e constante de tempo da queda)
+CUSTO_TRANSICAO = 0.08   # custo extra (fração) nesses anos
+VARIACAO_INSUMOS = 0.1   # desvio anual do quantil dos insumos
+ELASTICIDADE_CHUVA = 0.3  # produtividade ∝ (chuva / CHUVA_REF) ** e
+
+
+def rng_dinamico(seed, bloco):
+    """Generator do bloco no modo dinâmico (um fluxo para todos os anos)."""
+    return np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(int(bloco),)))
+
+
+def _faixas(nome, q):
+    """Valores de `nome` no quantil `q` das faixas (convencional, regenerativo)."""
+    return tuple(lo + q * (hi - lo)
+                 for lo, hi in (PARAMS_SISTEMA[s][nome] for s in SISTEMAS))
+
+
+def _interpolar(par, f):
+    """Entre o valor convencional (f = 0) e o regenerativo (f = 1)."""
+    conv, regen = par
+    return conv + f * (regen - conv)
+
+
+def simular_bloco_dinamico(bloco, n_farms, anos=ANOS, seed=42,
+                           cenario="gradual"):
+    """Simula os anos em sequência para as fazendas do bloco, com estado.
+
+    Devolve as colunas na ordem (farm_id, ano), como `simular_bloco`.
+    """
+    if cenario not in CENARIOS_CONVERSAO:
+        raise ValueError(f"Cenário desconhecido: {cenario!r}")
+    cfg = CENARIOS_CONVERSAO[cenario]
+    ini = bloco * BLOCO_FARMS
+    n = min(ini + BLOCO_FARMS, n_farms) - ini
+    rng = rng_dinamico(seed, bloco)
+
+    area_ha = rng.uniform(*AREA_HA, size=n)
+    quantis = {nome: rng.random(n) for nome in PARAMS_SISTEMA[SISTEMAS[0]]}
+    equilibrio = {nome: _faixas(nome, quantis[nome]) for nome in VELOCIDADE}
+    regen = rng.random(n) < cfg["regen_inicial"]
+    # anos desde a conversão: infinito para quem nunca converteu (sem queda
+    # nem custo de transição) e para as regenerativas de partida, que já
+    # passaram dela; só volta a 0 no ano em que a fazenda converte
+    desde = np.full(n, np.inf)
+    estado = {nome: _interpolar(equilibrio[nome], regen)
+              for nome in VELOCIDADE}
+
+    def aproximar(nome, alvo, minimo):
+        x = estado[nome]
+        x = x + VELOCIDADE[nome] * (alvo - x) + \
+            RUIDO[nome] * rng.standard_normal(n)
+        estado[nome] = np.maximum(x, minimo)
+
+    por_ano = []
+    for t, ano in enumerate(anos):
+        if t >= cfg["inicio"]:
+            sorteio = rng.random(n)
+            converte = ~regen & (sorteio < cfg["taxa_conversao"])
+            reverte = regen & (sorteio < cfg["reversao"])
+            regen = (regen | converte) & ~reverte
+            desde[converte] = 0.0
+            desde[reverte] = np.inf
+        chuva = chuva_mm(ano) / CHUVA_REF
+
+        aproximar("C_org", _interpolar(equilibrio["C_org"], regen), 1.0)
+        c_conv, c_regen = equilibrio["C_org"]
+        solo = np.clip((estado["C_org"] - c_conv) / (c_regen - c_conv), 0, 1)
+        aproximar("infiltr_mm_h",
+                  _interpolar(equilibrio["infiltr_mm_h"], solo), 1.0)
+        aproximar("erosao_t_ha", chuva * _interpolar(
+            equilibrio["erosao_t_ha"], 0.5 * regen + 0.5 * solo), 0.05)
+        aproximar("biodiversidade",
+                  _interpolar(equilibrio["biodiversidade"], regen), 0.0)
+        queda = QUEDA_TRANSICAO * np.exp(-desde / ANOS_TRANSICAO)
+        aproximar("prod_ha", _interpolar(equilibrio["prod_ha"], solo)
+                  * (1 - queda) * chuva ** ELASTICIDADE_CHUVA, 1.0)
+
+        params = dict(estado)
+        for nome, q in quantis.items():
+            if nome in VELOCIDADE:
+                continue
+            q = np.clip(q + VARIACAO_INSUMOS * rng.standard_normal(n), 0, 1)
+            params[nome] = _interpolar(_faixas(nome, q), regen)
+        params["custo_RSha"] = params["custo_RSha"] * inflacao_custo(ano) * \
+            (1 + CUSTO_TRANSICAO * (desde < ANOS_TRANSICAO))
+
+        sistema = np.where(regen, SISTEMAS[1], SISTEMAS[0])
+        por_ano.append(calcular_kpis(ano, sistema, area_ha, params))
+        desde += 1
+    return intercalar_anos(bloco, n_farms, anos, por_ano, seed)
+
+
+# -------------------------------------------------------------------
+# 6) MODO STREAMING (memória limitada, escrita incremental)
 # -------------------------------------------------------------------
-linhas = []
-
-for ano in ANOS:
-    for farm in range(1, N_FARMS + 1):
-        sistema = np.random.choice(
-            ["convencional", "regenerativo"], p=[0.5, 0.5])
-        area_ha = np.random.uniform(5, 30)
-
-        # Parâmetros base por sistema (médias realistas + variação)
-        if sistema == "convencional":
-            prod_ha = np.random.uniform(25, 35)                   # sacas/ha
-            C_org = np.random.uniform(10, 15)                     # g/kg
-            irrig_mm = np.random.uniform(300, 500)                # mm
-            diesel_Lha = np.random.uniform(60, 100)               # L/ha
-            N_kg_ha = np.random.uniform(150, 200)                 # kg/ha
-            # L/ha de herbicida (para ilustrar)
-            herb_Lha = np.random.uniform(3, 7)
-            # L/ha de água para pulverização
-            h2o_pulv_Lha = np.random.uniform(400, 800)
-            erosao_t_ha = np.random.uniform(2.0, 6.0)             # t/ha
-            infiltr_mm_h = np.random.uniform(10, 20)              # mm/h
-            biodiversidade = np.random.uniform(2.0, 5.0)          # 0-10
-
-            # Custo base (R$/ha), ajustado por inflação do ano
-            custo_RSha = np.random.uniform(8000, 10000) * INFLACAO_CUSTO[ano]
-
-        else:
-            prod_ha = np.random.uniform(28, 38)
-            C_org = np.random.uniform(15, 25)
-            irrig_mm = np.random.uniform(200, 400)
-            diesel_Lha = np.random.uniform(40, 70)
-            N_kg_ha = np.random.uniform(120, 170)
-            herb_Lha = np.random.uniform(0.5, 3.0)
-            h2o_pulv_Lha = np.random.uniform(250, 600)
-            erosao_t_ha = np.random.uniform(0.5, 3.0)
-            infiltr_mm_h = np.random.uniform(20, 35)
-            biodiversidade = np.random.uniform(5.0, 8.5)
-
-            custo_RSha = np.random.uniform(7000, 9000) * INFLACAO_CUSTO[ano]
-
-        # Produção total (sacas) e receita
-        producao_sacas = prod_ha * area_ha
-        preco_saca = PRECO_SACA[ano]
-        receita_RSha = prod_ha * preco_saca
-
-        # Água total (m³/ha): irrigação + água de pulverização
-        # 1 mm = 1 L/m²; 1 ha = 10.000 m² => mm * 10.000 L/ha => /1000 = m³/ha
-        h2o_irrig_m3ha = (irrig_mm * 10000) / 1000.0
-        h2o_pulv_m3ha = h2o_pulv_Lha / 1000.0
-        h2o_total_m3ha = h2o_irrig_m3ha + h2o_pulv_m3ha
-
-        # Emissões GHG (kg CO2e/ha) — diesel + N total (upstream + solo)
-        ghg_diesel_kgco2e_ha = diesel_Lha * EF_DIESEL_KGCO2_PER_L
-        ghg_N_kgco2e_ha = N_kg_ha * EF_TOTAL_N_KGCO2E_PER_KG
-        ghg_total_kgco2e_ha = ghg_diesel_kgco2e_ha + ghg_N_kgco2e_ha
-
-        # Emissões por saca (kg CO2e/saca) — dividir por produtividade por ha
-        ghg_kgco2e_saca = ghg_total_kgco2e_ha / max(prod_ha, 1e-6)
-
-        # KPIs econômicos
-        custo_por_saca = custo_RSha / max(prod_ha, 1e-6)
-        rentabilidade_RSha = receita_RSha - custo_RSha
-        margem = rentabilidade_RSha / max(receita_RSha, 1e-6)
-
-        # KPIs ambientais/operacionais
-        produtividade_hidrica = (prod_ha * 60) / \
-            max(h2o_total_m3ha, 1e-6)  # kg café / m³ água
-        diesel_por_saca = diesel_Lha / max(prod_ha, 1e-6)
-        ci_ha_tco2e = ghg_total_kgco2e_ha / 1000.0
-        ci_saca_tco2e = ghg_kgco2e_saca / 1000.0
-
-        linhas.append(dict(
-            farm_id=farm,
-            ano=ano,
-            sistema=sistema,
-            area_ha=area_ha,
-            chuva_mm=CHUVA_MM[ano],
-            produtividade_sacas_ha=prod_ha,
-            producao_total_sacas=producao_sacas,
-            preco_saca_Reais=preco_saca,
-            receita_total_RSha=receita_RSha,
-            custo_total_RSha=custo_RSha,
-            custo_por_saca_Reais=custo_por_saca,
-            rentabilidade_RSha=rentabilidade_RSha,
-            margem_liquida=margem,
-
-            C_organico_gkg=C_org,
-            erosao_ton_ha=erosao_t_ha,
-            infiltracao_mm_h=infiltr_mm_h,
-            biodiversidade_indice=biodiversidade,
-
-            irrigacao_mm=irrig_mm,
-            agua_pulverizacao_Lha=h2o_pulv_Lha,
-            agua_total_m3ha=h2o_total_m3ha,
-            produtividade_hidrica_kg_m3=produtividade_hidrica,
-
-            diesel_Lha=diesel_Lha,
-            diesel_por_saca_L=diesel_por_saca,
-
-            N_kg_ha=N_kg_ha,
-            herbicida_Lha=herb_Lha,
-
-            GHG_diesel_kgCO2e_ha=ghg_diesel_kgco2e_ha,
-            GHG_N_total_kgCO2e_ha=ghg_N_kgco2e_ha,
-            GHG_total_kgCO2e_ha=ghg_total_kgco2e_ha,
-            GHG_kgCO2e_saca=ghg_kgco2e_saca,
-            CI_ha_tCO2e=ci_ha_tco2e,
-            CI_saca_tCO2e=ci_saca_tco2e
-        ))
-
-df = pd.DataFrame(linhas)
-
-# Ordenar para visualização amigável
-df = df.sort_values(["farm_id", "ano"]).reset_index(drop=True)
-
-# Salvar CSV
-df.to_csv("dados_cafe.csv", index=False, encoding="utf-8-sig")
-print("OK! 'dados_cafe.csv' gerado com", len(df), "linhas.")
-print(df.head(10))
+TAMANHO_LOTE = 100_000
+
+SAIDA_PADRAO = {
+    "csv": "dados_cafe.csv",
+    "parquet": "dados_cafe.parquet",
+    "npy": "dados_cafe_colunas",
+}
+
+
+def gerar_lotes(n_farms=N_FARMS, anos=ANOS, seed=42, workers=1,
+                tamanho_lote=TAMANHO_LOTE, cenario=None):
+    """Produz DataFrames de `tamanho_lote` linhas, já em ordem (farm_id, ano).
+
+    Apenas um bloco de fazendas e um lote ficam em memória por vez (mais os
+    blocos em voo no pool); o último lote pode ser menor.
+    """
+    buffer = []
+    n_buffer = 0
+    for bloco in iterar_blocos(n_farms, anos, seed, workers, cenario):
+        buffer.append(pd.DataFrame(bloco, columns=COLUNAS))
+        n_buffer += len(buffer[-1])
+        if n_buffer < tamanho_lote:
+            continue
+        pendente = pd.concat(buffer, ignore_index=True)
+        ini = 0
+        while len(pendente) - ini >= tamanho_lote:
+            yield pendente.iloc[ini:ini + tamanho_lote].reset_index(drop=True)
+            ini += tamanho_lote
+        resto = pendente.iloc[ini:]
+        buffer = [resto] if len(resto) else []
+        n_buffer = len(resto)
+    if n_buffer:
+        yield pd.concat(buffer, ignore_index=True)
+
+
+def escrever_streaming(caminho, n_farms=N_FARMS, anos=ANOS, seed=42,
+                       workers=1, tamanho_lote=TAMANHO_LOTE, formato="csv",
+                       cenario=None):
+    """Simula e grava o painel lote a lote, informando progresso e vazão.
+
+    `formato="csv"` acrescenta cada lote ao arquivo (cabeçalho só no
+    primeiro); `formato="parquet"` grava um row group por lote (requer
+    `pyarrow`); `formato="npy"` preenche uma pasta colunar (um `.npy` por
+    coluna, incluindo as derivadas do dashboard) que o `app.py` abre via
+    mmap. `cenario` liga o modo dinâmico. Devolve o total de linhas escritas.
+    """
+    import time
+
+    escritor = None
+    total = n_farms * len(anos)
+    if formato == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    elif formato == "npy":
+        escritor = EscritorColunar(caminho, total, categorias={
+            "sistema": SISTEMAS, "regiao": list(REGIOES),
+            "cooperativa": COOPERATIVAS})
+    elif formato != "csv":
+        raise ValueError(f"Formato desconhecido: {formato!r}")
+
+    escritas = 0
+    t0 = time.perf_counter()
+
+    try:
+        for i, lote in enumerate(gerar_lotes(n_farms, anos, seed, workers,
+                                             tamanho_lote, cenario)):
+            if formato == "parquet":
+                tabela = pa.Table.from_pandas(lote, preserve_index=False)
+                if escritor is None:
+                    escritor = pq.ParquetWriter(caminho, tabela.schema)
+                escritor.write_table(tabela)
+            elif formato == "npy":
+                escritor.escrever(garantir_derivadas(lote))
+            else:
+                # BOM só no início do arquivo (mesma codificação do modo padrão)
+                lote.to_csv(caminho, index=False, header=(i == 0),
+                            mode="w" if i == 0 else "a",
+                            encoding="utf-8-sig" if i == 0 else "utf-8")
+
+            escritas += len(lote)
+            dt = time.perf_counter() - t0
+            print(f"  {escritas:,}/{total:,} linhas "
+                  f"({100 * escritas / max(total, 1):.1f}%) — "
+                  f"{escritas / max(dt, 1e-9):,.0f} linhas/s", flush=True)
+    except BaseException:
+        # pasta colunar interrompida não é publicada (nem deixa arquivos)
+        if formato == "npy":
+            escritor.abortar()
+        elif escritor is not None:
+            escritor.close()
+        raise
+    if formato == "npy":
+        escritor.fechar()
+    elif escritor is not None:
+        escritor.close()
+
+    return escritas
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        description="Gera a base simulada de fazendas de café.")
+    parser.add_argument("--n-farms", type=int, default=N_FARMS)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processos para simular os blocos em paralelo")
+    parser.add_argument("--saida", default=None,
+                        help="padrão: dados_cafe.csv | dados_cafe.parquet | dados_cafe_colunas")
+    parser.add_argument("--streaming", action="store_true",
+                        help="grava em lotes, com memória limitada")
+    parser.add_argument("--formato", choices=["csv", "parquet", "npy"],
+                        default="csv")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument("--n-anos", type=int, default=None,
+                        help=f"anos a partir de {ANOS[0]} (padrão: {ANOS})")
+    parser.add_argument("--cenario", choices=list(CENARIOS_CONVERSAO),
+                        default=None,
+                        help="modo dinâmico: estado do solo ano a ano e "
+                             "conversão conforme o cenário")
+    args = parser.parse_args()
+    if args.saida is None:
+        args.saida = SAIDA_PADRAO[args.formato]
+    anos = ANOS if args.n_anos is None else \
+        list(range(ANOS[0], ANOS[0] + args.n_anos))
+
+    if args.streaming:
+        t0 = time.perf_counter()
+        n = escrever_streaming(args.saida, args.n_farms, anos, args.seed,
+                               args.workers, args.tamanho_lote, args.formato,
+                               args.cenario)
+        dt = time.perf_counter() - t0
+        print(f"OK! '{args.saida}' gerado com {n:,} linhas em {dt:.1f}s.")
+        raise SystemExit(0)
+
+    t0 = time.perf_counter()
+    df = simular(args.n_farms, anos, args.seed, args.workers, args.cenario)
+    dt = time.perf_counter() - t0
+    print(f"Simulação: {len(df):,} linhas em {dt:.2f}s "
+          f"({len(df) / max(dt, 1e-9):,.0f} linhas/s)")
+
+    # Salvar (CSV por padrão)
+    if args.formato == "npy":
+        gravar_colunar(df, args.saida)
+    elif args.formato == "parquet":
+        df.to_parquet(args.saida, index=False)
+    else:
+        df.to_csv(args.saida, index=False, encoding="utf-8-sig")
+    print(f"OK! '{args.saida}' gerado com", len(df), "linhas.")
+    print(df.head(10))
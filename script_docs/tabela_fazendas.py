@@ -0,0 +1,135 @@
+import operator
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Tabela de fazendas com paginação no servidor
+# ------------------------------------------------------------
+# A DataTable roda em modo "custom": o navegador só envia página, tamanho,
+# ordenação (`sort_by`) e filtro (`filter_query`) e recebe as linhas da
+# página visível. Sem filtro nem ordenação, a página é uma fatia direta do
+# Dataset; com eles, a ordem das linhas é calculada uma vez por estado e
+# reaproveitada ao navegar entre as páginas.
+
+# Operadores da sintaxe de filtro da DataTable (ordem importa: ">=" antes de ">")
+OPERADORES = [
+    ("ge ", ">="), ("le ", "<="), ("lt ", "<"), ("gt ", ">"),
+    ("ne ", "!="), ("eq ", "="), ("contains ",), ("datestartswith ",),
+]
+
+
+COMPARACOES = {
+    "eq": operator.eq, "ne": operator.ne, "lt": operator.lt,
+    "le": operator.le, "gt": operator.gt, "ge": operator.ge,
+}
+
+
+def como_texto(valor):
+    """Valor do filtro como texto ("2023", não "2023.0", para números inteiros)."""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def separar_filtro(parte):
+    """'{col} op valor' -> (col, op, valor); (None, None, None) se inválido."""
+    for grupo in OPERADORES:
+        for op in grupo:
+            if op not in parte:
+                continue
+            nome, valor = parte.split(op, 1)
+            nome = nome[nome.find("{") + 1: nome.rfind("}")]
+            valor = valor.strip()
+            if valor[:1] in ("'", '"', "`") and valor[:1] == valor[-1:]:
+                valor = valor[1:-1].replace("\\" + valor[0], valor[0])
+            else:
+                try:
+                    valor = float(valor)
+                except ValueError:
+                    pass
+            return nome, grupo[0].strip(), valor
+    return None, None, None
+
+
+def mascara_filtro(dff, filter_query):
+    """Máscara booleana para `filter_query` (None se não há filtro)."""
+    if not filter_query:
+        return None
+    mascara = np.ones(len(dff), dtype=bool)
+    for parte in filter_query.split(" && "):
+        col, op, valor = separar_filtro(parte)
+        if col not in dff.columns:
+            continue
+        serie = dff[col]
+        if op == "contains" or isinstance(serie.dtype, pd.CategoricalDtype):
+            # colunas categóricas comparam como texto (ordem lexicográfica)
+            texto, alvo = serie.astype(str), como_texto(valor)
+            if op in COMPARACOES:
+                mascara &= COMPARACOES[op](texto, alvo).to_numpy()
+            elif op == "datestartswith":
+                mascara &= texto.str.startswith(alvo).to_numpy()
+            else:
+                mascara &= texto.str.contains(
+                    alvo, case=False, regex=False).to_numpy()
+            continue
+        if isinstance(valor, str):
+            # texto em coluna numérica: nenhuma linha casa
+            mascara &= False
+            continue
+        if op in COMPARACOES:
+            mascara &= COMPARACOES[op](serie.to_numpy(), valor)
+        elif op == "datestartswith":
+            mascara &= serie.astype(str).str.startswith(str(valor)).to_numpy()
+    return mascara
+
+
+def ordem_linhas(dff, sort_by, filter_query):
+    """Posições (em `dff`) das linhas filtradas, na ordem pedida.
+
+    Devolve None quando não há filtro nem ordenação (a ordem física serve).
+    """
+    mascara = mascara_filtro(dff, filter_query)
+    sort_by = [s for s in (sort_by or []) if s["column_id"] in dff.columns]
+    if mascara is None and not sort_by:
+        return None
+    pos = np.arange(len(dff)) if mascara is None else np.flatnonzero(mascara)
+    if not sort_by:
+        return pos
+
+    # np.lexsort: a última chave é a principal
+    chaves = []
+    for s in reversed(sort_by):
+        serie = dff[s["column_id"]]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            x = serie.cat.codes.to_numpy()[pos].astype(np.float64)
+        else:
+            x = serie.to_numpy()[pos].astype(np.float64)
+        chaves.append(-x if s["direction"] == "desc" else x)
+    return pos[np.lexsort(chaves)]
+
+
+def pagina(dff, ordem, page_current, page_size, colunas=None, casas=2):
+    """(registros da página, total de páginas); só as `colunas` pedidas."""
+    n = len(dff) if ordem is None else len(ordem)
+    ini = page_current * page_size
+    fim = min(ini + page_size, n)
+    if ordem is None:
+        linhas = dff.iloc[ini:fim]
+    else:
+        linhas = dff.iloc[ordem[ini:fim]]
+    if colunas is not None:
+        linhas = linhas[[c for c in colunas if c in linhas.columns]]
+
+    registros = {}
+    for col in linhas.columns:
+        serie = linhas[col]
+        if pd.api.types.is_float_dtype(serie.dtype):
+            # float32 -> float64 antes de arredondar (evita 10.0136652)
+            registros[col] = np.round(serie.to_numpy(dtype=np.float64), casas)
+        elif pd.api.types.is_integer_dtype(serie.dtype):
+            registros[col] = serie.to_numpy().astype(int)
+        else:
+            registros[col] = serie.astype(str).to_numpy()
+    dados = pd.DataFrame(registros).to_dict("records")
+    return dados, max(1, -(-n // page_size))
@@ -0,0 +1,221 @@
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+# ------------------------------------------------------------
+# Fila local de tarefas em segundo plano (sem broker externo)
+# ------------------------------------------------------------
+# Cálculos pesados (bootstrap, varreduras de cenários) rodam em um pool de
+# threads do próprio worker; o callback que os pede só registra a tarefa e
+# retorna. O estado (progresso, cancelamento) e o resultado ficam em um
+# armazém compartilhado — `diskcache` se instalado (visível a todos os
+# workers da máquina, com transações para deduplicar), senão um dicionário
+# em memória por processo.
+#
+# - deduplicação: a mesma chave em andamento não é submetida de novo; quem
+#   pedir depois só passa a acompanhar a tarefa existente;
+# - vivacidade: o estado guarda o dono (host e pid do worker que executa) e
+#   um batimento renovado a cada `BATIMENTO_S / 3` segundos por uma thread
+#   do dono. Uma tarefa "executando" cujo dono morreu (pid inexistente no
+#   mesmo host) ou cujo batimento passou de `BATIMENTO_S` é tratada como
+#   abandonada e submetida de novo; cada execução tem um id próprio, e uma
+#   execução substituída não escreve mais no estado;
+# - cancelamento: `cancelar` marca a tarefa; a função a interrompe na próxima
+#   chamada de `progresso` (cooperativo). Os interessados são um conjunto de
+#   ids de sessão — a mesma sessão submetendo de novo não conta duas vezes —
+#   e a tarefa só é cancelada quando a última sessão desiste;
+# - cache: resultados prontos ficam no armazém por `TTL_RESULTADO` segundos
+#   e novas submissões da mesma chave os devolvem direto.
+try:
+    import diskcache
+except ImportError:  # opcional
+    diskcache = None
+
+TAREFAS_DIR = os.environ.get(
+    "CAFE_TAREFAS_DIR", str(Path(tempfile.gettempdir()) / "cafe_dashboard_tarefas"))
+TAREFAS_WORKERS = int(os.environ.get("CAFE_TAREFAS_WORKERS", "2"))
+TTL_RESULTADO = 3600
+BATIMENTO_S = float(os.environ.get("CAFE_TAREFAS_BATIMENTO_S", "30"))
+HOST = socket.gethostname()
+
+PRONTO, EXECUTANDO, CANCELADO, ERRO = "pronto", "executando", "cancelado", "erro"
+
+_AUSENTE = object()
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa quando ela foi cancelada."""
+
+
+class _ArmazemMemoria:
+    """Subconjunto da API do diskcache.Cache usado pela fila."""
+
+    def __init__(self):
+        self.dados = {}
+        self.lock = threading.RLock()
+
+    def get(self, chave, default=None):
+        with self.lock:
+            valor, expira = self.dados.get(chave, (default, None))
+            if expira is not None and expira < time.time():
+                del self.dados[chave]
+                return default
+            return valor
+
+    def set(self, chave, valor, expire=None):
+        with self.lock:
+            self.dados[chave] = (valor, None if expire is None
+                                 else time.time() + expire)
+
+    def delete(self, chave):
+        with self.lock:
+            return self.dados.pop(chave, None) is not None
+
+    @contextmanager
+    def transact(self):
+        with self.lock:
+            yield
+
+
+def id_tarefa(chave):
+    """Identificador estável (igual em todos os processos) de uma chave."""
+    return hashlib.sha1(repr(chave).encode()).hexdigest()[:16]
+
+
+def _pid_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # existe, mas é de outro usuário
+        pass
+    return True
+
+
+def viva(st):
+    """Se uma tarefa "executando" ainda tem um dono ativo."""
+    if time.time() - st.get("batimento", 0.0) > BATIMENTO_S:
+        return False
+    return st.get("host") != HOST or _pid_vivo(st.get("pid", -1))
+
+
+class FilaTarefas:
+    """Executa funções em segundo plano com progresso, cancelamento e cache."""
+
+    def __init__(self, pasta=TAREFAS_DIR, workers=TAREFAS_WORKERS):
+        self.armazem = diskcache.Cache(pasta) if diskcache is not None \
+            else _ArmazemMemoria()
+        self.pool = ThreadPoolExecutor(max_workers=workers,
+                                       thread_name_prefix="tarefa")
+
+    # estado: {"estado", "progresso", "mensagem", "interessados" (set de
+    #          sessões), "host", "pid", "execucao", "batimento", "inicio", "fim"}
+    def estado(self, tid):
+        return self.armazem.get(f"estado:{tid}")
+
+    def resultado(self, tid, default=None):
+        return self.armazem.get(f"resultado:{tid}", default)
+
+    def _atualizar(self, tid, execucao, **campos):
+        """Atualiza o estado se `execucao` ainda é a execução corrente."""
+        with self.armazem.transact():
+            st = self.estado(tid)
+            if st is None or st.get("execucao") != execucao:
+                return None
+            st.update(campos)
+            self.armazem.set(f"estado:{tid}", st, expire=TTL_RESULTADO)
+            return st
+
+    def submeter(self, chave, func, *args, sessao=None):
+        """Registra `func(*args, progresso=...)` e devolve o id da tarefa.
+
+        Se a mesma chave já está pronta, nada é executado; se está em
+        andamento com um dono vivo, `sessao` só entra no conjunto de
+        interessados. Sem `sessao`, a chamada conta como uma sessão anônima
+        nova (e não tem como desistir depois).
+        """
+        tid = id_tarefa(chave)
+        sessao = sessao or uuid.uuid4().hex
+        with self.armazem.transact():
+            st = self.estado(tid)
+            if st is not None and st["estado"] == PRONTO \
+                    and self.resultado(tid, _AUSENTE) is not _AUSENTE:
+                return tid
+            if st is not None and st["estado"] == EXECUTANDO and viva(st):
+                st["interessados"].add(sessao)
+                self.armazem.set(f"estado:{tid}", st, expire=TTL_RESULTADO)
+                return tid
+            # nova, terminada sem resultado ou abandonada: (re)executa aqui
+            interessados = {sessao}
+            if st is not None and st["estado"] == EXECUTANDO:
+                interessados |= st["interessados"]
+            execucao = uuid.uuid4().hex
+            agora = time.time()
+            self.armazem.delete(f"cancelar:{tid}")
+            self.armazem.set(f"estado:{tid}", {
+                "estado": EXECUTANDO, "progresso": 0.0, "mensagem": "na fila",
+                "interessados": interessados, "host": HOST, "pid": os.getpid(),
+                "execucao": execucao, "batimento": agora, "inicio": agora,
+                "fim": None,
+            }, expire=TTL_RESULTADO)
+        # o batimento começa já na fila: uma tarefa esperando vaga no pool
+        # também tem dono vivo
+        parar = threading.Event()
+        threading.Thread(target=self._bater, args=(tid, execucao, parar),
+                         name=f"batimento-{tid}", daemon=True).start()
+        self.pool.submit(self._rodar, tid, execucao, func, args, parar)
+        return tid
+
+    def cancelar(self, tid, sessao):
+        """`sessao` desiste da tarefa; cancela de fato se ninguém mais a acompanha."""
+        with self.armazem.transact():
+            st = self.estado(tid)
+            if st is None or st["estado"] != EXECUTANDO:
+                return False
+            st["interessados"].discard(sessao)
+            self.armazem.set(f"estado:{tid}", st, expire=TTL_RESULTADO)
+            if not st["interessados"]:
+                self.armazem.set(f"cancelar:{tid}", True, expire=TTL_RESULTADO)
+                return True
+            return False
+
+    def _bater(self, tid, execucao, parar):
+        # o batimento independe da frequência de `progresso` da função
+        while not parar.wait(BATIMENTO_S / 3):
+            if self._atualizar(tid, execucao, batimento=time.time()) is None:
+                return
+
+    def _rodar(self, tid, execucao, func, args, parar):
+        def progresso(fracao, mensagem=""):
+            if self.armazem.get(f"cancelar:{tid}"):
+                raise TarefaCancelada(tid)
+            st = self._atualizar(tid, execucao, progresso=float(fracao),
+                                 mensagem=mensagem, batimento=time.time())
+            if st is None:  # substituída por outra execução
+                raise TarefaCancelada(tid)
+
+        try:
+            progresso(0.0, "iniciando")
+            valor = func(*args, progresso=progresso)
+        except TarefaCancelada:
+            self._atualizar(tid, execucao, estado=CANCELADO, fim=time.time())
+        except Exception as exc:  # a falha vai para o estado, não derruba o pool
+            self._atualizar(tid, execucao, estado=ERRO, mensagem=repr(exc),
+                            fim=time.time())
+        else:
+            with self.armazem.transact():
+                st = self.estado(tid)
+                if st is not None and st.get("execucao") == execucao:
+                    self.armazem.set(f"resultado:{tid}", valor,
+                                     expire=TTL_RESULTADO)
+                    self._atualizar(tid, execucao, estado=PRONTO, progresso=1.0,
+                                    mensagem="pronto", fim=time.time())
+        finally:
+            parar.set()